@@ -0,0 +1 @@
+"""Hermetic performance benchmarks for the ai-server (see the Benchmarks section of README.md)"""
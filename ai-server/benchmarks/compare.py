@@ -0,0 +1,65 @@
+"""Compare two benchmark result files scenario by scenario.
+
+Exits with status 1 when any scenario's p95 latency grew, or its
+throughput fell, by more than the threshold.
+
+Usage: python -m benchmarks.compare baseline.json candidate.json [--threshold 0.10]
+"""
+import sys
+import json
+import argparse
+from typing import Any, Dict, Optional, Tuple
+
+Key = Tuple[str, str, int]
+
+
+def load(path: str) -> Dict[Key, Dict[str, Any]]:
+    with open(path) as file:
+        results = json.load(file)
+    return {(s["mode"], s["size"], s["concurrency"]): s for s in results["scenarios"]}
+
+
+def change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if not before or after is None:
+        return None
+    return (after - before) / before
+
+
+def _format(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:+.1%}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare benchmark results")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args()
+
+    baseline = load(args.baseline)
+    candidate = load(args.candidate)
+    regressions = 0
+    print(f"{'scenario':<26} {'p50':>8} {'p95':>8} {'p99':>8} {'rps':>8} {'rss':>8}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key], candidate[key]
+        p95 = change(before["latency_ms"]["p95"], after["latency_ms"]["p95"])
+        rps = change(before["throughput_rps"], after["throughput_rps"])
+        regressed = (p95 is not None and p95 > args.threshold) or (rps is not None and rps < -args.threshold)
+        regressions += regressed
+        mode, size, concurrency = key
+        print(
+            f"{f'{mode}/{size}/c={concurrency}':<26} "
+            f"{_format(change(before['latency_ms']['p50'], after['latency_ms']['p50'])):>8} "
+            f"{_format(p95):>8} "
+            f"{_format(change(before['latency_ms']['p99'], after['latency_ms']['p99'])):>8} "
+            f"{_format(rps):>8} "
+            f"{_format(change(before['peak_rss_mb'], after['peak_rss_mb'])):>8}"
+            + ("  REGRESSION" if regressed else "")
+        )
+    for key in sorted(baseline.keys() ^ candidate.keys()):
+        print(f"{'/'.join(map(str, key))}: only in {'baseline' if key in baseline else 'candidate'}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Deterministic stand-in for the Groq chat completions API.
+
+Answers each question with the SQL listed for it in workload.py after a
+configurable, seeded latency, so benchmark runs never touch the network.
+Point the server at it with GROQ_BASE_URL=http://127.0.0.1:<port>.
+
+Usage: python -m benchmarks.llm_stub [--port 8901] [--latency-ms 400] [--jitter-ms 100] [--seed 42]
+"""
+import time
+import random
+import asyncio
+import argparse
+import threading
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+from benchmarks.workload import sql_for
+
+
+def create_app(latency_ms: float = 400.0, jitter_ms: float = 100.0, seed: int = 42) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+    lock = threading.Lock()
+    state = {"calls": 0, "seconds": 0.0}
+
+    def delay(call: int) -> float:
+        # Seeded per call number, so the same request sequence sees the same latencies
+        jitter = random.Random(f"{seed}:{call}").uniform(-jitter_ms, jitter_ms)
+        return max(0.0, latency_ms + jitter) / 1000
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request) -> Dict[str, Any]:
+        body = await request.json()
+        question = next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "")
+        with lock:
+            state["calls"] += 1
+            call = state["calls"]
+        seconds = delay(call)
+        await asyncio.sleep(seconds)
+        with lock:
+            state["seconds"] += seconds
+        return {
+            "id": f"stub-{call}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": sql_for(question)},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.get("/stats")
+    async def stats() -> Dict[str, Any]:
+        with lock:
+            return dict(state)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deterministic Groq API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=400.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.latency_ms, args.jitter_ms, args.seed),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""Load driver for the ai-server benchmarks.
+
+Seeds the benchmark database, starts the LLM stub and a server process
+pointed at both, then drives /chat at each concurrency level for each
+result size and cache mode. Per scenario it records p50/p95/p99 latency,
+throughput, peak server RSS, the LLM stub's share of the time and any
+per-stage timings the server reports in its Server-Timing header. Results
+are written as JSON for comparison with benchmarks/compare.py.
+
+Usage: python -m benchmarks.run --scale 1m --concurrency 1,8,32 --requests 200
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks import workload
+from benchmarks.seed import bench_database_url, parse_scale, seed
+
+AI_SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(AI_SERVER_DIR, "benchmarks", "results")
+
+# Server settings per cache mode. "cold" makes every request a new question
+# answered by the LLM and run against the database; "warm" repeats the same
+# questions with the default caches and intent fast path.
+MODES: Dict[str, Dict[str, str]] = {
+    "cold": {"SQL_CACHE_MAX_ENTRIES": "0", "RESULT_CACHE_MAX_BYTES": "0", "INTENT_FAST_PATH": "false"},
+    "warm": {},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(ordered: List[float], fraction: float) -> Optional[float]:
+    """Linear-interpolated percentile of an ascending list"""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    ordered = sorted(values)
+    return {
+        "p50": _round(percentile(ordered, 0.50)),
+        "p95": _round(percentile(ordered, 0.95)),
+        "p99": _round(percentile(ordered, 0.99)),
+        "mean": _round(sum(ordered) / len(ordered)) if ordered else None,
+        "max": _round(ordered[-1]) if ordered else None,
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """{stage: milliseconds} from a Server-Timing header"""
+    stages = {}
+    for metric in header.split(","):
+        name, *params = [part.strip() for part in metric.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                try:
+                    stages[name] = stages.get(name, 0.0) + float(param[4:])
+                except ValueError:
+                    pass
+    return stages
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Current resident set size of a process (Linux /proc)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class Process:
+    """A child process started for the run, stopped on exit"""
+
+    def __init__(self, args: List[str], env: Dict[str, str], log_path: str):
+        self.log = open(log_path, "w")
+        self.popen = subprocess.Popen(args, cwd=AI_SERVER_DIR, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    @property
+    def pid(self) -> int:
+        return self.popen.pid
+
+    def stop(self) -> None:
+        if self.popen.poll() is None:
+            self.popen.terminate()
+            try:
+                self.popen.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.popen.kill()
+                self.popen.wait()
+        self.log.close()
+
+
+async def wait_ready(url: str, process: Process, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.popen.poll() is not None:
+                raise RuntimeError(f"{url} exited during startup (see {process.log.name})")
+            try:
+                if (await client.get(url, timeout=2)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+async def run_scenario(
+    base_url: str,
+    stub_url: str,
+    server_pid: int,
+    questions: List[str],
+    concurrency: int,
+    requests: int,
+    unique: bool,
+    offset: int,
+) -> Dict[str, Any]:
+    """Send ``requests`` /chat calls from ``concurrency`` concurrent clients"""
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    response_bytes: List[int] = []
+    errors = 0
+    next_index = 0
+    peak_rss = rss_bytes(server_pid) or 0
+    sampling = True
+
+    async def sample_rss() -> None:
+        nonlocal peak_rss
+        while sampling:
+            peak_rss = max(peak_rss, rss_bytes(server_pid) or 0)
+            await asyncio.sleep(0.05)
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal next_index, errors
+        while next_index < requests:
+            index = next_index
+            next_index += 1
+            question = questions[index % len(questions)]
+            if unique:
+                question += workload.VARIANT_SUFFIX.format(offset + index)
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{base_url}/chat", json={"question": question})
+                elapsed = (time.perf_counter() - started) * 1000
+                if response.status_code != 200 or response.json().get("error"):
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            response_bytes.append(len(response.content))
+            for stage, duration in parse_server_timing(response.headers.get("server-timing", "")).items():
+                stages.setdefault(stage, []).append(duration)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        llm_before = (await client.get(f"{stub_url}/stats")).json()
+        sampler = asyncio.create_task(sample_rss())
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+        sampling = False
+        await sampler
+        llm_after = (await client.get(f"{stub_url}/stats")).json()
+
+    llm_calls = llm_after["calls"] - llm_before["calls"]
+    llm_seconds = llm_after["seconds"] - llm_before["seconds"]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": summarize(latencies),
+        "response_bytes_mean": round(sum(response_bytes) / len(response_bytes)) if response_bytes else None,
+        "peak_rss_mb": round(peak_rss / 2**20, 1) if peak_rss else None,
+        "llm": {
+            "calls": llm_calls,
+            "mean_ms": round(llm_seconds * 1000 / llm_calls, 3) if llm_calls else None,
+        },
+        "stages_ms": {stage: summarize(values) for stage, values in sorted(stages.items())},
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=AI_SERVER_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    database_url = bench_database_url()
+    invoices = parse_scale(args.scale)
+    if not args.skip_seed:
+        seed(database_url, invoices)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stub_port = free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    stub = Process(
+        [sys.executable, "-m", "benchmarks.llm_stub", "--port", str(stub_port),
+         "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", str(args.llm_jitter_ms), "--seed", str(args.seed)],
+        dict(os.environ),
+        os.path.join(RESULTS_DIR, "llm_stub.log"),
+    )
+    scenarios = []
+    try:
+        await wait_ready(f"{stub_url}/stats", stub, 30)
+        for mode in args.modes.split(","):
+            port = free_port()
+            env = {
+                **os.environ,
+                "DATABASE_URL": database_url,
+                "GROQ_API_KEY": "benchmark",
+                "GROQ_BASE_URL": stub_url,
+                "MAX_RESULT_ROWS": str(args.max_rows),
+                "SQL_CACHE_PATH": "",
+                "EXAMPLE_STORE_PATH": "",
+                "LOG_LEVEL": "WARNING",
+                **MODES[mode],
+                **dict(item.split("=", 1) for item in args.server_env),
+            }
+            server = Process(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                env,
+                os.path.join(RESULTS_DIR, f"server-{mode}.log"),
+            )
+            base_url = f"http://127.0.0.1:{port}"
+            try:
+                await wait_ready(f"{base_url}/ready", server, args.startup_timeout)
+                offset = 0
+                for size in args.sizes.split(","):
+                    questions = workload.questions(size)
+                    for concurrency in (int(c) for c in args.concurrency.split(",")):
+                        if args.warmup:
+                            await run_scenario(base_url, stub_url, server.pid, questions, concurrency,
+                                               args.warmup, mode == "cold", offset)
+                            offset += args.warmup
+                        result = await run_scenario(base_url, stub_url, server.pid, questions, concurrency,
+                                                    args.requests, mode == "cold", offset)
+                        offset += args.requests
+                        result = {"mode": mode, "size": size, "concurrency": concurrency, **result}
+                        scenarios.append(result)
+                        latency = result["latency_ms"]
+                        print(
+                            f"{mode:5} {size:6} c={concurrency:<4} p50={latency['p50']}ms p95={latency['p95']}ms "
+                            f"p99={latency['p99']}ms {result['throughput_rps']} req/s errors={result['errors']} "
+                            f"rss={result['peak_rss_mb']}MB",
+                            flush=True,
+                        )
+            finally:
+                server.stop()
+    finally:
+        stub.stop()
+
+    return {
+        "meta": {
+            "scale": invoices,
+            "commit": git_commit(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+            "requests": args.requests,
+            "max_rows": args.max_rows,
+            "server_env": args.server_env,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark /chat against a seeded database and a stub LLM")
+    parser.add_argument("--scale", default="10k", help="invoices in the dataset: 10k, 1m, 10m or a number")
+    parser.add_argument("--skip-seed", action="store_true", help="use the database as it is")
+    parser.add_argument("--modes", default="cold,warm", help=f"cache modes ({', '.join(MODES)})")
+    parser.add_argument("--sizes", default="small,medium,large", help=f"result sizes ({', '.join(workload.WORKLOAD)})")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each scenario")
+    parser.add_argument("--max-rows", type=int, default=10000, help="MAX_RESULT_ROWS for the server")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--seed", type=int, default=42, help="LLM stub latency seed")
+    parser.add_argument("--startup-timeout", type=float, default=300.0, help="seconds to wait for the server")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE", help="extra server setting")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>-<scale>.json)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{args.scale}.json")
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Seed a disposable Postgres database with a deterministic invoice dataset.
+
+Tables follow backend/prisma/schema.prisma. Every value is derived from a
+hash of the row number, so a given scale always produces the same data.
+Rows are generated server-side with generate_series in chunks, and
+indexes and foreign keys are created after loading.
+
+Usage: python -m benchmarks.seed --scale 1m   (BENCH_DATABASE_URL must be set)
+"""
+import os
+import time
+import logging
+import argparse
+from typing import Dict
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SCALES: Dict[str, int] = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+CHUNK_ROWS = 1_000_000
+LINE_ITEMS_PER_INVOICE = 2
+
+SCHEMA_SQL = """
+DROP TABLE IF EXISTS payments, line_items, invoices, customers, vendors, invoice_rollups, bench_meta CASCADE;
+DROP TYPE IF EXISTS "InvoiceStatus", "PaymentMethod" CASCADE;
+CREATE TYPE "InvoiceStatus" AS ENUM ('PENDING', 'PAID', 'OVERDUE', 'CANCELLED', 'DRAFT');
+CREATE TYPE "PaymentMethod" AS ENUM ('BANK_TRANSFER', 'CREDIT_CARD', 'PAYPAL', 'CASH', 'CHECK', 'OTHER');
+CREATE TABLE vendors (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL, email TEXT, phone TEXT, address TEXT, city TEXT,
+    country TEXT, category TEXT, "taxId" TEXT,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP, "updatedAt" TIMESTAMP(3) NOT NULL
+);
+CREATE TABLE customers (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL, email TEXT, phone TEXT, address TEXT, city TEXT, country TEXT,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP, "updatedAt" TIMESTAMP(3) NOT NULL
+);
+CREATE TABLE invoices (
+    id TEXT PRIMARY KEY, "invoiceNumber" TEXT NOT NULL, "vendorId" TEXT NOT NULL, "customerId" TEXT,
+    "issueDate" TIMESTAMP(3) NOT NULL, "dueDate" TIMESTAMP(3), "paidDate" TIMESTAMP(3),
+    subtotal DECIMAL(15,2) NOT NULL, "taxAmount" DECIMAL(15,2) NOT NULL DEFAULT 0, "totalAmount" DECIMAL(15,2) NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'EUR', status "InvoiceStatus" NOT NULL DEFAULT 'PENDING',
+    description TEXT, category TEXT, "paymentTerms" TEXT,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP, "updatedAt" TIMESTAMP(3) NOT NULL
+);
+CREATE TABLE line_items (
+    id TEXT PRIMARY KEY, "invoiceId" TEXT NOT NULL, description TEXT NOT NULL,
+    quantity DECIMAL(10,2) NOT NULL, "unitPrice" DECIMAL(15,2) NOT NULL, "totalPrice" DECIMAL(15,2) NOT NULL,
+    category TEXT, "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP, "updatedAt" TIMESTAMP(3) NOT NULL
+);
+CREATE TABLE payments (
+    id TEXT PRIMARY KEY, "invoiceId" TEXT NOT NULL, amount DECIMAL(15,2) NOT NULL,
+    currency TEXT NOT NULL DEFAULT 'EUR', method "PaymentMethod" NOT NULL DEFAULT 'BANK_TRANSFER',
+    reference TEXT, "paidDate" TIMESTAMP(3) NOT NULL, notes TEXT,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP, "updatedAt" TIMESTAMP(3) NOT NULL
+);
+CREATE TABLE bench_meta (scale BIGINT NOT NULL, seeded_at TIMESTAMPTZ NOT NULL DEFAULT now());
+"""
+
+VENDORS_SQL = """
+INSERT INTO vendors (id, name, city, country, category, "updatedAt")
+SELECT 'vendor_' || g, 'Vendor ' || g,
+       (ARRAY['Berlin', 'Hamburg', 'Munich', 'Cologne', 'Frankfurt'])[1 + g % 5], 'Germany',
+       (ARRAY['Services', 'Software', 'Hardware', 'Logistics', 'Office Supplies', 'Consulting'])[1 + g % 6],
+       now()
+FROM generate_series(1, %(count)s) AS g
+"""
+
+CUSTOMERS_SQL = """
+INSERT INTO customers (id, name, city, country, "updatedAt")
+SELECT 'customer_' || g, 'Customer ' || g,
+       (ARRAY['Berlin', 'Hamburg', 'Munich', 'Cologne', 'Frankfurt'])[1 + g % 5], 'Germany', now()
+FROM generate_series(1, %(count)s) AS g
+"""
+
+# h is a non-negative hash of the row number; other attributes are slices of it
+INVOICES_SQL = """
+INSERT INTO invoices (
+    id, "invoiceNumber", "vendorId", "customerId", "issueDate", "dueDate", "paidDate",
+    subtotal, "taxAmount", "totalAmount", currency, status, description, category, "updatedAt"
+)
+SELECT 'inv_' || g, 'INV-' || lpad(g::text, 9, '0'),
+       'vendor_' || (1 + h %% %(vendors)s),
+       CASE WHEN h %% 4 = 0 THEN NULL ELSE 'customer_' || (1 + (h / 7) %% %(customers)s) END,
+       issued, issued + INTERVAL '30 days',
+       CASE WHEN status = 'PAID' THEN issued + INTERVAL '1 day' * (h %% 30) END,
+       amount, round(amount * 0.19, 2), round(amount * 1.19, 2), 'EUR', status::"InvoiceStatus",
+       'Benchmark invoice ' || g,
+       (ARRAY['Services', 'Software', 'Hardware', 'Logistics', 'Office Supplies', 'Consulting'])[1 + (h / 11) %% 6],
+       now()
+FROM (
+    SELECT g, h,
+           TIMESTAMP '2022-01-01' + INTERVAL '1 second' * (h %% (3 * 365 * 86400)) AS issued,
+           round(10 + (h / 13) %% 500000 / 100.0, 2) AS amount,
+           (ARRAY['PAID', 'PAID', 'PAID', 'PENDING', 'PENDING', 'OVERDUE', 'DRAFT', 'CANCELLED'])[1 + (h / 17) %% 8] AS status
+    FROM (
+        SELECT g, abs(hashint8(g)::bigint) AS h
+        FROM generate_series(%(start)s, %(stop)s) AS g
+    ) AS numbered
+) AS generated
+"""
+
+LINE_ITEMS_SQL = """
+INSERT INTO line_items (id, "invoiceId", description, quantity, "unitPrice", "totalPrice", category, "updatedAt")
+SELECT i.id || '_' || n, i.id, 'Item ' || n || ' of ' || i."invoiceNumber",
+       1, round(i.subtotal / %(per_invoice)s, 2), round(i.subtotal / %(per_invoice)s, 2), i.category, now()
+FROM generate_series(%(start)s, %(stop)s) AS g
+JOIN invoices AS i ON i.id = 'inv_' || g
+CROSS JOIN generate_series(1, %(per_invoice)s) AS n
+"""
+
+PAYMENTS_SQL = """
+INSERT INTO payments (id, "invoiceId", amount, currency, method, reference, "paidDate", "updatedAt")
+SELECT 'pay_' || g, i.id, i."totalAmount", i.currency,
+       (ARRAY['BANK_TRANSFER', 'BANK_TRANSFER', 'CREDIT_CARD', 'PAYPAL', 'OTHER'])[1 + g %% 5]::"PaymentMethod",
+       i."invoiceNumber", i."paidDate", now()
+FROM generate_series(%(start)s, %(stop)s) AS g
+JOIN invoices AS i ON i.id = 'inv_' || g
+WHERE i.status = 'PAID'
+"""
+
+# Indexes and keys from schema.prisma, created once the data is in
+CONSTRAINTS_SQL = """
+CREATE UNIQUE INDEX "invoices_invoiceNumber_key" ON invoices ("invoiceNumber");
+CREATE INDEX "invoices_vendorId_idx" ON invoices ("vendorId");
+CREATE INDEX "invoices_issueDate_idx" ON invoices ("issueDate");
+CREATE INDEX "invoices_status_idx" ON invoices (status);
+CREATE INDEX "line_items_invoiceId_idx" ON line_items ("invoiceId");
+CREATE INDEX "payments_invoiceId_idx" ON payments ("invoiceId");
+CREATE INDEX "payments_paidDate_idx" ON payments ("paidDate");
+ALTER TABLE invoices ADD CONSTRAINT "invoices_vendorId_fkey" FOREIGN KEY ("vendorId") REFERENCES vendors (id) ON DELETE CASCADE;
+ALTER TABLE invoices ADD CONSTRAINT "invoices_customerId_fkey" FOREIGN KEY ("customerId") REFERENCES customers (id);
+ALTER TABLE line_items ADD CONSTRAINT "line_items_invoiceId_fkey" FOREIGN KEY ("invoiceId") REFERENCES invoices (id) ON DELETE CASCADE;
+ALTER TABLE payments ADD CONSTRAINT "payments_invoiceId_fkey" FOREIGN KEY ("invoiceId") REFERENCES invoices (id) ON DELETE CASCADE;
+ANALYZE;
+"""
+
+
+def parse_scale(scale: str) -> int:
+    if scale.lower() in SCALES:
+        return SCALES[scale.lower()]
+    return int(scale)
+
+
+def bench_database_url() -> str:
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        raise ValueError("BENCH_DATABASE_URL not configured (use a disposable local database)")
+    return url.replace("postgresql+psycopg://", "postgresql://").split("?")[0]
+
+
+def seeded_scale(cursor) -> int:
+    """Invoice count of an existing benchmark dataset (0 if none).
+
+    Refuses to touch a database that has invoices but was not seeded
+    here, since seeding drops the tables.
+    """
+    cursor.execute("SELECT to_regclass('public.bench_meta') IS NOT NULL, to_regclass('public.invoices') IS NOT NULL")
+    has_meta, has_invoices = cursor.fetchone()
+    if has_invoices and not has_meta:
+        raise RuntimeError("Target database has an invoices table that was not created by the benchmark seeder")
+    if not has_meta:
+        return 0
+    cursor.execute("SELECT scale FROM bench_meta")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def seed(database_url: str, invoices: int, force: bool = False) -> bool:
+    """Create the benchmark dataset; returns False when it already exists at this scale"""
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            if seeded_scale(cursor) == invoices and not force:
+                logger.info(f"Benchmark database already seeded with {invoices} invoices")
+                return False
+
+            started = time.monotonic()
+            cursor.execute(SCHEMA_SQL)
+            vendors = max(10, invoices // 200)
+            customers = max(10, invoices // 100)
+            cursor.execute(VENDORS_SQL, {"count": vendors})
+            cursor.execute(CUSTOMERS_SQL, {"count": customers})
+            for start in range(1, invoices + 1, CHUNK_ROWS):
+                params = {
+                    "start": start,
+                    "stop": min(invoices, start + CHUNK_ROWS - 1),
+                    "vendors": vendors,
+                    "customers": customers,
+                    "per_invoice": LINE_ITEMS_PER_INVOICE,
+                }
+                cursor.execute(INVOICES_SQL, params)
+                cursor.execute(LINE_ITEMS_SQL, params)
+                cursor.execute(PAYMENTS_SQL, params)
+                logger.info(f"Seeded invoices {params['start']}-{params['stop']}")
+            cursor.execute(CONSTRAINTS_SQL)
+            cursor.execute("INSERT INTO bench_meta (scale) VALUES (%s)", (invoices,))
+            logger.info(f"✅ Seeded {invoices} invoices in {time.monotonic() - started:.1f}s")
+            return True
+    finally:
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed the benchmark database")
+    parser.add_argument("--scale", default="10k", help="invoice count: 10k, 1m, 10m or a number")
+    parser.add_argument("--force", action="store_true", help="reseed even if the scale matches")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    seed(bench_database_url(), parse_scale(args.scale), force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""CPU cost of encoding a /chat response, per 10k rows.
+
+Builds a synthetic invoice result (strings, Decimal amounts, datetimes,
+ints and NULLs, as psycopg2 returns them) and times, in CPU seconds, each
+way the server has encoded it:
+
+- response_model: a ChatResponse returned through FastAPI's response_model,
+  which validates the rows, dumps them, validates them again and runs
+  jsonable_encoder before json.dumps
+- model_dump_json: ChatResponse(**result).model_dump_json()
+- dumps: the rows as-is through serialization.dumps (orjson when installed)
+
+and the same for one streamed batch of rows (json.dumps vs dumps).
+
+Usage: python -m benchmarks.serialization [--rows 10000] [--repeats 7]
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List
+
+# Encoding only; keep main from connecting to a database at import
+os.environ.setdefault("DATABASE_URL", "")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import main as app_module
+import serialization
+
+
+def synthetic_rows(count: int) -> List[Dict[str, Any]]:
+    """Invoice-shaped rows with the value types psycopg2 returns"""
+    issued = datetime(2024, 1, 1, 9, 30)
+    return [
+        {
+            "id": index,
+            "invoiceNumber": f"INV-{index:07d}",
+            "vendor": f"Vendor {index % 250}",
+            "totalAmount": Decimal(f"{(index * 37) % 100000}.{index % 100:02d}"),
+            "issueDate": issued + timedelta(minutes=index),
+            "status": ("paid", "pending", "overdue")[index % 3],
+            "notes": None if index % 4 else f"note {index}",
+        }
+        for index in range(count)
+    ]
+
+
+def cpu_ms(func: Callable[[], Any], repeats: int) -> float:
+    """Median CPU time of func in milliseconds"""
+    samples = []
+    for _ in range(repeats):
+        started = time.process_time()
+        func()
+        samples.append((time.process_time() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure /chat response encoding CPU time")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=7)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    result = {"question": "invoices this year", "sql": "SELECT ...", "data": rows, "chart_config": {"type": "table"}}
+    field = create_response_field(name="Response_chat", type_=app_module.ChatResponse)
+
+    def response_model() -> bytes:
+        content = asyncio.run(serialize_response(field=field, response_content=app_module.ChatResponse(**result)))
+        return JSONResponse(content).body
+
+    def model_dump_json() -> bytes:
+        return app_module.ChatResponse(**result).model_dump_json().encode("utf-8")
+
+    def fast() -> bytes:
+        return serialization.dumps(app_module.model_shape(app_module.ChatResponse, result))
+
+    batch = {"type": "rows", "rows": rows}
+    paths = {
+        "response_model": response_model,
+        "model_dump_json": model_dump_json,
+        "dumps": fast,
+        "stream json.dumps": lambda: json.dumps(batch, default=serialization.json_default, separators=(",", ":")).encode("utf-8"),
+        "stream dumps": lambda: app_module.encode_stream_event(batch, sse=False),
+    }
+
+    encoder = "orjson" if serialization.orjson is not None else "json"
+    print(f"{args.rows} rows, median of {args.repeats} runs, serialization.dumps uses {encoder}")
+    per_10k = 10000 / args.rows
+    for name, func in paths.items():
+        func()
+        ms = cpu_ms(func, args.repeats)
+        print(f"  {name:<18} {ms:8.1f} ms CPU  ({ms * per_10k:.1f} ms per 10k rows, {len(func()):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Cold-start measurements for the ai-server, with an import-time budget.
+
+Imports main in fresh interpreters (python -X importtime) and reports the
+median import time and the modules main imports that cost the most, then
+optionally starts a server and times how long it takes until /ready. Exits
+with status 1 when the median import time exceeds --budget-ms.
+
+Usage: python -m benchmarks.startup [--runs 5] [--budget-ms 1500] [--ready]
+"""
+import os
+import re
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.run import AI_SERVER_DIR, RESULTS_DIR, Process, free_port, wait_ready
+
+# "import time: self [us] | cumulative | <indent>package"
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure_import() -> Tuple[float, Dict[str, float]]:
+    """Import main in a fresh interpreter: (total ms, ms per module main imports directly)"""
+    env = {**os.environ, "DATABASE_URL": ""}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=AI_SERVER_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    total = 0.0
+    children: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        cumulative_ms = int(match.group(2)) / 1000
+        depth = len(match.group(3)) // 2
+        if match.group(4) == "main" and depth == 0:
+            total = cumulative_ms
+        elif depth == 1:
+            children[match.group(4)] = cumulative_ms
+    return total, children
+
+
+async def measure_ready(timeout: float) -> Dict[str, float]:
+    """Start a server and time it until /ready, alongside its own startup report"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    port = free_port()
+    started = time.perf_counter()
+    server = Process(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        dict(os.environ), os.path.join(RESULTS_DIR, "startup_server.log"),
+    )
+    try:
+        await wait_ready(f"http://127.0.0.1:{port}/ready", server, timeout)
+        wall = time.perf_counter() - started
+        async with httpx.AsyncClient() as client:
+            reported = (await client.get(f"http://127.0.0.1:{port}/ready")).json()["startup_seconds"]
+    finally:
+        server.stop()
+    return {"wall_until_ready": round(wall, 3), **reported}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure ai-server cold start")
+    parser.add_argument("--runs", type=int, default=5, help="fresh-interpreter imports to take the median of")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="allowed median import time of main")
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports to list")
+    parser.add_argument("--ready", action="store_true", help="also time a server until /ready (uses DATABASE_URL)")
+    parser.add_argument("--ready-timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    totals: List[float] = []
+    per_module: Dict[str, List[float]] = {}
+    for _ in range(args.runs):
+        total, children = measure_import()
+        totals.append(total)
+        for module, ms in children.items():
+            per_module.setdefault(module, []).append(ms)
+
+    median = statistics.median(totals)
+    print(f"import main: median {median:.0f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    slowest = sorted(per_module.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for module, values in slowest[:args.top]:
+        print(f"  {module:<32} {statistics.median(values):8.1f} ms")
+
+    if args.ready:
+        timings = asyncio.run(measure_ready(args.ready_timeout))
+        print("until ready: " + ", ".join(f"{phase} {seconds}s" for phase, seconds in timings.items()))
+
+    if median > args.budget_ms:
+        print(f"OVER BUDGET by {median - args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
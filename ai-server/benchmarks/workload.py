@@ -0,0 +1,64 @@
+"""Benchmark questions and the SQL the LLM stub answers them with.
+
+Questions are grouped by result size so latency can be compared between
+single-value aggregates, small grouped results and large row sets.
+"""
+from typing import Dict, List, Tuple
+
+# size -> [(question, sql)]
+WORKLOAD: Dict[str, List[Tuple[str, str]]] = {
+    "small": [
+        (
+            "What is the total spend across all invoices?",
+            'SELECT SUM("totalAmount") AS total_spend FROM invoices',
+        ),
+        (
+            "How many invoices are overdue?",
+            "SELECT COUNT(*) AS overdue_invoices FROM invoices WHERE status = 'OVERDUE'",
+        ),
+    ],
+    "medium": [
+        (
+            "Show total spend per month",
+            'SELECT date_trunc(\'month\', "issueDate") AS month, SUM("totalAmount") AS total_spend '
+            "FROM invoices GROUP BY 1 ORDER BY 1",
+        ),
+        (
+            "Which 50 vendors do we spend the most with?",
+            'SELECT v.name AS vendor, SUM(i."totalAmount") AS total_spend FROM invoices i '
+            'JOIN vendors v ON v.id = i."vendorId" GROUP BY v.name ORDER BY total_spend DESC LIMIT 50',
+        ),
+    ],
+    "large": [
+        (
+            "List the most recent invoices",
+            'SELECT "invoiceNumber", "issueDate", "totalAmount", status FROM invoices '
+            'ORDER BY "issueDate" DESC, id LIMIT 10000',
+        ),
+        (
+            "List paid invoices with their vendor",
+            'SELECT i."invoiceNumber", v.name AS vendor, i."totalAmount", i."paidDate" FROM invoices i '
+            'JOIN vendors v ON v.id = i."vendorId" WHERE i.status = \'PAID\' ORDER BY i."paidDate" DESC, i.id LIMIT 10000',
+        ),
+    ],
+}
+
+# Answer for questions outside the workload
+FALLBACK_SQL = "SELECT COUNT(*) AS invoices FROM invoices"
+
+# Appended to questions in cold runs so every request is a distinct question
+VARIANT_SUFFIX = " (request {})"
+
+
+def questions(size: str) -> List[str]:
+    return [question for question, _ in WORKLOAD[size]]
+
+
+def sql_for(message: str) -> str:
+    """SQL for a question, ignoring a variant suffix"""
+    question = message.split(" (request ", 1)[0].strip()
+    for entries in WORKLOAD.values():
+        for known, sql in entries:
+            if known == question:
+                return sql
+    return FALLBACK_SQL
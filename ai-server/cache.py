@@ -0,0 +1,357 @@
+import re
+import sys
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_WORDS = {
+    "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "nine": "9",
+    "ten": "10", "eleven": "11", "twelve": "12", "fifteen": "15",
+    "twenty": "20", "fifty": "50", "hundred": "100",
+}
+_THOUSANDS_RE = re.compile(r"(?<=\d),(?=\d{3}\b)")
+_TRAILING_ZEROS_RE = re.compile(r"\b(\d+)\.0+\b")
+# Symbols that change what a question asks for become words before the
+# remaining punctuation is dropped: "> 1000" and "< 1000", or "-5%" and "5"
+_SYMBOL_WORDS = {">=": "gte", "=>": "gte", "<=": "lte", "=<": "lte", "<>": "ne", "!=": "ne",
+                 ">": "gt", "<": "lt", "=": "eq", "%": "pct", "+": "plus", "-": "neg"}
+_SYMBOL_RE = re.compile(r">=|=>|<=|=<|<>|!=|[<>=%+]|(?<!\w)-(?=\.?\d)")
+_PUNCT_RE = re.compile(r"[^\w\s.]|(?<!\d)\.|\.(?!\d)")
+_SPACE_RE = re.compile(r"\s+")
+
+# Bump whenever normalize_question changes, so question keys persisted
+# under the old rules are dropped instead of matching different questions
+NORMALIZATION_VERSION = "2"
+
+
+def normalize_question(question: str) -> str:
+    """Fold case, whitespace, punctuation and number spelling of a question.
+
+    Comparison operators, signs and ``%`` are kept as words (gt, lt, neg,
+    pct, ...) so questions that differ only in them stay different.
+    """
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = _THOUSANDS_RE.sub("", text)
+    text = _TRAILING_ZEROS_RE.sub(r"\1", text)
+    text = _SYMBOL_RE.sub(lambda match: f" {_SYMBOL_WORDS[match.group()]} ", text)
+    text = _PUNCT_RE.sub(" ", text)
+    words = [_NUMBER_WORDS.get(word, word) for word in text.split()]
+    return _SPACE_RE.sub(" ", " ".join(words)).strip()
+
+
+def fingerprint(*parts: str) -> str:
+    """Stable short hash of the given strings"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class QuestionCache:
+    """LRU + TTL cache mapping normalized questions to generated SQL.
+
+    Entries are scoped to a namespace (a fingerprint of the schema text and
+    model name); switching namespace drops every entry from the old one. When
+    ``path`` is set, entries are also written to a SQLite file so they
+    survive restarts and can be shared between worker processes.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 86400.0, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._namespace: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS question_sql ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, question TEXT NOT NULL,"
+                " sql TEXT NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def _switch_namespace(self, namespace: str) -> None:
+        if namespace == self._namespace:
+            return
+        if self._namespace is not None:
+            logger.info("Schema or model changed, invalidating question cache")
+        self._entries.clear()
+        self._namespace = namespace
+        if self._db is not None:
+            self._db.execute("DELETE FROM question_sql WHERE namespace != ?", (namespace,))
+
+    def get(self, question: str, namespace: str) -> Optional[str]:
+        """Return cached SQL for the question, or None on a miss"""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._switch_namespace(namespace)
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT sql, created_at FROM question_sql WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._store(key, entry)
+                    self._stats["disk_hits"] += 1
+            if entry is None or now - entry[1] > self.ttl:
+                if entry is not None:
+                    self._delete(key)
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, question: str, sql: str, namespace: str) -> None:
+        """Remember the SQL generated for a question"""
+        key = normalize_question(question)
+        entry = (sql, time.time())
+        with self._lock:
+            self._switch_namespace(namespace)
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute("DELETE FROM question_sql WHERE created_at < ?", (entry[1] - self.ttl,))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO question_sql (namespace, key, question, sql, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (namespace, key, question, sql, entry[1]),
+                )
+
+    def _store(self, key: str, entry: tuple) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute(
+                "DELETE FROM question_sql WHERE namespace = ? AND key = ?", (self._namespace, key)
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM question_sql")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._entries), "max_entries": self.max_entries, **self._stats}
+
+
+def estimate_size(rows: List[Dict[str, Any]]) -> int:
+    """Approximate in-memory size of a result set in bytes"""
+    total = sys.getsizeof(rows)
+    for row in rows:
+        total += sys.getsizeof(row)
+        for value in row.values():
+            total += sys.getsizeof(value)
+    return total
+
+
+class SharedStore:
+    """Key/value store in a SQLite file shared by the worker processes.
+
+    Values are pickled, grouped by namespace and may expire after a TTL.
+    The file is bounded by ``max_bytes`` of values, dropping the oldest
+    entries first. Errors (e.g. a lock held too long by another process)
+    are logged and reported as misses: callers treat the store as a cache.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS shared_entries ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+            " size INTEGER NOT NULL, created_at REAL NOT NULL, expires_at REAL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS shared_entries_created ON shared_entries (created_at)")
+
+    def get(self, namespace: str, key: str) -> Any:
+        """Return the stored value, or None when missing or expired"""
+        try:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM shared_entries WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                ).fetchone()
+            if row is not None and (row[1] is None or row[1] > time.time()):
+                value = pickle.loads(row[0])
+                self._stats["hits"] += 1
+                return value
+        except (sqlite3.Error, pickle.UnpicklingError) as e:
+            logger.warning(f"Shared cache read failed: {e}")
+            self._stats["errors"] += 1
+        self._stats["misses"] += 1
+        return None
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Store a value; returns False if it is too large or the write failed"""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes // 8:
+            return False
+        now = time.time()
+        try:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO shared_entries (namespace, key, value, size, created_at, expires_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (namespace, key, blob, len(blob), now, now + ttl if ttl else None),
+                )
+                self._stats["writes"] += 1
+                self._evict(now)
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache write failed: {e}")
+            self._stats["errors"] += 1
+            return False
+
+    def _evict(self, now: float) -> None:
+        self._db.execute("DELETE FROM shared_entries WHERE expires_at < ?", (now,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM shared_entries").fetchone()[0]
+        while total > self.max_bytes:
+            oldest = self._db.execute(
+                "SELECT namespace, key, size FROM shared_entries ORDER BY created_at LIMIT 32"
+            ).fetchall()
+            for namespace, key, size in oldest:
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM shared_entries WHERE namespace = ? AND key = ?", (namespace, key))
+                total -= size
+                self._stats["evictions"] += 1
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            with self._lock:
+                self._db.execute("DELETE FROM shared_entries WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared cache delete failed: {e}")
+            self._stats["errors"] += 1
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._db.execute("DELETE FROM shared_entries")
+            else:
+                self._db.execute("DELETE FROM shared_entries WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            with self._lock:
+                size, total = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM shared_entries"
+                ).fetchone()
+        except sqlite3.Error:
+            size, total = None, None
+        return {"size": size, "bytes": total, "max_bytes": self.max_bytes, **self._stats}
+
+
+class ResultCache:
+    """LRU cache of query results bounded by approximate size in bytes.
+
+    Each entry remembers the data version it was computed against; a lookup
+    with a different version is a miss and drops the stale entry. With a
+    ``shared`` store, results are also published there so other worker
+    processes can reuse them.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entry_bytes: Optional[int] = None,
+        shared: Optional[SharedStore] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self.shared = shared
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "shared_hits": 0, "stale": 0, "evictions": 0, "too_large": 0}
+
+    def get(self, key: str, version: Any) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            if entry is not None:
+                self._remove(key)
+                self._stats["stale"] += 1
+
+        if self.shared is not None:
+            shared = self.shared.get("results", key)
+            if shared is not None and shared[0] == version:
+                with self._lock:
+                    self._store(key, version, shared[1], estimate_size(shared[1]))
+                    self._stats["shared_hits"] += 1
+                return shared[1]
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, version: Any, rows: List[Dict[str, Any]]) -> None:
+        size = estimate_size(rows)
+        with self._lock:
+            if size > self.max_entry_bytes:
+                self._stats["too_large"] += 1
+                return
+            self._store(key, version, rows, size)
+        if self.shared is not None:
+            self.shared.put("results", key, (version, rows))
+
+    def _store(self, key: str, version: Any, rows: List[Dict[str, Any]], size: int) -> None:
+        self._remove(key)
+        self._entries[key] = (version, rows, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                **self._stats,
+            }
@@ -0,0 +1,189 @@
+import re
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Bucket sizes tried, finest first, when rolling a time axis up
+TIME_BUCKETS = ("day", "week", "month", "quarter", "year")
+
+# Aggregates whose values still mean the same thing when summed into a
+# coarser bucket; an AVG, MIN, MAX or COUNT(DISTINCT) doesn't
+ADDITIVE_AGGREGATES = {"count", "sum"}
+# Measure names to go by when the SQL doesn't say how a column was computed
+_ADDITIVE_NAME_RE = re.compile(r"count|total|sum|amount|spend|revenue|quantity|qty|^n$|^num", re.IGNORECASE)
+_NON_ADDITIVE_NAME_RE = re.compile(r"avg|average|mean|median|rate|ratio|pct|percent|share|min|max|price|balance", re.IGNORECASE)
+
+
+def is_additive(column: str, aggregate: Optional[str] = None) -> bool:
+    """Whether a measure can be summed across rows: by the SQL aggregate that
+    produced it when known, otherwise by its name"""
+    if aggregate is not None:
+        return aggregate in ADDITIVE_AGGREGATES
+    return bool(_ADDITIVE_NAME_RE.search(column)) and not _NON_ADDITIVE_NAME_RE.search(column)
+
+
+def numeric_column(data: List[Dict], column: str) -> Optional[np.ndarray]:
+    """Column as a float array (None -> NaN), or None if it isn't numeric"""
+    values = np.empty(len(data), dtype=float)
+    for i, row in enumerate(data):
+        value = row.get(column)
+        if value is None:
+            values[i] = np.nan
+        elif isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            values[i] = float(value)
+        else:
+            return None
+    return values
+
+
+def datetime_column(data: List[Dict], column: str) -> Optional[np.ndarray]:
+    """Column as datetime64[s] (aware values converted to naive UTC), or None"""
+    values = []
+    for row in data:
+        value = row.get(column)
+        if isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        elif isinstance(value, date):
+            value = datetime(value.year, value.month, value.day)
+        elif value is not None:
+            return None
+        values.append(value)
+    if all(value is None for value in values):
+        return None
+    return np.array(values, dtype="datetime64[s]")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` representative points.
+
+    ``x`` must be sorted ascending. The first and last points are always kept.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    y = np.nan_to_num(y)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def _bucket_starts(timestamps: np.ndarray, bucket: str) -> np.ndarray:
+    days = timestamps.astype("datetime64[D]")
+    if bucket == "day":
+        return days
+    if bucket == "week":
+        # Weeks start on Monday; 1970-01-01 was a Thursday
+        return days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    months = timestamps.astype("datetime64[M]")
+    if bucket == "month":
+        return months.astype("datetime64[D]")
+    if bucket == "quarter":
+        month_numbers = months.astype(np.int64)
+        return (month_numbers - month_numbers % 3).astype("datetime64[M]").astype("datetime64[D]")
+    return timestamps.astype("datetime64[Y]").astype("datetime64[D]")
+
+
+def time_bucket_rollup(
+    timestamps: np.ndarray, values: np.ndarray, max_points: int
+) -> Optional[Tuple[str, np.ndarray, np.ndarray]]:
+    """Sum values into the finest calendar bucket that fits within max_points.
+
+    Returns (bucket, bucket starts, sums), or None if even yearly buckets
+    don't fit. Rows with no timestamp are dropped.
+    """
+    valid = ~np.isnat(timestamps)
+    timestamps, values = timestamps[valid], np.nan_to_num(values[valid])
+    for bucket in TIME_BUCKETS:
+        starts, inverse = np.unique(_bucket_starts(timestamps, bucket), return_inverse=True)
+        if len(starts) <= max_points:
+            return bucket, starts, np.bincount(inverse, weights=values, minlength=len(starts))
+    return None
+
+
+def top_n_with_other(values: np.ndarray, max_categories: int) -> Tuple[np.ndarray, float]:
+    """Indices of the largest max_categories - 1 values (original order) and the sum of the rest"""
+    values = np.nan_to_num(values)
+    keep = max(max_categories - 1, 1)
+    order = np.argsort(-values, kind="stable")
+    top = np.sort(order[:keep])
+    other = float(values[order[keep:]].sum())
+    return top, other
+
+
+def reduce_chart_data(
+    data: List[Dict],
+    chart_type: str,
+    x_axis: Optional[str],
+    y_axis: Optional[str],
+    max_points: int,
+    max_categories: int,
+    additive: bool = False,
+) -> Optional[Tuple[List[Dict], str]]:
+    """Shrink chart rows to fit the point budget for the given chart type.
+
+    Time series are summed into calendar buckets only when ``additive`` (see
+    is_additive); other measures, like averages, keep LTTB-selected points.
+    Returns (rows, method) or None when the data already fits or can't be
+    reduced meaningfully.
+    """
+    n = len(data)
+    if chart_type in ("bar", "pie"):
+        if n <= max_categories or not x_axis or not y_axis:
+            return None
+        y = numeric_column(data, y_axis)
+        if y is None:
+            return None
+        top, other = top_n_with_other(y, max_categories)
+        rows = [data[i] for i in top]
+        rows.append({x_axis: "Other", y_axis: other})
+        return rows, "top_n"
+
+    if n <= max_points:
+        return None
+
+    if chart_type == "table":
+        return data[:max_points], "truncate"
+
+    if chart_type == "line" and x_axis and y_axis:
+        y = numeric_column(data, y_axis)
+        if y is not None:
+            timestamps = datetime_column(data, x_axis)
+            if timestamps is not None:
+                rollup = time_bucket_rollup(timestamps, y, max_points) if additive else None
+                if rollup is not None:
+                    bucket, starts, sums = rollup
+                    rows = [
+                        {x_axis: start.item().isoformat(), y_axis: float(total)}
+                        for start, total in zip(starts, sums)
+                    ]
+                    return rows, f"time_bucket:{bucket}"
+                x = timestamps.astype(np.int64).astype(float)
+            else:
+                x = numeric_column(data, x_axis)
+                if x is None or np.isnan(x).any() or np.any(np.diff(x) < 0):
+                    x = np.arange(n, dtype=float)
+            return [data[i] for i in lttb_indices(x, y, max_points)], "lttb"
+
+    # Anything else: evenly spaced sample that keeps the first and last rows
+    indices = np.unique(np.linspace(0, n - 1, max_points).astype(int))
+    return [data[i] for i in indices], "sample"
@@ -0,0 +1,235 @@
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out within the timeout"""
+
+
+class _PooledConnection:
+    """Bookkeeping for a single pooled connection"""
+
+    __slots__ = ("conn", "created_at", "last_used", "uses")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+        self.uses = 0
+
+
+class ConnectionPool:
+    """Thread-safe bounded psycopg2 connection pool.
+
+    Connections are validated on checkout and recycled once they have been
+    used ``max_uses`` times or are older than ``max_lifetime`` seconds.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        minconn: int = 1,
+        maxconn: int = 10,
+        timeout: float = 10.0,
+        max_uses: int = 1000,
+        max_lifetime: float = 1800.0,
+        validate_idle: float = 5.0,
+        **connect_kwargs: Any,
+    ):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: need 0 <= minconn <= maxconn and maxconn >= 1")
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.max_lifetime = max_lifetime
+        self.validate_idle = validate_idle
+        self.connect_kwargs = connect_kwargs
+
+        self._idle: deque = deque()
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "discarded": 0,
+        }
+
+    def _connect(self) -> _PooledConnection:
+        conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        with self._cond:
+            self._stats["created"] += 1
+        return _PooledConnection(conn)
+
+    def _close_quietly(self, entry: _PooledConnection) -> None:
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _is_expired(self, entry: _PooledConnection) -> bool:
+        if self.max_uses and entry.uses >= self.max_uses:
+            return True
+        if self.max_lifetime and time.monotonic() - entry.created_at >= self.max_lifetime:
+            return True
+        return False
+
+    def _is_alive(self, entry: _PooledConnection) -> bool:
+        conn = entry.conn
+        if conn.closed:
+            return False
+        # Only ping connections that have been sitting idle for a while
+        if time.monotonic() - entry.last_used < self.validate_idle:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def prefill(self) -> None:
+        """Open connections until the pool holds at least ``minconn``"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                entry = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Check out a live connection, waiting up to ``timeout`` seconds"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError("Connection pool is closed")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {timeout:.1f}s waiting for a database connection "
+                            f"({self._size}/{self.maxconn} in use)"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            # Network work happens outside the lock
+            if create:
+                try:
+                    entry = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_alive(entry):
+                logger.warning("Discarding dead pooled database connection")
+                self._discard(entry)
+                continue
+
+            with self._cond:
+                entry.uses += 1
+                self._in_use[id(entry.conn)] = entry
+                self._stats["checkouts"] += 1
+            return entry.conn
+
+    def _discard(self, entry: _PooledConnection, recycled: bool = False) -> None:
+        self._close_quietly(entry)
+        with self._cond:
+            self._size -= 1
+            self._stats["recycled" if recycled else "discarded"] += 1
+            self._cond.notify()
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        """Return a connection to the pool"""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise ValueError("Connection does not belong to this pool")
+
+        if discard or conn.closed or self._closed:
+            self._discard(entry)
+            return
+
+        # Never hand out a connection with an open transaction
+        try:
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(entry)
+            return
+
+        if self._is_expired(entry):
+            self._discard(entry, recycled=True)
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool size and lifetime counters"""
+        with self._cond:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": self._waiting,
+                **self._stats,
+            }
+
+    def closeall(self) -> None:
+        """Close idle connections and stop handing out new ones"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry)
@@ -0,0 +1,118 @@
+import json
+import math
+import logging
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Feature space size for hashed n-grams
+_DIMENSIONS = 1 << 18
+
+
+def question_features(question: str) -> Counter:
+    """Hashed word unigrams/bigrams and character trigrams of a question"""
+    text = normalize_question(question)
+    words = text.split()
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {text} "
+    grams += [f"#{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return Counter(zlib.crc32(gram.encode("utf-8")) % _DIMENSIONS for gram in grams)
+
+
+class ExampleStore:
+    """Verified question -> SQL pairs with a TF-IDF similarity index.
+
+    Seed examples are read from ``seed_path``; examples added at runtime are
+    appended to ``store_path`` (JSON lines) when it is set, so they are
+    loaded again on the next start.
+    """
+
+    def __init__(self, seed_path: Optional[str] = None, store_path: Optional[str] = None):
+        self.store_path = store_path
+        self._examples: List[Dict[str, str]] = []
+        self._features: List[Counter] = []
+        self._vectors: List[Dict[int, float]] = []
+        self._idf: Dict[int, float] = {}
+        self._keys = set()
+        self._lock = threading.Lock()
+
+        if seed_path:
+            with open(seed_path, encoding="utf-8") as f:
+                for example in json.load(f):
+                    self._append(example["question"], example["sql"])
+        if store_path:
+            try:
+                with open(store_path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            example = json.loads(line)
+                            self._append(example["question"], example["sql"])
+            except FileNotFoundError:
+                pass
+        self._reindex()
+        logger.info(f"Loaded {len(self._examples)} SQL examples")
+
+    def __len__(self) -> int:
+        return len(self._examples)
+
+    def _append(self, question: str, sql: str) -> bool:
+        key = normalize_question(question)
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        self._examples.append({"question": question, "sql": sql})
+        self._features.append(question_features(question))
+        return True
+
+    def _reindex(self) -> None:
+        document_frequency = Counter()
+        for features in self._features:
+            document_frequency.update(features.keys())
+        total = len(self._features)
+        self._idf = {
+            feature: math.log((1 + total) / (1 + count)) + 1
+            for feature, count in document_frequency.items()
+        }
+        self._vectors = [self._vectorize(features) for features in self._features]
+
+    def _vectorize(self, features: Counter) -> Dict[int, float]:
+        # Features never seen in the store carry no signal for ranking
+        vector = {
+            feature: (1 + math.log(count)) * self._idf[feature]
+            for feature, count in features.items()
+            if feature in self._idf
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {feature: weight / norm for feature, weight in vector.items()}
+
+    def add(self, question: str, sql: str) -> bool:
+        """Add a verified example; returns False if the question is already known"""
+        with self._lock:
+            if not self._append(question, sql):
+                return False
+            self._reindex()
+            if self.store_path:
+                with open(self.store_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"question": question, "sql": sql}) + "\n")
+            return True
+
+    def search(self, question: str, k: int = 3, min_score: float = 0.1) -> List[Dict[str, Any]]:
+        """The k examples most similar to the question, best first"""
+        with self._lock:
+            query = self._vectorize(question_features(question))
+            scored = []
+            for example, vector in zip(self._examples, self._vectors):
+                score = sum(weight * vector.get(feature, 0.0) for feature, weight in query.items())
+                if score >= min_score:
+                    scored.append((score, example))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [{**example, "score": round(score, 4)} for score, example in scored[:k]]
+
+    def all(self) -> List[Dict[str, str]]:
+        with self._lock:
+            return list(self._examples)
@@ -0,0 +1,645 @@
+"""Bulk loader for the document export in backend/data/Analytics_Test_Data.json.
+
+The export (a JSON array of Mongo documents) is read in chunks and split
+into one document per element without parsing it; worker processes parse
+and flatten batches of documents into CSV rows for vendors, customers,
+invoices, line items, payments and documents. The rows are COPYed into
+temporary staging tables and merged into the Prisma tables with one
+set-based upsert per table, all in a single transaction.
+
+A local manifest (INGEST_MANIFEST_PATH) remembers each document's content
+hash and updatedAt, so re-ingesting a new export only loads the documents
+that changed and deletes the ones that disappeared or were tombstoned.
+
+Usage: python ingest.py [path] [--workers N] [--batch-size N] [--partial] [--force]
+"""
+import io
+import os
+import re
+import csv
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+import urllib.request
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "data", "Analytics_Test_Data.json")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0")) or os.cpu_count() or 1
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_manifest.db"))
+INGEST_NOTIFY_URL = os.getenv("INGEST_NOTIFY_URL", "")
+READ_CHUNK_SIZE = 1 << 20
+
+# Columns loaded per table, in CSV order. Ids are derived from the export so
+# re-running the ingest updates rows instead of duplicating them.
+TABLES: Dict[str, Tuple[str, ...]] = {
+    "vendors": ("id", "name", "address", "taxId", "category"),
+    "customers": ("id", "name", "address"),
+    "invoices": (
+        "id", "invoiceNumber", "vendorId", "customerId", "issueDate", "dueDate", "paidDate",
+        "subtotal", "taxAmount", "totalAmount", "currency", "status", "description", "category", "paymentTerms",
+    ),
+    "line_items": ("id", "invoiceId", "description", "quantity", "unitPrice", "totalPrice", "category"),
+    "payments": ("id", "invoiceId", "amount", "currency", "method", "reference", "paidDate", "notes"),
+    "documents": ("id", "invoiceId", "fileName", "filePath", "fileSize", "mimeType", "type", "uploadedAt"),
+}
+
+# Tables whose rows belong to an invoice and are replaced with it
+CHILD_TABLES = ("line_items", "payments", "documents")
+
+# Staging tables: one per target table, plus the ids of deleted documents
+STAGING_COLUMNS: Dict[str, Tuple[str, ...]] = {**TABLES, "deleted": ("id",)}
+
+STATUSES = {"pending": "PENDING", "paid": "PAID", "overdue": "OVERDUE", "cancelled": "CANCELLED", "draft": "DRAFT"}
+CURRENCY_SYMBOLS = {"€": "EUR", "$": "USD", "£": "GBP", "CHF": "CHF"}
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%m/%d/%Y")
+
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|"|[{}]', re.S)
+_NUMBER_CLEAN_RE = re.compile(r"[^\d,.\-]")
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def iter_documents(path: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[str]:
+    """Yield the raw JSON text of each top-level object in an array file.
+
+    Only braces and string boundaries are scanned, so memory stays at one
+    chunk plus the document being read regardless of the file size.
+    """
+    buffer = ""
+    position = 0
+    depth = 0
+    start: Optional[int] = None
+
+    with open(path, encoding="utf-8") as file:
+        for chunk in iter(lambda: file.read(chunk_size), ""):
+            buffer += chunk
+            for match in _TOKEN_RE.finditer(buffer, position):
+                token = match.group()
+                if token == '"':
+                    # String continues in the next chunk
+                    break
+                position = match.end()
+                if token == "{":
+                    if depth == 0:
+                        start = match.start()
+                    depth += 1
+                elif token == "}":
+                    depth -= 1
+                    if depth == 0:
+                        yield buffer[start:position]
+                        start = None
+
+            keep = position if start is None else start
+            buffer = buffer[keep:]
+            position -= keep
+            if start is not None:
+                start = 0
+
+    if depth or start is not None:
+        raise ValueError(f"{path} ends inside a document")
+
+
+def iter_batches(documents: Iterator[str], size: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------------------------------------------------------------------------
+# Flattening (runs in worker processes)
+# ---------------------------------------------------------------------------
+
+def _extended_json(obj: Dict[str, Any]) -> Any:
+    """Unwrap Mongo extended JSON ({"$date": ...}, {"$numberLong": ...}, {"$oid": ...})"""
+    if len(obj) == 1:
+        key, value = next(iter(obj.items()))
+        if key == "$date":
+            return value
+        if key in ("$numberLong", "$numberInt"):
+            return int(value)
+        if key in ("$numberDouble", "$numberDecimal"):
+            return float(value)
+        if key == "$oid":
+            return value
+    return obj
+
+
+def _value(node: Any) -> Any:
+    """The extracted value of an llmData field, which may or may not be wrapped in {"value": ...}"""
+    if isinstance(node, dict):
+        node = node.get("value")
+    if isinstance(node, str):
+        node = node.strip() or None
+    return node
+
+
+def _section(llm_data: Dict[str, Any], name: str) -> Dict[str, Any]:
+    value = _value(llm_data.get(name))
+    return value if isinstance(value, dict) else {}
+
+
+def _amount(value: Any) -> Optional[float]:
+    value = _value(value)
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return round(float(value), 2)
+    text = _NUMBER_CLEAN_RE.sub("", str(value))
+    if "," in text and "." in text:
+        # 1.234,56 or 1,234.56: the last separator is the decimal point
+        text = text.replace(".", "").replace(",", ".") if text.rfind(",") > text.rfind(".") else text.replace(",", "")
+    else:
+        text = text.replace(",", ".")
+    try:
+        return round(float(text), 2)
+    except ValueError:
+        return None
+
+
+def _date(value: Any) -> Optional[str]:
+    value = _value(value)
+    if not isinstance(value, str):
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value[:10], date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _stable_id(prefix: str, name: str) -> str:
+    digest = hashlib.sha1(" ".join(name.lower().split()).encode("utf-8")).hexdigest()[:16]
+    return f"{prefix}_{digest}"
+
+
+def flatten_document(doc: Dict[str, Any]) -> Dict[str, List[Tuple[Any, ...]]]:
+    """Rows for one export document, keyed by table (see TABLES for the column order).
+
+    Field handling follows backend/src/scripts/ingest-data.ts: documents
+    without extracted invoice data become DRAFT placeholder invoices, and a
+    payment is recorded for invoices whose status is paid.
+    """
+    rows: Dict[str, List[Tuple[Any, ...]]] = {table: [] for table in TABLES}
+    doc_id = doc["_id"]
+    metadata = doc.get("metadata") or {}
+    llm_data = (doc.get("extractedData") or {}).get("llmData") or {}
+    invoice = _section(llm_data, "invoice")
+    vendor = _section(llm_data, "vendor")
+    customer = _section(llm_data, "customer")
+    summary = _section(llm_data, "summary")
+    payment = _section(llm_data, "payment")
+    title = metadata.get("title") or doc.get("name")
+
+    if not invoice:
+        vendor_id = _stable_id("vendor", "Default Vendor")
+        rows["vendors"].append((vendor_id, "Default Vendor", None, None, "General"))
+        rows["invoices"].append((
+            doc_id, f"DOC-{doc_id[:8]}", vendor_id, None, doc.get("createdAt"), None, None,
+            0, 0, 0, "EUR", "DRAFT", title or "Document without invoice data", "Document", None,
+        ))
+        rows["line_items"].append((f"{doc_id}_1", "Document placeholder", 1, 0, 0, None))
+    else:
+        # Older exports keep vendor and customer fields on the invoice itself
+        vendor_name = _value(vendor.get("vendorName")) or _value(invoice.get("vendorName")) or "Unknown Vendor"
+        vendor_id = _stable_id("vendor", vendor_name)
+        rows["vendors"].append((
+            vendor_id,
+            vendor_name,
+            _value(vendor.get("vendorAddress")) or _value(invoice.get("vendorAddress")),
+            _value(vendor.get("vendorTaxId")),
+            _value(invoice.get("category")) or "General",
+        ))
+
+        customer_id = None
+        customer_name = _value(customer.get("customerName")) or _value(invoice.get("customerName"))
+        if customer_name:
+            customer_id = _stable_id("customer", customer_name)
+            rows["customers"].append((customer_id, customer_name, _value(customer.get("customerAddress"))))
+
+        total = _amount(summary.get("invoiceTotal")) or _amount(invoice.get("totalAmount")) or 0
+        subtotal = _amount(summary.get("subTotal")) or _amount(invoice.get("subtotal")) or total
+        tax = _amount(summary.get("totalTax")) or _amount(invoice.get("taxAmount")) or 0
+        currency = _value(invoice.get("currency")) or CURRENCY_SYMBOLS.get(_value(summary.get("currencySymbol")), "EUR")
+        issue_date = _date(invoice.get("invoiceDate")) or doc.get("createdAt")
+        due_date = _date(payment.get("dueDate")) or _date(invoice.get("dueDate"))
+        status = STATUSES.get(str(_value(invoice.get("status")) or "pending").lower(), "PENDING")
+        paid_date = issue_date if status == "PAID" else None
+        category = _value(invoice.get("category")) or "General"
+
+        rows["invoices"].append((
+            doc_id, str(_value(invoice.get("invoiceId")) or f"DOC-{doc_id[:8]}"), vendor_id, customer_id,
+            issue_date, due_date, paid_date, subtotal, tax, total, currency, status,
+            _value(invoice.get("description")) or title, category, _value(payment.get("paymentTerms")),
+        ))
+
+        items = _value(_section(llm_data, "lineItems").get("items")) or invoice.get("lineItems") or []
+        for index, item in enumerate(items if isinstance(items, list) else [], start=1):
+            quantity = _amount(item.get("quantity")) or 1
+            unit_price = _amount(item.get("unitPrice")) or 0
+            line_total = _amount(item.get("totalPrice"))
+            rows["line_items"].append((
+                f"{doc_id}_{index}",
+                str(_value(item.get("description")) or f"Line item {index}"),
+                quantity,
+                unit_price,
+                line_total if line_total is not None else round(quantity * unit_price, 2),
+                None,
+            ))
+        if not rows["line_items"]:
+            rows["line_items"].append((f"{doc_id}_1", title or "Invoice total", 1, total, total, None))
+
+        if status == "PAID":
+            rows["payments"].append((
+                f"{doc_id}_payment", doc_id, total, currency, "BANK_TRANSFER", None, paid_date, None,
+            ))
+
+    # Line items carry their invoice id second
+    rows["line_items"] = [(row[0], doc_id) + row[1:] for row in rows["line_items"]]
+    rows["documents"].append((
+        f"doc_{doc_id}", doc_id, doc.get("name") or doc_id, doc.get("filePath") or doc.get("name") or doc_id,
+        doc.get("fileSize") or 0, doc.get("fileType") or "application/octet-stream",
+        "INVOICE" if metadata.get("templateName") == "Invoice" else "OTHER", doc.get("createdAt"),
+    ))
+    return rows
+
+
+def is_tombstone(doc: Dict[str, Any]) -> bool:
+    """Whether the export marks the document as deleted"""
+    return bool(doc.get("deletedAt") or doc.get("isDeleted") or str(doc.get("status", "")).lower() == "deleted")
+
+
+def flatten_batch(items: List[Tuple[str, str]]) -> Tuple[Dict[str, str], List[Tuple[str, str, Optional[str], bool]], int]:
+    """Parse and flatten a batch of (content hash, document text) pairs.
+
+    Returns one CSV block per table (plus ``deleted`` with the ids of
+    tombstoned documents), a manifest entry (id, hash, updatedAt, deleted)
+    per document, and the number of documents that could not be flattened
+    (logged and skipped, as the TypeScript ingest does).
+    """
+    buffers = {table: io.StringIO() for table in STAGING_COLUMNS}
+    writers = {table: csv.writer(buffer, lineterminator="\n") for table, buffer in buffers.items()}
+    entries = []
+    errors = 0
+    for content_hash, text in items:
+        try:
+            doc = json.loads(text, object_hook=_extended_json)
+            deleted = is_tombstone(doc)
+            rows = {"deleted": [(doc["_id"],)]} if deleted else flatten_document(doc)
+        except Exception as e:
+            logger.warning(f"Skipping document: {e}")
+            errors += 1
+            continue
+        for table, table_rows in rows.items():
+            writers[table].writerows(table_rows)
+        entries.append((doc["_id"], content_hash, doc.get("updatedAt"), deleted))
+    return {table: buffer.getvalue() for table, buffer in buffers.items()}, entries, errors
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+
+class IngestManifest:
+    """Local SQLite record of the loaded documents: _id -> content hash and updatedAt.
+
+    Each ingest is one run inside a SQLite transaction: documents whose hash
+    is already recorded are marked as seen and skipped, changed documents
+    are recorded after flattening, and documents not seen by the end of a
+    full export are the ones deleted upstream. The transaction is committed
+    only after the database merge, so a failed ingest leaves it unchanged.
+    """
+
+    # Stay under SQLite's bound-parameter limit
+    _CHUNK = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self.run = 0
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id TEXT PRIMARY KEY, hash TEXT NOT NULL, updated_at TEXT,"
+            " deleted INTEGER NOT NULL DEFAULT 0, run INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_hash ON documents (hash)")
+
+    def begin(self) -> None:
+        self._db.execute("BEGIN")
+        self.run = self._db.execute("SELECT COALESCE(MAX(run), 0) + 1 FROM documents").fetchone()[0]
+
+    def mark_seen(self, hashes: List[str]) -> set:
+        """Mark recorded documents with these hashes as seen; returns the hashes that were recorded"""
+        seen = set()
+        for offset in range(0, len(hashes), self._CHUNK):
+            chunk = hashes[offset:offset + self._CHUNK]
+            marks = ", ".join("?" * len(chunk))
+            seen.update(row[0] for row in self._db.execute(f"SELECT hash FROM documents WHERE hash IN ({marks})", chunk))
+            self._db.execute(f"UPDATE documents SET run = ? WHERE hash IN ({marks})", [self.run, *chunk])
+        return seen
+
+    def record(self, entries: List[Tuple[str, str, Optional[str], bool]]) -> None:
+        self._db.executemany(
+            "INSERT OR REPLACE INTO documents (id, hash, updated_at, deleted, run) VALUES (?, ?, ?, ?, ?)",
+            [(doc_id, content_hash, updated_at, int(deleted), self.run) for doc_id, content_hash, updated_at, deleted in entries],
+        )
+
+    def missing(self) -> Iterator[str]:
+        """Ids of live documents recorded by earlier runs but not seen in this one"""
+        for (doc_id,) in self._db.execute("SELECT id FROM documents WHERE run < ? AND deleted = 0", (self.run,)):
+            yield doc_id
+
+    def forget_missing(self) -> None:
+        self._db.execute("DELETE FROM documents WHERE run < ?", (self.run,))
+
+    def stats(self) -> Dict[str, Any]:
+        documents, deleted, newest = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(deleted), 0), MAX(updated_at) FROM documents"
+        ).fetchone()
+        return {"path": self.path, "documents": documents, "tombstones": deleted, "newest_updated_at": newest}
+
+    def commit(self) -> None:
+        self._db.execute("COMMIT")
+
+    def rollback(self) -> None:
+        self._db.execute("ROLLBACK")
+
+    def close(self) -> None:
+        self._db.close()
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _columns(columns: Tuple[str, ...], prefix: str = "") -> str:
+    return ", ".join(prefix + _quote(column) for column in columns)
+
+
+def create_staging_tables(cursor) -> None:
+    for table, columns in TABLES.items():
+        cursor.execute(
+            f"CREATE TEMP TABLE {_quote('_stage_' + table)} ON COMMIT DROP AS "
+            f"SELECT {_columns(columns)} FROM {_quote(table)} WITH NO DATA"
+        )
+    cursor.execute("CREATE TEMP TABLE _stage_deleted (id TEXT) ON COMMIT DROP")
+
+
+def copy_batch(cursor, blocks: Dict[str, str]) -> None:
+    for table, block in blocks.items():
+        if block:
+            cursor.copy_expert(
+                f"COPY {_quote('_stage_' + table)} ({_columns(STAGING_COLUMNS[table])}) FROM STDIN WITH (FORMAT csv)",
+                io.StringIO(block),
+            )
+
+
+def _upsert_sql(table: str, source: str, keep_existing: bool = False) -> str:
+    """INSERT ... ON CONFLICT (id) that only touches rows whose values changed"""
+    columns = TABLES[table]
+    updated = [column for column in columns if column != "id"]
+    has_updated_at = table != "documents"
+    insert_columns = _columns(columns) + (', "updatedAt"' if has_updated_at else "")
+    select_columns = _columns(columns) + (", now()" if has_updated_at else "")
+    if keep_existing:
+        # Vendors and customers appear on many documents; missing fields keep their current value
+        assignments = [f"{_quote(c)} = COALESCE(EXCLUDED.{_quote(c)}, {_quote(table)}.{_quote(c)})" for c in updated]
+    else:
+        assignments = [f"{_quote(c)} = EXCLUDED.{_quote(c)}" for c in updated]
+    if has_updated_at:
+        assignments.append('"updatedAt" = now()')
+    return (
+        f"INSERT INTO {_quote(table)} ({insert_columns}) "
+        f"SELECT {select_columns} FROM ({source}) AS incoming "
+        f"ON CONFLICT (id) DO UPDATE SET {', '.join(assignments)} "
+        f"WHERE ({_columns(tuple(updated), _quote(table) + '.')}) IS DISTINCT FROM ({_columns(tuple(updated), 'EXCLUDED.')})"
+    )
+
+
+def merge_sql() -> List[Tuple[str, str]]:
+    """(table, statement) pairs merging the staging tables, parents first"""
+    statements = []
+    for table in ("vendors", "customers"):
+        source = f"SELECT DISTINCT ON (id) * FROM {_quote('_stage_' + table)} ORDER BY id"
+        statements.append((table, _upsert_sql(table, source, keep_existing=True)))
+
+    # Invoice numbers are unique; a number already used by another invoice
+    # gets the invoice id appended, as the TypeScript ingest does with counters
+    invoice_columns = [column for column in TABLES["invoices"] if column != "invoiceNumber"]
+    invoices = (
+        f"SELECT {_columns(tuple(invoice_columns))}, "
+        'CASE WHEN number_rank > 1 OR EXISTS (SELECT 1 FROM invoices AS existing '
+        'WHERE existing."invoiceNumber" = staged."invoiceNumber" AND existing.id <> staged.id) '
+        'THEN staged."invoiceNumber" || \'-\' || left(staged.id, 8) ELSE staged."invoiceNumber" END AS "invoiceNumber" '
+        'FROM (SELECT *, row_number() OVER (PARTITION BY "invoiceNumber" ORDER BY id) AS number_rank '
+        'FROM (SELECT DISTINCT ON (id) * FROM _stage_invoices ORDER BY id) AS unique_ids) AS staged'
+    )
+    statements.append(("invoices", _upsert_sql("invoices", invoices)))
+
+    for table in CHILD_TABLES:
+        stage = _quote("_stage_" + table)
+        # Children of re-ingested invoices that are no longer in the export
+        statements.append((
+            f"{table} (removed)",
+            f'DELETE FROM {_quote(table)} AS target WHERE target."invoiceId" IN (SELECT id FROM _stage_invoices) '
+            f"AND NOT EXISTS (SELECT 1 FROM {stage} AS staged WHERE staged.id = target.id)",
+        ))
+        statements.append((table, _upsert_sql(table, f"SELECT DISTINCT ON (id) * FROM {stage} ORDER BY id")))
+    return statements
+
+
+def delete_sql() -> List[Tuple[str, str]]:
+    """(table, statement) pairs removing the invoices of deleted documents and their children"""
+    statements = [
+        (f"{table} (deleted)", f'DELETE FROM {_quote(table)} WHERE "invoiceId" IN (SELECT id FROM _stage_deleted)')
+        for table in CHILD_TABLES
+    ]
+    statements.append(("invoices (deleted)", "DELETE FROM invoices WHERE id IN (SELECT id FROM _stage_deleted)"))
+    return statements
+
+
+def connect(database_url: Optional[str] = None):
+    database_url = database_url or os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL not configured")
+    # Same normalization as the server's pool
+    database_url = database_url.replace("postgresql+psycopg://", "postgresql://").split("?")[0]
+    return psycopg2.connect(database_url)
+
+
+def notify_server(url: str) -> None:
+    """Tell a running ai-server that the data changed so caches and rollups refresh now"""
+    request = urllib.request.Request(url.rstrip("/") + "/cache/invalidate", data=b"", method="POST")
+    if os.getenv("ADMIN_API_KEY"):
+        request.add_header("Authorization", f"Bearer {os.getenv('ADMIN_API_KEY')}")
+    try:
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+        logger.info(f"Notified {url} of the data change")
+    except Exception as e:
+        logger.warning(f"Could not notify {url} of the data change: {e}")
+
+
+def ingest(
+    path: str,
+    workers: int = INGEST_WORKERS,
+    batch_size: int = INGEST_BATCH_SIZE,
+    conn=None,
+    manifest: Optional[IngestManifest] = None,
+    full_export: bool = True,
+    skip_unchanged: bool = True,
+) -> Dict[str, Any]:
+    """Load an export file into the database; returns document and row counts.
+
+    With a manifest, documents whose content is unchanged since the last
+    run are skipped and, when the file is a full export, documents missing
+    from it are deleted along with the ones it marks as deleted.
+    """
+    started = time.monotonic()
+    owns_connection = conn is None
+    conn = conn or connect()
+    counts = {"documents": 0, "unchanged": 0, "changed": 0, "tombstoned": 0, "errors": 0}
+    merged: Dict[str, int] = {}
+
+    def drain(cursor, pending: deque) -> None:
+        blocks, entries, errors = pending.popleft().result()
+        copy_batch(cursor, blocks)
+        if manifest is not None:
+            manifest.record(entries)
+        tombstoned = sum(1 for entry in entries if entry[3])
+        counts["tombstoned"] += tombstoned
+        counts["changed"] += len(entries) - tombstoned
+        counts["errors"] += errors
+
+    if manifest is not None:
+        manifest.begin()
+    try:
+        with conn:
+            with conn.cursor() as cursor:
+                create_staging_tables(cursor)
+
+                # At most two batches per worker are in flight, so a slow
+                # database never lets parsed rows pile up in memory
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    pending = deque()
+                    for batch in iter_batches(iter_documents(path), batch_size):
+                        counts["documents"] += len(batch)
+                        items = [(content_hash(text), text) for text in batch]
+                        if manifest is not None and skip_unchanged:
+                            seen = manifest.mark_seen([item[0] for item in items])
+                            items = [item for item in items if item[0] not in seen]
+                            counts["unchanged"] += len(batch) - len(items)
+                        if not items:
+                            continue
+                        pending.append(executor.submit(flatten_batch, items))
+                        while len(pending) >= workers * 2:
+                            drain(cursor, pending)
+                    while pending:
+                        drain(cursor, pending)
+
+                if manifest is not None and full_export:
+                    if counts["errors"]:
+                        # A document that failed to parse would look deleted
+                        logger.warning("Skipping deletion of missing documents because some documents failed")
+                    else:
+                        for ids in iter_batches(manifest.missing(), 10000):
+                            copy_batch(cursor, {"deleted": "".join(f"{doc_id}\n" for doc_id in ids)})
+                        manifest.forget_missing()
+
+                for table, statement in merge_sql() + delete_sql():
+                    cursor.execute(statement)
+                    merged[table] = cursor.rowcount
+        if manifest is not None:
+            manifest.commit()
+    except Exception:
+        if manifest is not None:
+            manifest.rollback()
+        raise
+    finally:
+        if owns_connection:
+            conn.close()
+
+    result = {
+        **counts,
+        "deleted": merged.get("invoices (deleted)", 0),
+        "rows": merged,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info(
+        f"✅ Ingested {path}: {counts['changed']} changed, {counts['unchanged']} unchanged, "
+        f"{result['deleted']} deleted, {counts['errors']} skipped in {result['seconds']}s"
+    )
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load the document export into the analytics database")
+    parser.add_argument("path", nargs="?", default=DEFAULT_PATH, help="JSON export (default: backend/data/Analytics_Test_Data.json)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="parser processes")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="documents per parser task")
+    parser.add_argument("--manifest", default=INGEST_MANIFEST_PATH, help="change manifest (empty to load everything without one)")
+    parser.add_argument("--partial", action="store_true", help="the file only holds changed documents; keep the ones it omits")
+    parser.add_argument("--force", action="store_true", help="reload every document even if the manifest says it is unchanged")
+    parser.add_argument("--notify", default=INGEST_NOTIFY_URL, help="ai-server URL to tell about changes")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    if not os.path.exists(args.path):
+        logger.error(f"❌ File not found: {args.path}")
+        return 1
+
+    manifest = IngestManifest(args.manifest) if args.manifest else None
+    try:
+        result = ingest(
+            args.path,
+            workers=max(1, args.workers),
+            batch_size=max(1, args.batch_size),
+            manifest=manifest,
+            full_export=not args.partial,
+            skip_unchanged=not args.force,
+        )
+        if manifest is not None:
+            result["manifest"] = manifest.stats()
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    if args.notify and (result["changed"] or result["deleted"]):
+        notify_server(args.notify)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+import re
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cache import normalize_question
+
+# Matching works on the normalized question (see cache.normalize_question):
+# slots are pulled out first, filler words dropped, and what remains has to
+# match an intent's shape exactly. Anything unexpected left over means the
+# question is not one we can answer without the LLM.
+
+STATUSES = {
+    "paid": "PAID",
+    "pending": "PENDING",
+    "overdue": "OVERDUE",
+    "cancelled": "CANCELLED",
+    "canceled": "CANCELLED",
+    "draft": "DRAFT",
+}
+
+# Words that end a free-text vendor/category name
+_NAME_END = r"(?=$| (?:in|during|this|last|past|since|for|from|by|with|and|per|over|category|status)\b)"
+
+_ROLLING_RE = re.compile(r"\b(?:in |over |during |for )?(?:the )?(?:last|past|previous) (\d+) (day|week|month|year)s?\b")
+_PERIOD_RE = re.compile(r"\b(?:in |during |for |over )?(?:the )?(this|current|last|previous|past) (week|month|quarter|year)\b")
+_YTD_RE = re.compile(r"\b(?:year to date|ytd)\b")
+_DAY_RE = re.compile(r"\b(?:for |on )?(today|yesterday)\b")
+_YEAR_RE = re.compile(r"\b(?:in |during |for )?((?:19|20)\d\d)\b")
+_TOP_N_RE = re.compile(r"\btop (\d+)\b")
+_N_BIGGEST_RE = re.compile(r"\b(\d+) (biggest|largest|top)\b")
+_STATUS_RE = re.compile(r"\b(" + "|".join(STATUSES) + r")\b")
+_VENDOR_RE = re.compile(r"\b(?:(?:from|for|by|with|to) )?(?:the )?(?:vendor|supplier) ([a-z0-9][a-z0-9 ]*?)" + _NAME_END)
+_CATEGORY_AFTER_RE = re.compile(r"\b(?:in|for|under) (?:the )?([a-z][a-z0-9 ]*?) category\b")
+_CATEGORY_BEFORE_RE = re.compile(r"\b(?:in |for |under )?(?:the )?category ([a-z0-9][a-z0-9 ]*?)" + _NAME_END)
+_LEAD_RE = re.compile(
+    r"^(?:please |can you |could you )?"
+    r"(?:what (?:is|are|was|were)|who (?:is|are|were)|which (?:are|were)|show(?: me)?|list|give me|get|display|tell me)\b"
+)
+_FILLER_RE = re.compile(r"\b(?:the|our|all|me|please|of all)\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _month_start(day: date, months_back: int = 0) -> date:
+    month = day.year * 12 + day.month - 1 - months_back
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def _period(unit: str, which: str, today: date) -> Tuple[date, date]:
+    """Half-open [start, end) range of the current or previous calendar unit"""
+    back = 1 if which in ("last", "previous", "past") else 0
+    if unit == "week":
+        start = today - timedelta(days=today.weekday() + 7 * back)
+        return start, start + timedelta(days=7)
+    if unit == "month":
+        return _month_start(today, back), _month_start(today, back - 1)
+    if unit == "quarter":
+        quarter_start = _month_start(today, (today.month - 1) % 3)
+        return _month_start(quarter_start, 3 * back), _month_start(quarter_start, 3 * back - 3)
+    return date(today.year - back, 1, 1), date(today.year - back + 1, 1, 1)
+
+
+def _rolling(count: int, unit: str, today: date) -> Tuple[date, date]:
+    """The last ``count`` units up to and including today"""
+    end = today + timedelta(days=1)
+    if unit == "day":
+        return end - timedelta(days=count), end
+    if unit == "week":
+        return end - timedelta(weeks=count), end
+    months = count * (12 if unit == "year" else 1)
+    month = today.year * 12 + today.month - 1 - months
+    year, month = month // 12, month % 12 + 1
+    # Clamp e.g. March 31 minus one month to the end of February
+    day = min(today.day, (_month_start(date(year, month, 1), -1) - timedelta(days=1)).day)
+    return date(year, month, day) + timedelta(days=1), end
+
+
+def _cut(text: str, match: re.Match, replacement: str = " ") -> str:
+    return text[:match.start()] + replacement + text[match.end():]
+
+
+def extract_slots(text: str, today: date) -> Tuple[Dict[str, Any], str]:
+    """Pull N, date range, status, vendor and category out of a normalized question.
+
+    Returns the slots and the question text with those phrases removed.
+    """
+    slots: Dict[str, Any] = {}
+
+    match = _ROLLING_RE.search(text)
+    if match:
+        slots["start"], slots["end"] = _rolling(int(match.group(1)), match.group(2), today)
+        text = _cut(text, match)
+    else:
+        match = _PERIOD_RE.search(text)
+        if match:
+            slots["start"], slots["end"] = _period(match.group(2), match.group(1), today)
+            text = _cut(text, match)
+        elif _YTD_RE.search(text):
+            match = _YTD_RE.search(text)
+            slots["start"], slots["end"] = date(today.year, 1, 1), today + timedelta(days=1)
+            text = _cut(text, match)
+        elif _DAY_RE.search(text):
+            match = _DAY_RE.search(text)
+            day = today if match.group(1) == "today" else today - timedelta(days=1)
+            slots["start"], slots["end"] = day, day + timedelta(days=1)
+            text = _cut(text, match)
+        elif _YEAR_RE.search(text):
+            match = _YEAR_RE.search(text)
+            year = int(match.group(1))
+            slots["start"], slots["end"] = date(year, 1, 1), date(year + 1, 1, 1)
+            text = _cut(text, match)
+
+    match = _TOP_N_RE.search(text)
+    if match:
+        slots["limit"] = int(match.group(1))
+        text = _cut(text, match, " top ")
+    else:
+        match = _N_BIGGEST_RE.search(text)
+        if match:
+            slots["limit"] = int(match.group(1))
+            text = _cut(text, match, f" {match.group(2)} ")
+
+    match = _STATUS_RE.search(text)
+    if match:
+        slots["status"] = STATUSES[match.group(1)]
+        text = _cut(text, match)
+
+    match = _VENDOR_RE.search(text)
+    if match:
+        slots["vendor"] = match.group(1).strip()
+        text = _cut(text, match)
+
+    match = _CATEGORY_AFTER_RE.search(text) or _CATEGORY_BEFORE_RE.search(text)
+    if match:
+        slots["category"] = match.group(1).strip()
+        text = _cut(text, match)
+
+    return slots, text
+
+
+def question_shape(text: str) -> str:
+    """What is left of a question once slots and filler words are removed"""
+    text = _LEAD_RE.sub(" ", text.strip())
+    text = _FILLER_RE.sub(" ", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+# Free-text vendor and category names are resolved to one stored name
+# before the query runs. Candidates contain the typed words as whole words,
+# in order, with any punctuation between them; shortest first, so an exact
+# match isn't crowded out by the limit.
+NAME_LOOKUPS = {
+    "vendor": "SELECT DISTINCT v.name, LENGTH(v.name) FROM vendors v WHERE v.name ~* %(pattern)s ORDER BY 2 LIMIT 10",
+    "category": (
+        "SELECT DISTINCT i.category AS name, LENGTH(i.category) FROM invoices i "
+        "WHERE i.category ~* %(pattern)s ORDER BY 2 LIMIT 10"
+    ),
+}
+
+
+def name_pattern(name: str) -> str:
+    """Postgres regex for a name typed without its punctuation, matched on word boundaries"""
+    return r"\m" + r"[^[:alnum:]]+".join(name.split()) + r"\M"
+
+
+def resolve_name(typed: str, candidates: List[str]) -> Optional[str]:
+    """The stored name a typed name refers to: the only candidate, or the one
+    that is exactly the typed name. None when there is none or it's ambiguous."""
+    if len(candidates) == 1:
+        return candidates[0]
+    exact = [candidate for candidate in candidates if normalize_question(candidate) == typed]
+    return exact[0] if len(exact) == 1 else None
+
+
+def _invoice_filters(slots: Dict[str, Any], status: Optional[str] = None) -> Tuple[List[str], Dict[str, Any]]:
+    """WHERE conditions and parameters on invoices ``i`` for the extracted slots"""
+    conditions: List[str] = []
+    params: Dict[str, Any] = {}
+    status = slots.get("status", status)
+    if status == "OVERDUE":
+        # Pending invoices past their due date are overdue too
+        conditions.append("(i.status = 'OVERDUE' OR (i.status = 'PENDING' AND i.\"dueDate\" < CURRENT_DATE))")
+    elif status:
+        conditions.append("i.status = %(status)s")
+        params["status"] = status
+    if "start" in slots:
+        conditions.append("i.\"issueDate\" >= %(start)s AND i.\"issueDate\" < %(end)s")
+        params["start"], params["end"] = slots["start"], slots["end"]
+    if "vendor" in slots:
+        conditions.append("i.\"vendorId\" IN (SELECT v.id FROM vendors v WHERE v.name = %(vendor)s)")
+        params["vendor"] = slots["vendor"]
+    if "category" in slots:
+        conditions.append("i.category = %(category)s")
+        params["category"] = slots["category"]
+    return conditions, params
+
+
+def _where(conditions: List[str]) -> str:
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+def _total_spend(slots: Dict[str, Any], max_rows: int) -> Tuple[str, Dict[str, Any]]:
+    conditions, params = _invoice_filters(slots, status="PAID")
+    return f"SELECT SUM(i.\"totalAmount\") AS total_spend FROM invoices i{_where(conditions)}", params
+
+
+def _top_vendors(slots: Dict[str, Any], max_rows: int) -> Tuple[str, Dict[str, Any]]:
+    conditions, params = _invoice_filters(slots, status="PAID")
+    params["limit"] = min(slots.get("limit", 10), max_rows)
+    return (
+        "SELECT v.name, SUM(i.\"totalAmount\") AS total_spend FROM vendors v "
+        f"JOIN invoices i ON v.id = i.\"vendorId\"{_where(conditions)} "
+        "GROUP BY v.id, v.name ORDER BY total_spend DESC LIMIT %(limit)s"
+    ), params
+
+
+def _list_invoices(slots: Dict[str, Any], max_rows: int) -> Tuple[str, Dict[str, Any]]:
+    conditions, params = _invoice_filters(slots)
+    params["limit"] = min(slots.get("limit", 100), max_rows)
+    order = "i.\"dueDate\"" if slots.get("status") == "OVERDUE" else "i.\"issueDate\" DESC"
+    return (
+        "SELECT i.\"invoiceNumber\", v.name AS vendor, i.\"issueDate\", i.\"dueDate\", i.status, i.\"totalAmount\" "
+        f"FROM invoices i JOIN vendors v ON v.id = i.\"vendorId\"{_where(conditions)} "
+        f"ORDER BY {order} LIMIT %(limit)s"
+    ), params
+
+
+def _top_invoices(slots: Dict[str, Any], max_rows: int) -> Tuple[str, Dict[str, Any]]:
+    conditions, params = _invoice_filters(slots)
+    params["limit"] = min(slots.get("limit", 10), max_rows)
+    return (
+        "SELECT i.\"invoiceNumber\", v.name AS vendor, i.\"issueDate\", i.\"dueDate\", i.status, i.\"totalAmount\" "
+        f"FROM invoices i JOIN vendors v ON v.id = i.\"vendorId\"{_where(conditions)} "
+        "ORDER BY i.\"totalAmount\" DESC LIMIT %(limit)s"
+    ), params
+
+
+def _invoice_count(slots: Dict[str, Any], max_rows: int) -> Tuple[str, Dict[str, Any]]:
+    conditions, params = _invoice_filters(slots)
+    return f"SELECT COUNT(*) AS invoice_count FROM invoices i{_where(conditions)}", params
+
+
+def _monthly_trend(slots: Dict[str, Any], max_rows: int) -> Tuple[str, Dict[str, Any]]:
+    conditions, params = _invoice_filters(slots)
+    return (
+        "SELECT DATE_TRUNC('month', i.\"issueDate\") AS month, COUNT(*) AS invoice_count, "
+        f"SUM(i.\"totalAmount\") AS total_amount FROM invoices i{_where(conditions)} "
+        "GROUP BY month ORDER BY month"
+    ), params
+
+
+def _spend_by_category(slots: Dict[str, Any], max_rows: int) -> Tuple[str, Dict[str, Any]]:
+    conditions, params = _invoice_filters(slots, status="PAID")
+    return (
+        "SELECT COALESCE(i.category, 'Uncategorized') AS category, SUM(i.\"totalAmount\") AS total_spend "
+        f"FROM invoices i{_where(conditions)} GROUP BY 1 ORDER BY total_spend DESC"
+    ), params
+
+
+def _invoices_by_status(slots: Dict[str, Any], max_rows: int) -> Tuple[str, Dict[str, Any]]:
+    conditions, params = _invoice_filters(slots)
+    return (
+        f"SELECT i.status, COUNT(*) AS invoice_count FROM invoices i{_where(conditions)} "
+        "GROUP BY i.status ORDER BY invoice_count DESC"
+    ), params
+
+
+_SPEND = r"(?:spend|spending|spent|expenses?)"
+
+# (name, question shape, slots the intent understands, SQL builder)
+INTENTS: List[Tuple[str, re.Pattern, frozenset, Callable]] = [
+    (
+        "total_spend",
+        re.compile(rf"(?:how much (?:did|have) we (?:spend|spent|paid|pay)|(?:total|overall) {_SPEND}|{_SPEND} total|{_SPEND})"),
+        frozenset({"start", "end", "status", "vendor", "category"}),
+        _total_spend,
+    ),
+    (
+        "top_vendors",
+        re.compile(rf"(?:top|biggest|largest) vendors(?: by (?:total )?(?:{_SPEND}|amount|invoice amount|total))?"),
+        frozenset({"limit", "start", "end", "status", "category"}),
+        _top_vendors,
+    ),
+    (
+        "top_invoices",
+        re.compile(r"(?:top|biggest|largest) invoices(?: by (?:total )?(?:amount|value))?"),
+        frozenset({"limit", "start", "end", "status", "vendor", "category"}),
+        _top_invoices,
+    ),
+    (
+        "list_invoices",
+        re.compile(r"(?:invoices|invoice list|list invoices)"),
+        frozenset({"limit", "start", "end", "status", "vendor", "category"}),
+        _list_invoices,
+    ),
+    (
+        "invoice_count",
+        re.compile(
+            r"(?:how many invoices(?: (?:are there|were there|do we have|have we (?:received|processed)"
+            r"|were (?:processed|issued|received|created)))?|(?:number|count) invoices|invoice count)"
+        ),
+        frozenset({"start", "end", "status", "vendor", "category"}),
+        _invoice_count,
+    ),
+    (
+        "monthly_trend",
+        re.compile(
+            rf"(?:monthly (?:invoice |{_SPEND} )?trends?|(?:invoice |{_SPEND} )?trends? by month"
+            rf"|(?:invoices|{_SPEND}|invoice {_SPEND}) (?:by|per) month)"
+        ),
+        frozenset({"start", "end", "status", "vendor", "category"}),
+        _monthly_trend,
+    ),
+    (
+        "spend_by_category",
+        re.compile(rf"(?:{_SPEND} (?:by|per) category|categories by {_SPEND})"),
+        frozenset({"start", "end", "status", "vendor"}),
+        _spend_by_category,
+    ),
+    (
+        "invoices_by_status",
+        re.compile(r"(?:(?:how many invoices are there|invoices|invoice count|number invoices) (?:by|per) status|invoice status breakdown)"),
+        frozenset({"start", "end", "vendor", "category"}),
+        _invoices_by_status,
+    ),
+]
+
+
+def match_intent(question: str, max_rows: int, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """Map a recognized question shape to parameterized SQL.
+
+    Returns {"name", "slots", "sql", "params", "lookups"}, or None if the
+    question has to go to the LLM. SQL uses psycopg2 ``%(name)s``
+    placeholders. ``lookups`` maps each free-text name slot to the query
+    (sql, params) listing its candidates; run them and pass the results to
+    resolve_intent before executing ``sql``.
+    """
+    today = today or date.today()
+    slots, text = extract_slots(normalize_question(question), today)
+    shape = question_shape(text)
+    for name, pattern, accepted, build in INTENTS:
+        if pattern.fullmatch(shape) and accepted.issuperset(slots):
+            sql, params = build(slots, max_rows)
+            return {
+                "name": name,
+                "slots": {key: value.isoformat() if isinstance(value, date) else value for key, value in slots.items()},
+                "sql": sql,
+                "params": params,
+                "lookups": {
+                    slot: (NAME_LOOKUPS[slot], {"pattern": name_pattern(slots[slot])})
+                    for slot in NAME_LOOKUPS if slot in slots
+                },
+            }
+    return None
+
+
+def resolve_intent(intent: Dict[str, Any], candidates: Dict[str, List[str]]) -> Optional[Dict[str, Any]]:
+    """Bind each name slot to the stored name its lookup found.
+
+    ``candidates`` maps each slot in ``intent["lookups"]`` to the names its
+    query returned. Returns None, so the question goes to the LLM, when a
+    name matches nothing or several names equally well.
+    """
+    params = dict(intent["params"])
+    slots = dict(intent["slots"])
+    for slot in intent["lookups"]:
+        name = resolve_name(slots[slot], candidates.get(slot, []))
+        if name is None:
+            return None
+        params[slot] = slots[slot] = name
+    return {**intent, "slots": slots, "params": params}
@@ -1,22 +1,74 @@
+import time
+
+# Start of the module import; startup timings are measured from here
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import re
+import json
+import base64
+import hmac
+import uuid
+import asyncio
+import contextvars
+import functools
+import importlib.util
 import logging
+import threading
 import traceback
-from typing import Dict, List, Any, Optional
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Iterator, List, Any, Literal, Optional, Set, Tuple, Type, Union
 from datetime import datetime
 
-import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import psycopg2
+import psycopg2.errors
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 
-try:
-    from groq import Groq
-    GROQ_AVAILABLE = True
-except ImportError:
-    GROQ_AVAILABLE = False
+from cache import (
+    NORMALIZATION_VERSION,
+    QuestionCache,
+    ResultCache,
+    SharedStore,
+    estimate_size,
+    fingerprint,
+    normalize_question,
+)
+from db_pool import ConnectionPool
+from examples import ExampleStore
+from intents import match_intent, resolve_intent
+from metrics import MetricsMiddleware, registry, stage
+from rollups import CHANGES_TABLE, ensure_rollup_table, refresh_rollups, rewrite_for_rollup
+from schema_catalog import HIDDEN_COLUMNS, SIGNATURE_SQL, SchemaCatalog
+from serialization import dumps, json_default
+from singleflight import SingleFlight
+from slow_queries import SlowQueryJournal
+from sql_utils import (
+    SQLValidationError,
+    is_keyset_pageable,
+    is_volatile,
+    output_aggregates,
+    paged_sql,
+    referenced_tables,
+    sql_fingerprint,
+    strip_literals,
+    time_dependency,
+    top_level_keywords,
+    unpaged_sql,
+    validate_sql,
+)
+
+# groq (like numpy, via chart_reduction) is imported on first use or by the
+# startup warm-up, keeping it out of the import path
+GROQ_AVAILABLE = importlib.util.find_spec("groq") is not None
+if not GROQ_AVAILABLE:
     print("Groq package not available. Install with: pip install groq")
 
 # Load environment variables
@@ -42,109 +94,251 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-route request metrics and a Server-Timing header with the stage breakdown
+app.add_middleware(MetricsMiddleware, timing_allow_origin=",".join(allowed_origins))
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = "llama-3.3-70b-versatile"
 
-# Initialize Groq client
-groq_client = None
-if GROQ_API_KEY:
-    groq_client = Groq(api_key=GROQ_API_KEY)
+# Blocking psycopg2 work runs on this bounded pool so the event loop stays free
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+# Connection pool sizing; checkouts wait up to DB_POOL_TIMEOUT seconds
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", str(DB_EXECUTOR_WORKERS)))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_MAX_USES = int(os.getenv("DB_POOL_MAX_USES", "1000"))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+
+# SQLite file through which worker processes (see serve.py) share cached
+# results, paged result ids and the schema catalog; unset keeps them per process
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH") or None
+shared_store = SharedStore(
+    SHARED_CACHE_PATH,
+    max_bytes=int(os.getenv("SHARED_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+) if SHARED_CACHE_PATH else None
+
+# Question -> SQL cache; set SQL_CACHE_PATH to persist it across restarts
+# (defaults to the shared cache file when there is one)
+question_cache = QuestionCache(
+    max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1000")),
+    ttl=float(os.getenv("SQL_CACHE_TTL", "86400")),
+    path=os.getenv("SQL_CACHE_PATH") or SHARED_CACHE_PATH
+)
+
+# Live schema catalog; starts from the Prisma layout and is replaced by
+# introspection, re-checked every SCHEMA_REFRESH_INTERVAL seconds
+schema_catalog = SchemaCatalog.fallback()
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "300"))
+_schema_refresh_task: Optional[asyncio.Task] = None
+
+# Coalesce identical concurrent work: LLM calls per question, queries per SQL
+sql_flights = SingleFlight()
+query_flights = SingleFlight()
+
+# Verified question -> SQL examples; the closest PROMPT_EXAMPLES go into each prompt
+example_store = ExampleStore(
+    seed_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples.json"),
+    store_path=os.getenv("EXAMPLE_STORE_PATH") or None
+)
+PROMPT_EXAMPLES = int(os.getenv("PROMPT_EXAMPLES", "3"))
+# Also learn from generated SQL that ran and returned rows (unreviewed)
+EXAMPLES_AUTO_LEARN = os.getenv("EXAMPLES_AUTO_LEARN", "false").lower() == "true"
+
+# Token required for admin endpoints; they are disabled when unset
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+# Query result cache, bounded by approximate size in bytes
+result_cache = ResultCache(
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    shared=shared_store
+)
+
+# Materialized rows of offset-paged results, kept until their pages expire
+paged_rows = ResultCache(
+    max_bytes=int(os.getenv("PAGED_RESULT_MAX_BYTES", str(128 * 1024 * 1024))),
+    max_entry_bytes=int(os.getenv("PAGED_RESULT_MAX_BYTES", str(128 * 1024 * 1024))),
+    shared=shared_store
+)
+
+# Column the data-version probe reads to detect changes in each table
+DATA_VERSION_COLUMNS = {
+    "vendors": "updatedAt",
+    "customers": "updatedAt",
+    "invoices": "updatedAt",
+    "line_items": "updatedAt",
+    "payments": "updatedAt",
+    "documents": "uploadedAt",
+    "analytics": "createdAt",
+    "users": "updatedAt",
+    "invoice_rollups": "refreshedAt",
+    CHANGES_TABLE: "loggedAt",
+}
+# Aggregates over invoices are answered from invoice_rollups while it is
+# current; it is refreshed incrementally every ROLLUP_REFRESH_INTERVAL seconds
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() == "true"
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "60"))
+ROLLUP_WATERMARK_OVERLAP = float(os.getenv("ROLLUP_WATERMARK_OVERLAP", "60"))
+# The rollup is current while invoices and its pending change log are as
+# they were when it was last refreshed
+ROLLUP_SOURCE_TABLES = {"invoices", CHANGES_TABLE}
+_rollup_source_version: Optional[Tuple] = None
+_rollup_last_refresh: Optional[Dict[str, Any]] = None
+_rollup_refresh_wanted = asyncio.Event()
+_rollup_refresh_task: Optional[asyncio.Task] = None
+
+# Optional in-process DuckDB snapshot of the analytical tables (requires
+# duckdb). Aggregate queries over those tables run there instead of on the
+# primary while the last refresh is at most SNAPSHOT_MAX_LAG seconds old.
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "false").lower() == "true"
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", ":memory:")
+SNAPSHOT_REFRESH_INTERVAL = float(os.getenv("SNAPSHOT_REFRESH_INTERVAL", "30"))
+SNAPSHOT_MAX_LAG = float(os.getenv("SNAPSHOT_MAX_LAG", "120"))
+SNAPSHOT_WATERMARK_OVERLAP = float(os.getenv("SNAPSHOT_WATERMARK_OVERLAP", "60"))
+analytics_snapshot = None
+_snapshot_refresh_wanted = asyncio.Event()
+_snapshot_refresh_task: Optional[asyncio.Task] = None
+_AGGREGATE_RE = re.compile(r"\b(?:count|sum|avg|min|max|stddev|variance|percentile_cont|percentile_disc)\s*\(", re.IGNORECASE)
+
+# Probed versions are reused for this many seconds (0 probes on every query)
+RESULT_CACHE_PROBE_INTERVAL = float(os.getenv("RESULT_CACHE_PROBE_INTERVAL", "1"))
+_data_versions: Dict[str, Tuple[float, Any]] = {}
+_data_versions_lock = threading.Lock()
+
+# Per-query guards: statement timeout and EXPLAIN cost/row-estimate budgets (0 disables a budget)
+QUERY_TIMEOUT_MS = int(os.getenv("QUERY_TIMEOUT_MS", "15000"))
+QUERY_MAX_COST = float(os.getenv("QUERY_MAX_COST", "10000000"))
+QUERY_MAX_ROWS_ESTIMATE = int(os.getenv("QUERY_MAX_ROWS_ESTIMATE", "10000000"))
+
+# Row cap for /chat responses; larger results are paged via /chat/{result_id}/page
+MAX_RESULT_ROWS = int(os.getenv("MAX_RESULT_ROWS", "1000"))
+PAGED_RESULT_TTL = float(os.getenv("PAGED_RESULT_TTL", "3600"))
+PAGED_RESULT_MAX_ENTRIES = int(os.getenv("PAGED_RESULT_MAX_ENTRIES", "1000"))
+# Results without a keyset are run once, up to PAGED_RESULT_MAX_ROWS rows, and
+# their pages sliced from that copy; a subquery's order isn't stable between runs
+PAGED_RESULT_MAX_ROWS = int(os.getenv("PAGED_RESULT_MAX_ROWS", "100000"))
+_paged_results: "OrderedDict[str, Tuple[float, str, bool]]" = OrderedDict()
+_paged_results_lock = threading.Lock()
+
+# Chart payload budget: line/table charts are reduced to CHART_MAX_POINTS,
+# bar/pie charts to CHART_MAX_CATEGORIES (the rest folded into "Other")
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+CHART_MAX_CATEGORIES = int(os.getenv("CHART_MAX_CATEGORIES", "20"))
+
+# Rows fetched per round-trip by /chat/stream; bounds its peak memory
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+# Answer recognized question shapes with prepared statements instead of the LLM
+INTENT_FAST_PATH = os.getenv("INTENT_FAST_PATH", "true").lower() == "true"
+# Prepared statement names known to each pooled connection
+_prepared_statements: "weakref.WeakKeyDictionary[Any, Set[str]]" = weakref.WeakKeyDictionary()
+_prepared_statements_lock = threading.Lock()
+
+# Concurrent LLM requests allowed across all endpoints
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+# Upper bound on distinct questions in one /chat/batch request
+CHAT_BATCH_MAX_QUESTIONS = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "50"))
+
+# Chat queries slower than SLOW_QUERY_THRESHOLD_MS are kept in a bounded
+# journal (persisted when SLOW_QUERY_PATH is set); those slower than
+# SLOW_QUERY_EXPLAIN_MS get an EXPLAIN (ANALYZE, BUFFERS) captured in the
+# background (0 disables)
+slow_query_journal = SlowQueryJournal(
+    threshold_ms=float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500")),
+    max_entries=int(os.getenv("SLOW_QUERY_MAX_ENTRIES", "200")),
+    path=os.getenv("SLOW_QUERY_PATH") or None
+)
+SLOW_QUERY_EXPLAIN_MS = float(os.getenv("SLOW_QUERY_EXPLAIN_MS", "2000"))
+# One plan capture runs at a time; slow queries finishing meanwhile get none
+_plan_capture_lock = asyncio.Lock()
+_plan_capture_tasks: Set[asyncio.Task] = set()
+
+# Groq client (async, so LLM round-trips don't block other requests), created on first use
+_groq_client = None
+_groq_client_lock = threading.Lock()
+
+# The schema catalog is saved here after each introspection and loaded on
+# startup, so a restart only checks its signature (empty disables)
+SCHEMA_SNAPSHOT_PATH = os.getenv(
+    "SCHEMA_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_snapshot.json")
+)
+
+# Startup timings in seconds (import, background warm-up, total until ready)
+_startup_timings: Dict[str, Optional[float]] = {"import": None, "warmup": None, "ready": None}
+_ready = False
+_warmup_task: Optional[asyncio.Task] = None
+
+# Wire formats for result rows: "rows" (list of dicts, the default),
+# "columnar" (column names once plus per-column value arrays) or "arrow"
+# (Arrow IPC stream, requires pyarrow)
 
 class ChatRequest(BaseModel):
     question: str
     context: Optional[Dict] = {}
+    format: Literal["rows", "columnar", "arrow"] = "rows"
+    # "postgres" skips the columnar snapshot and always queries the primary
+    engine: Literal["auto", "postgres"] = "auto"
 
 class ChatResponse(BaseModel):
     question: str
     sql: Optional[str] = None
     data: Optional[List[Dict]] = None
+    columns: Optional[List[str]] = None
+    values: Optional[List[List[Any]]] = None
     chart_config: Optional[Dict] = None
     error: Optional[str] = None
     explanation: Optional[str] = None
+    result_id: Optional[str] = None
+    next_cursor: Optional[str] = None
+    intent: Optional[Dict[str, Any]] = None
+
+class ChatBatchRequest(BaseModel):
+    questions: List[str]
+    format: Literal["rows", "columnar"] = "rows"
+    engine: Literal["auto", "postgres"] = "auto"
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatResponse]
+
+class ExampleRequest(BaseModel):
+    question: str
+    sql: str
+
+class ChatPageResponse(BaseModel):
+    result_id: str
+    data: Optional[List[Dict]] = None
+    columns: Optional[List[str]] = None
+    values: Optional[List[List[Any]]] = None
+    next_cursor: Optional[str] = None
 
 class DatabaseSchema:
     """Database schema information for context"""
     
     @staticmethod
-    def get_schema_info() -> str:
-        return """
-        Database Schema for FlowbitAI Analytics (PostgreSQL with Prisma - use camelCase column names):
-        
-        IMPORTANT: All column names use camelCase (e.g., vendorId, NOT vendor_id)
-        
-        1. vendors table:
-        - id: string (primary key)
-        - name: string (vendor name)
-        - email: string (optional)
-        - category: string (vendor category like 'Technology', 'Marketing', etc.)
-        - city: string, country: string
-        - createdAt: timestamp, updatedAt: timestamp
-        
-        2. customers table:
-        - id: string (primary key) 
-        - name: string (customer name)
-        - email: string (optional)
-        - city: string, country: string
-        - createdAt: timestamp, updatedAt: timestamp
-        
-        3. invoices table:
-        - id: string (primary key)
-        - invoiceNumber: string (unique invoice number) - USE camelCase!
-        - vendorId: string (foreign key to vendors) - USE camelCase!
-        - customerId: string (foreign key to customers, optional) - USE camelCase!
-        - issueDate: timestamp (when invoice was issued) - USE camelCase!
-        - dueDate: timestamp (when payment is due) - USE camelCase!
-        - paidDate: timestamp (when invoice was paid, null if unpaid) - USE camelCase!
-        - subtotal: decimal (invoice subtotal)
-        - taxAmount: decimal (tax amount) - USE camelCase!
-        - totalAmount: decimal (total invoice amount) - USE camelCase!
-        - currency: string (default EUR)
-        - status: enum (PENDING, PAID, OVERDUE, CANCELLED, DRAFT)
-        - category: string (invoice category)
-        - createdAt: timestamp, updatedAt: timestamp
-        
-        4. line_items table:
-        - id: string (primary key)
-        - invoiceId: string (foreign key to invoices) - USE camelCase!
-        - description: string (item description)
-        - quantity: decimal
-        - unitPrice: decimal - USE camelCase!
-        - totalPrice: decimal - USE camelCase!
-        - category: string
-        - createdAt: timestamp, updatedAt: timestamp
-        
-        5. payments table:
-        - id: string (primary key)
-        - invoiceId: string (foreign key to invoices) - USE camelCase!
-        - amount: decimal (payment amount)
-        - currency: string (default EUR)
-        - method: enum (BANK_TRANSFER, CREDIT_CARD, PAYPAL, CASH, CHECK, OTHER)
-        - paidDate: timestamp - USE camelCase!
-        - createdAt: timestamp, updatedAt: timestamp
-        
-        Common query examples (ALWAYS use camelCase):
-        - Total spend: SELECT SUM("totalAmount") FROM invoices WHERE status = 'PAID'
-        - Top vendors: SELECT v.name, SUM(i."totalAmount") as total FROM vendors v JOIN invoices i ON v.id = i."vendorId" WHERE i.status = 'PAID' GROUP BY v.id, v.name ORDER BY total DESC LIMIT 10
-        - Overdue invoices: SELECT * FROM invoices WHERE status = 'OVERDUE' OR (status = 'PENDING' AND "dueDate" < CURRENT_DATE)
-        - Monthly trends: SELECT EXTRACT(YEAR FROM "issueDate") as year, EXTRACT(MONTH FROM "issueDate") as month, COUNT(*) FROM invoices GROUP BY year, month
-        
-        CRITICAL: Always use double quotes around camelCase column names in SQL queries!
-        """
+    def get_schema_info(question: Optional[str] = None) -> str:
+        """Schema text from the live catalog, pruned to the question when given"""
+        return schema_catalog.describe(question)
 
 # Global connection pool
-_db_connection = None
+_db_pool: Optional[ConnectionPool] = None
+_db_pool_lock = threading.Lock()
 
-def get_db_connection():
-    """Get or create a single reusable database connection"""
-    global _db_connection
+def get_db_pool() -> ConnectionPool:
+    """Get or create the shared bounded connection pool"""
+    global _db_pool
     
-    try:
-        # Reuse existing connection if available and not closed
-        if _db_connection and not _db_connection.closed:
-            return _db_connection
+    if _db_pool is not None:
+        return _db_pool
+    
+    with _db_pool_lock:
+        if _db_pool is not None:
+            return _db_pool
         
         if not DATABASE_URL:
             raise ValueError("DATABASE_URL not configured")
@@ -156,59 +350,712 @@ def get_db_connection():
         if '?' in db_url:
             db_url = db_url.split('?')[0]
         
-        # Create new connection
-        _db_connection = psycopg2.connect(
+        _db_pool = ConnectionPool(
             db_url,
+            minconn=DB_POOL_MIN,
+            maxconn=DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT,
+            max_uses=DB_POOL_MAX_USES,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
             cursor_factory=RealDictCursor
         )
-        logger.info("✅ Database connection established")
-        return _db_connection
+        logger.info(f"✅ Database pool created (min={DB_POOL_MIN}, max={DB_POOL_MAX})")
+        return _db_pool
+
+@contextmanager
+def get_db_connection():
+    """Check out a pooled database connection for the duration of the block"""
+    try:
+        pool = get_db_pool()
+        conn = pool.getconn()
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.InterfaceError, psycopg2.OperationalError):
+        broken = True
+        raise
+    finally:
+        # Return the connection instead of closing it so it can be reused
+        pool.putconn(conn, discard=broken)
 
-def execute_sql_query(sql: str) -> List[Dict[str, Any]]:
-    """Execute SQL query and return results"""
-    cursor = None
+class QueryBudgetError(Exception):
+    """The planner's estimate for a query exceeds the configured budget"""
+
+class PagedResultExpired(Exception):
+    """The materialized rows behind a page cursor are gone"""
+
+def guard_query(cursor, sql: str, params: Optional[Dict[str, Any]] = None) -> None:
+    """Make the current transaction read-only with a statement timeout, then
+    reject the query if EXPLAIN estimates it over the cost/row budget.
+    
+    A page is budgeted as the whole query it pages through: its LIMIT would
+    cap the row estimate and scale down the cost.
+    """
+    cursor.execute("SET TRANSACTION READ ONLY; SET LOCAL statement_timeout = %s", (QUERY_TIMEOUT_MS,))
+    if not QUERY_MAX_COST and not QUERY_MAX_ROWS_ESTIMATE:
+        return
+    
+    inner = unpaged_sql(sql)
+    if inner is not None:
+        # Page parameters only address the page, never the inner query
+        sql, params = inner, None
+    with stage("sql_validate"):
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = next(iter(cursor.fetchone().values()))[0]["Plan"]
+    cost = plan["Total Cost"]
+    rows = plan["Plan Rows"]
+    if QUERY_MAX_COST and cost > QUERY_MAX_COST:
+        raise QueryBudgetError(
+            f"Query is too expensive to run (estimated cost {cost:,.0f} exceeds {QUERY_MAX_COST:,.0f}). "
+            "Try narrowing it with a date range or filter."
+        )
+    if QUERY_MAX_ROWS_ESTIMATE and rows > QUERY_MAX_ROWS_ESTIMATE:
+        raise QueryBudgetError(
+            f"Query would return too many rows (estimated {rows:,.0f} exceeds {QUERY_MAX_ROWS_ESTIMATE:,}). "
+            "Try aggregating or filtering the results."
+        )
+
+def describe_db_error(e: psycopg2.Error) -> str:
+    """User-facing message for a PostgreSQL error"""
+    if isinstance(e, psycopg2.errors.QueryCanceled):
+        return f"Query exceeded the {QUERY_TIMEOUT_MS / 1000:g}s time limit"
+    return f"Database error: {e.pgerror or str(e)}"
+
+def describe_query_error(e: Exception) -> str:
+    """User-facing message for any other failure while running a query"""
+    return f"Query failed: {getattr(e, 'detail', None) or str(e) or type(e).__name__}"
+
+def snapshot_accepts(sql: str) -> bool:
+    """Whether a query can run on the columnar snapshot: a current snapshot,
+    and an aggregate read over snapshot tables only"""
+    if analytics_snapshot is None or analytics_snapshot.refreshed_at is None:
+        return False
+    if time.time() - analytics_snapshot.refreshed_at > SNAPSHOT_MAX_LAG:
+        return False
+    if not sql.strip().upper().startswith(('SELECT', 'WITH')):
+        return False
+    tables = referenced_tables(sql, DATA_VERSION_COLUMNS)
+    if not tables or not tables <= set(analytics_snapshot.tables):
+        return False
+    return "group" in top_level_keywords(sql) or bool(_AGGREGATE_RE.search(strip_literals(sql)))
+
+def execute_sql_query(
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    engine: str = "auto"
+) -> List[Dict[str, Any]]:
+    """Execute SQL query and return results.
+    
+    With engine="auto" analytical queries go to the columnar snapshot when it
+    can take them, falling back to Postgres; "postgres" always uses Postgres.
+    """
+    if engine != "postgres" and snapshot_accepts(sql):
+        try:
+            with stage("sql_execute"):
+                data = analytics_snapshot.execute(sql, params)
+            logger.info(f"Snapshot query returned {len(data)} rows")
+            return data
+        except Exception as e:
+            logger.warning(f"Snapshot query failed, falling back to Postgres: {e}")
+    
     try:
         logger.info(f"Executing SQL: {sql}")
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Execute query
-        cursor.execute(sql)
-        
-        # Fetch results if it's a SELECT query
-        if sql.strip().upper().startswith('SELECT'):
-            results = cursor.fetchall()
-            # Convert to list of dictionaries
-            data = [dict(row) for row in results]
-            logger.info(f"Query returned {len(data)} rows")
-            return data
-        else:
-            conn.commit()
-            return [{"message": "Query executed successfully"}]
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            guard_query(cursor, sql, params)
             
+            # Execute query
+            with stage("sql_execute"):
+                cursor.execute(sql, params)
+            
+            # Fetch results if it's a SELECT query
+            if sql.strip().upper().startswith('SELECT'):
+                with stage("row_fetch"):
+                    results = cursor.fetchall()
+                    # Convert to list of dictionaries
+                    data = [dict(row) for row in results]
+                logger.info(f"Query returned {len(data)} rows")
+                return data
+            else:
+                conn.commit()
+                return [{"message": "Query executed successfully"}]
+            
+    except QueryBudgetError:
+        raise
     except psycopg2.Error as e:
         logger.error(f"PostgreSQL error: {e.pgcode} - {e.pgerror}")
-        raise Exception(f"Database error: {e.pgerror or str(e)}")
+        raise Exception(describe_db_error(e))
     except Exception as e:
         logger.error(f"SQL execution error: {type(e).__name__} - {str(e)}")
-        raise Exception(f"Query failed: {str(e)}")
-    finally:
-        if cursor:
-            cursor.close()
-        # Don't close connection - reuse it
+        raise Exception(describe_query_error(e))
 
-def generate_sql_with_groq(question: str) -> str:
-    """Generate SQL using Groq LLM"""
+def execute_prepared_query(sql: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Execute trusted, parameterized SQL as a server-side prepared statement.
+    
+    Each pooled connection prepares a statement once and reuses its plan
+    afterwards. Only for SQL written by us (see intents.py): it skips the
+    EXPLAIN budget check but keeps the read-only statement timeout.
+    """
+    names = []
+    def placeholder(match):
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+    statement = re.sub(r"%\((\w+)\)s", placeholder, sql)
+    name = f"intent_{sql_fingerprint(sql)[:16]}"
+    
     try:
-        if not groq_client:
-            raise Exception("Groq API not configured")
-        
-        schema_info = DatabaseSchema.get_schema_info()
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SET TRANSACTION READ ONLY; SET LOCAL statement_timeout = %s", (QUERY_TIMEOUT_MS,))
+            with _prepared_statements_lock:
+                prepared = _prepared_statements.setdefault(conn, set())
+            if name not in prepared:
+                cursor.execute(f"PREPARE {name} AS {statement}")
+                prepared.add(name)
+            with stage("sql_execute"):
+                if names:
+                    cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(names))})", [params[key] for key in names])
+                else:
+                    cursor.execute(f"EXECUTE {name}")
+            with stage("row_fetch"):
+                return [dict(row) for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"PostgreSQL error: {e.pgcode} - {e.pgerror}")
+        raise Exception(describe_db_error(e))
+    except Exception as e:
+        logger.error(f"Prepared query error: {type(e).__name__} - {str(e)}")
+        raise Exception(describe_query_error(e))
+
+def get_data_version(tables: Set[str]) -> Tuple:
+    """Cheap change marker per table: (row count, latest change timestamp)"""
+    now = time.monotonic()
+    versions = {}
+    with _data_versions_lock:
+        for table in tables:
+            probed = _data_versions.get(table)
+            if probed and now - probed[0] < RESULT_CACHE_PROBE_INTERVAL:
+                versions[table] = probed[1]
+    
+    stale = sorted(tables - versions.keys())
+    if stale:
+        probe_sql = " UNION ALL ".join(
+            f'SELECT \'{table}\' AS "table", COUNT(*) AS "rows", MAX("{DATA_VERSION_COLUMNS[table]}") AS "changed" FROM {table}'
+            for table in stale
+        )
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(probe_sql)
+            probed = {row["table"]: (row["rows"], row["changed"]) for row in cursor.fetchall()}
+        with _data_versions_lock:
+            for table, version in probed.items():
+                _data_versions[table] = (now, version)
+        versions.update(probed)
+    
+    return tuple((table, versions[table]) for table in sorted(tables))
+
+def invalidate_data_versions() -> None:
+    """Forget probed data versions so the next lookup re-probes every table"""
+    with _data_versions_lock:
+        _data_versions.clear()
+
+def execute_cached_query(
+    sql: str,
+    params: Optional[Dict[str, Any]] = None,
+    prepared: bool = False,
+    engine: str = "auto"
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Execute a query through the result cache, returning (data, from_cache).
+    
+    With prepared=True the query runs through execute_prepared_query.
+    """
+    if prepared:
+        execute = execute_prepared_query
+    else:
+        execute = functools.partial(execute_sql_query, engine=engine)
+    tables = referenced_tables(sql, DATA_VERSION_COLUMNS)
+    if not tables or not sql.strip().upper().startswith('SELECT') or is_volatile(sql):
+        return execute(sql, params), False
+    
+    # Queries reading the clock are only reusable within the same day/minute
+    key = sql_fingerprint(sql)
+    if params:
+        key += ":" + json.dumps(params, sort_keys=True, default=str)
+    clock = time_dependency(sql)
+    if clock == "date":
+        key += ":" + datetime.now().strftime("%Y-%m-%d")
+    elif clock == "time":
+        key += ":" + datetime.now().strftime("%Y-%m-%dT%H:%M")
+    
+    try:
+        if not prepared and engine != "postgres" and snapshot_accepts(sql):
+            # Snapshot answers change only when a refresh loads new rows
+            key += ":snapshot"
+            version = ("snapshot", analytics_snapshot.generation)
+        else:
+            version = get_data_version(tables)
+    except Exception as e:
+        logger.warning(f"Data version probe failed, bypassing result cache: {e}")
+        return execute(sql, params), False
+    
+    data = result_cache.get(key, version)
+    if data is not None:
+        logger.info(f"Result cache hit ({len(data)} rows)")
+        return data, True
+    
+    data = execute(sql, params)
+    result_cache.put(key, version, data)
+    return data, False
+
+def register_paged_result(sql: str) -> str:
+    """Remember a query so later pages can be fetched by result id"""
+    result_id = sql_fingerprint(sql)
+    now = time.monotonic()
+    with _paged_results_lock:
+        _paged_results[result_id] = (now, sql, is_keyset_pageable(sql))
+        _paged_results.move_to_end(result_id)
+        while len(_paged_results) > PAGED_RESULT_MAX_ENTRIES:
+            _paged_results.popitem(last=False)
+    if shared_store is not None:
+        # The next page may be requested from another worker
+        shared_store.put("paged", result_id, (sql, is_keyset_pageable(sql)), ttl=PAGED_RESULT_TTL)
+    return result_id
+
+def lookup_paged_result(result_id: str) -> Optional[Tuple[str, bool]]:
+    """Return (sql, keyset) for a registered result, or None if unknown or expired"""
+    with _paged_results_lock:
+        entry = _paged_results.get(result_id)
+        if entry is not None and time.monotonic() - entry[0] > PAGED_RESULT_TTL:
+            del _paged_results[result_id]
+            return None
+    if entry is not None:
+        return entry[1], entry[2]
+    if shared_store is not None:
+        return shared_store.get("paged", result_id)
+    return None
+
+def encode_page_cursor(position: Dict[str, Any]) -> str:
+    """Opaque continuation token for a page position"""
+    payload = json.dumps(position, default=json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_page_cursor(token: str) -> Dict[str, Any]:
+    """Parse a continuation token produced by encode_page_cursor"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(position, dict):
+            raise ValueError("cursor is not an object")
+        if "offset" in position:
+            position["offset"] = max(0, int(position["offset"]))
+        return position
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid page cursor")
+
+def fetch_result_page(
+    sql: str,
+    keyset: bool,
+    position: Dict[str, Any],
+    page_size: int,
+    engine: str = "auto"
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Fetch one page of a query, returning (rows, next position or None)"""
+    if not sql.strip().upper().startswith(('SELECT', 'WITH')):
+        return execute_sql_query(sql, engine=engine), None
+    
+    page_sql, params = page_query(sql, keyset, position, page_size)
+    if keyset:
+        data, _ = execute_cached_query(page_sql, params, engine=engine)
+        if len(data) <= page_size:
+            return data, None
+        data = data[:page_size]
+        return data, {"after": data[-1]["id"]}
+    
+    # The first page runs the query once; later pages slice the same rows, so
+    # they never overlap or skip rows and don't re-run the query
+    offset = position.get("offset", 0)
+    key = f"page:{sql_fingerprint(sql)}:{engine}"
+    rows = paged_rows.get(key, None) if offset else None
+    if rows is None:
+        if offset:
+            raise PagedResultExpired("Result pages expired, ask the question again")
+        rows, _ = execute_cached_query(page_sql, params, engine=engine)
+        paged_rows.put(key, None, rows)
+    data = rows[offset:offset + page_size]
+    if len(rows) <= offset + page_size:
+        return data, None
+    return data, {"offset": offset + page_size}
+
+def page_query(
+    sql: str,
+    keyset: bool,
+    position: Dict[str, Any],
+    page_size: int
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """The (sql, params) that fetch_result_page runs for one page; offset
+    pages are all sliced from one run of this query"""
+    if not sql.strip().upper().startswith(('SELECT', 'WITH')):
+        return sql, None
+    
+    # Ask for one extra row to learn whether another page exists
+    if keyset:
+        after = position.get("after")
+        page_sql = paged_sql(sql, page_size + 1, keyset=True, after_key=after is not None)
+        return page_sql, ({"after": after} if after is not None else None)
+    return paged_sql(sql, PAGED_RESULT_MAX_ROWS), None
+
+def stream_sql_query(sql: str, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Yield query results in batches from a server-side (named) cursor"""
+    if not sql.strip().upper().startswith(('SELECT', 'WITH')):
+        raise Exception("Only SELECT queries can be streamed")
+    
+    logger.info(f"Streaming SQL: {sql}")
+    with get_db_connection() as conn:
+        with conn.cursor() as guard_cursor:
+            try:
+                guard_query(guard_cursor, sql)
+            except psycopg2.Error as e:
+                raise Exception(describe_db_error(e))
         
-        system_prompt = f"""
+        cursor = conn.cursor(name=f"chat_stream_{uuid.uuid4().hex}")
+        cursor.itersize = batch_size
+        try:
+            cursor.execute(sql)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [dict(row) for row in rows]
+        except psycopg2.Error as e:
+            logger.error(f"PostgreSQL error: {e.pgcode} - {e.pgerror}")
+            raise Exception(describe_db_error(e))
+        finally:
+            if not conn.closed:
+                cursor.close()
+
+async def iterate_in_db_executor(iterator: Iterator) -> AsyncIterator:
+    """Drive a blocking iterator from async code, one step per executor call"""
+    loop = asyncio.get_running_loop()
+    done = object()
+    pending = None
+    try:
+        while True:
+            pending = loop.run_in_executor(db_executor, next, iterator, done)
+            # Shield so a client disconnect can't abandon a step mid-flight
+            item = await asyncio.shield(pending)
+            pending = None
+            if item is done:
+                break
+            yield item
+    finally:
+        if pending is not None:
+            await asyncio.wait([pending])
+        if hasattr(iterator, "close"):
+            await loop.run_in_executor(db_executor, iterator.close)
+
+def refresh_schema_catalog(force: bool = False) -> bool:
+    """Re-introspect the schema if its signature changed; returns True on reload.
+    
+    A catalog another worker already introspected for the new signature is
+    taken from the shared store instead.
+    """
+    global schema_catalog
+    
+    with get_db_connection() as conn:
+        if not force and schema_catalog.source == "database":
+            with conn.cursor() as cursor:
+                cursor.execute(SIGNATURE_SQL)
+                signature = cursor.fetchone()["signature"]
+            if signature == schema_catalog.signature:
+                return False
+            saved = load_saved_schema_catalog()
+            if saved is not None and saved.signature == signature:
+                schema_catalog = saved
+                logger.info(f"✅ Schema catalog loaded from cache ({len(saved.tables)} tables)")
+                return True
+        catalog = SchemaCatalog.from_connection(conn)
+    
+    schema_catalog = catalog
+    save_schema_catalog(catalog)
+    logger.info(f"✅ Schema catalog loaded ({len(catalog.tables)} tables)")
+    return True
+
+def save_schema_catalog(catalog: SchemaCatalog) -> None:
+    """Publish an introspected catalog to the shared store and the snapshot file"""
+    data = catalog.to_dict()
+    if shared_store is not None:
+        shared_store.put("schema", "catalog", data)
+    if SCHEMA_SNAPSHOT_PATH:
+        try:
+            temp_path = f"{SCHEMA_SNAPSHOT_PATH}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, SCHEMA_SNAPSHOT_PATH)
+        except OSError as e:
+            logger.warning(f"Could not save schema snapshot: {e}")
+
+def load_saved_schema_catalog() -> Optional[SchemaCatalog]:
+    """The last introspected catalog, from the shared store or the snapshot file"""
+    data = shared_store.get("schema", "catalog") if shared_store is not None else None
+    if data is None and SCHEMA_SNAPSHOT_PATH:
+        try:
+            with open(SCHEMA_SNAPSHOT_PATH, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable schema snapshot: {e}")
+    try:
+        return SchemaCatalog.from_dict(data) if data else None
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Ignoring invalid saved schema catalog: {e}")
+        return None
+
+def preload_shared_state() -> None:
+    """Introspect the schema once and publish it to the shared store, so
+    worker processes start from it instead of each introspecting (serve.py
+    calls this before starting them)"""
+    global _db_pool
+    
+    if shared_store is None or not DATABASE_URL:
+        return
+    try:
+        refresh_schema_catalog(True)
+    except Exception as e:
+        logger.warning(f"Schema preload failed, workers will introspect: {e}")
+    finally:
+        if _db_pool is not None:
+            _db_pool.closeall()
+            _db_pool = None
+
+async def schema_refresh_loop() -> None:
+    """Periodically pick up schema changes"""
+    while True:
+        await asyncio.sleep(SCHEMA_REFRESH_INTERVAL)
+        try:
+            await run_in_db_executor(refresh_schema_catalog)
+        except Exception as e:
+            logger.warning(f"Schema catalog refresh failed: {e}")
+
+def update_rollups() -> Optional[Dict[str, Any]]:
+    """Refresh invoice_rollups if invoices changed since the last refresh"""
+    global _rollup_source_version, _rollup_last_refresh
+    
+    if _rollup_source_version is None:
+        # The change log must exist before its version can be probed
+        with get_db_connection() as conn:
+            ensure_rollup_table(conn)
+    version = get_data_version(ROLLUP_SOURCE_TABLES)
+    if version == _rollup_source_version:
+        return None
+    started = time.monotonic()
+    with get_db_connection() as conn:
+        stats = refresh_rollups(conn, ROLLUP_WATERMARK_OVERLAP)
+    if stats["mode"] == "skipped":
+        # Another worker is refreshing; check again on the next round
+        return None
+    stats["seconds"] = round(time.monotonic() - started, 3)
+    _rollup_source_version = version
+    _rollup_last_refresh = stats
+    logger.info(f"Invoice rollups refreshed ({stats['mode']}, {stats['buckets']} buckets in {stats['seconds']}s)")
+    return stats
+
+async def rollup_refresh_loop() -> None:
+    """Keep invoice_rollups current: periodically, and whenever a query found it stale"""
+    while True:
+        try:
+            await run_in_db_executor(update_rollups)
+        except Exception as e:
+            logger.warning(f"Invoice rollup refresh failed: {e}")
+        try:
+            await asyncio.wait_for(_rollup_refresh_wanted.wait(), ROLLUP_REFRESH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _rollup_refresh_wanted.clear()
+
+async def route_query(sql: str) -> Tuple[str, bool]:
+    """Point aggregates over invoices at the rollup when it is up to date.
+    
+    Returns (sql to run, whether it reads the rollup).
+    """
+    if not ROLLUPS_ENABLED or _rollup_source_version is None:
+        return sql, False
+    rewritten = rewrite_for_rollup(sql)
+    if rewritten is None:
+        return sql, False
+    if await run_in_db_executor(get_data_version, ROLLUP_SOURCE_TABLES) != _rollup_source_version:
+        _rollup_refresh_wanted.set()
+        return sql, False
+    return rewritten, True
+
+def refresh_snapshot() -> Dict[str, Any]:
+    """Pull changes since the last refresh into the columnar snapshot"""
+    with get_db_connection() as conn:
+        stats = analytics_snapshot.refresh(conn, schema_catalog.tables, SNAPSHOT_WATERMARK_OVERLAP)
+    if stats["rows_loaded"] or stats["rows_deleted"]:
+        logger.info(
+            f"Snapshot refreshed ({stats['rows_loaded']} rows loaded, "
+            f"{stats['rows_deleted']} deleted in {stats['seconds']}s)"
+        )
+    return stats
+
+async def snapshot_refresh_loop() -> None:
+    """Keep the columnar snapshot within SNAPSHOT_REFRESH_INTERVAL of Postgres, sooner when asked"""
+    while True:
+        try:
+            await run_in_db_executor(refresh_snapshot)
+        except Exception as e:
+            logger.warning(f"Snapshot refresh failed: {e}")
+        try:
+            await asyncio.wait_for(_snapshot_refresh_wanted.wait(), SNAPSHOT_REFRESH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _snapshot_refresh_wanted.clear()
+
+def groq_configured() -> bool:
+    return bool(GROQ_API_KEY and GROQ_AVAILABLE)
+
+def get_groq_client():
+    """The shared AsyncGroq client, imported and created on first call (None when not configured)"""
+    global _groq_client
+    
+    if _groq_client is None and groq_configured():
+        with _groq_client_lock:
+            if _groq_client is None:
+                from groq import AsyncGroq
+                _groq_client = AsyncGroq(api_key=GROQ_API_KEY)
+    return _groq_client
+
+def ping_database() -> None:
+    """Round-trip a trivial query on a pooled connection"""
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """Run a blocking database call on the bounded DB executor"""
+    loop = asyncio.get_running_loop()
+    # Carry the request context over so stage timings recorded in the thread count
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, functools.partial(context.run, func, *args, **kwargs))
+
+def sql_cache_namespace() -> str:
+    """Cache namespace that changes whenever the schema, model or question normalization changes"""
+    return fingerprint(schema_catalog.signature, GROQ_MODEL, NORMALIZATION_VERSION)
+
+async def get_sql_for_question(question: str) -> Tuple[str, bool]:
+    """Return (sql, from_cache), only calling the LLM on a cache miss.
+    
+    Concurrent misses for the same normalized question share one LLM call.
+    """
+    namespace = sql_cache_namespace()
+    sql = question_cache.get(question, namespace)
+    if sql is not None:
+        logger.info("Question cache hit, skipping LLM")
+        return sql, True
+    
+    key = f"{namespace}:{normalize_question(question)}"
+    sql = await sql_flights.do(key, lambda: generate_sql_with_groq(question))
+    return sql, False
+
+async def fetch_page(
+    sql: str,
+    keyset: bool,
+    position: Dict[str, Any],
+    page_size: int,
+    engine: str = "auto"
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """fetch_result_page on the DB executor; identical concurrent fetches share one query"""
+    key = f"{sql_fingerprint(sql)}:{keyset}:{page_size}:{engine}:{json.dumps(position, sort_keys=True, default=str)}"
+    return await query_flights.do(
+        key,
+        lambda: run_in_db_executor(fetch_result_page, sql, keyset, position, page_size, engine)
+    )
+
+async def fetch_first_page(
+    question: str,
+    sql: str,
+    engine: str = "auto"
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """First page of a chat query, journaled when it is slow"""
+    keyset = is_keyset_pageable(sql)
+    page_sql, params = page_query(sql, keyset, {}, MAX_RESULT_ROWS)
+    started = time.perf_counter()
+    try:
+        data, next_position = await fetch_page(sql, keyset, {}, MAX_RESULT_ROWS, engine)
+    except QueryBudgetError:
+        raise
+    except Exception as e:
+        journal_execution(question, page_sql, params, started, error=str(e))
+        raise
+    journal_execution(question, page_sql, params, started, data)
+    return data, next_position
+
+def journal_execution(
+    question: str,
+    sql: str,
+    params: Optional[Dict[str, Any]],
+    started: float,
+    data: Optional[List[Dict[str, Any]]] = None,
+    error: Optional[str] = None
+) -> None:
+    """Record a chat query started at perf_counter() time `started` in the
+    slow-query journal, capturing its plan in the background when very slow"""
+    duration_ms = (time.perf_counter() - started) * 1000
+    entry_id = slow_query_journal.record(
+        question, sql, duration_ms,
+        rows=len(data) if data else 0,
+        size_bytes=estimate_size(data) if data else 0,
+        params=params,
+        error=error
+    )
+    if entry_id is None or not SLOW_QUERY_EXPLAIN_MS or duration_ms < SLOW_QUERY_EXPLAIN_MS:
+        return
+    if _plan_capture_lock.locked():
+        return
+    task = asyncio.create_task(capture_plan(entry_id, sql, params, analyze=error is None))
+    _plan_capture_tasks.add(task)
+    task.add_done_callback(_plan_capture_tasks.discard)
+
+def explain_query(sql: str, params: Optional[Dict[str, Any]], analyze: bool) -> Any:
+    """Plan of a query as JSON. With analyze the query runs again, read-only
+    and under the statement timeout, to collect actual timings and buffer use"""
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SET TRANSACTION READ ONLY; SET LOCAL statement_timeout = %s", (QUERY_TIMEOUT_MS,))
+        cursor.execute(f"EXPLAIN ({options}) {sql}", params)
+        return next(iter(cursor.fetchone().values()))
+
+async def capture_plan(entry_id: int, sql: str, params: Optional[Dict[str, Any]], analyze: bool) -> None:
+    """Attach the query plan to a journal entry (skipped while another capture runs)"""
+    if _plan_capture_lock.locked():
+        return
+    async with _plan_capture_lock:
+        try:
+            plan = await run_in_db_executor(explain_query, sql, params, analyze)
+        except Exception as e:
+            logger.warning(f"Plan capture failed for slow query {entry_id}: {e}")
+            return
+    slow_query_journal.attach_plan(entry_id, plan)
+
+def check_generated_sql(sql: str) -> str:
+    """Validate generated SQL against the schema catalog, returning the repaired query"""
+    with stage("sql_validate"):
+        sql, repairs = validate_sql(sql, schema_catalog.column_names(), HIDDEN_COLUMNS)
+    if repairs:
+        logger.info(f"Repaired SQL identifiers: {', '.join(repairs)}")
+    return sql
+
+def build_system_prompt(question: str, schema_info: str) -> str:
+    """System prompt with the schema and the most similar verified examples"""
+    examples = example_store.search(question, k=PROMPT_EXAMPLES)
+    example_lines = "\n        ".join(f'- "{example["question"]}" → {example["sql"]}' for example in examples)
+    examples_section = f"""
+        Verified examples for similar questions:
+        {example_lines}
+        """ if examples else ""
+    
+    return f"""
         You are an expert SQL analyst for a financial analytics database. 
         Generate ONLY valid PostgreSQL SQL queries based on the user's question.
         
@@ -222,21 +1069,39 @@ def generate_sql_with_groq(question: str) -> str:
         5. For aggregations, include proper GROUP BY clauses
         6. Use LIMIT clauses for large result sets (default LIMIT 100)
         7. Always use proper field names as defined in the schema
+        {examples_section}"""
+
+async def generate_sql_with_groq(
+    question: str,
+    previous_sql: Optional[str] = None,
+    feedback: Optional[str] = None
+) -> str:
+    """Generate SQL using Groq LLM, optionally revising a rejected query"""
+    try:
+        groq_client = get_groq_client()
+        if not groq_client:
+            raise Exception("Groq API not configured")
         
-        Examples:
-        - "total spend this year" → SELECT SUM(total_amount) FROM invoices WHERE status = 'PAID' AND issue_date >= DATE_TRUNC('year', CURRENT_DATE)
-        - "top 5 vendors" → SELECT v.name, SUM(i.total_amount) as total_spend FROM vendors v JOIN invoices i ON v.id = i.vendor_id WHERE i.status = 'PAID' GROUP BY v.id, v.name ORDER BY total_spend DESC LIMIT 5
-        """
+        with stage("prompt_build"):
+            schema_info = DatabaseSchema.get_schema_info(question)
+            system_prompt = build_system_prompt(question, schema_info)
         
-        response = groq_client.chat.completions.create(
-            model=GROQ_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": question}
-            ],
-            max_tokens=500,
-            temperature=0.1
-        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": question}
+        ]
+        if previous_sql and feedback:
+            messages.append({"role": "assistant", "content": previous_sql})
+            messages.append({"role": "user", "content": feedback})
+        
+        async with llm_semaphore:
+            with stage("llm"):
+                response = await groq_client.chat.completions.create(
+                    model=GROQ_MODEL,
+                    messages=messages,
+                    max_tokens=500,
+                    temperature=0.1
+                )
         
         sql = response.choices[0].message.content.strip()
         
@@ -252,8 +1117,18 @@ def generate_sql_with_groq(question: str) -> str:
         logger.error(f"Groq SQL generation error: {e}")
         raise Exception(f"Failed to generate SQL: {str(e)}")
 
-def generate_chart_config(question: str, data: List[Dict]) -> Dict:
-    """Generate chart configuration based on question and data"""
+def generate_chart_config(
+    question: str,
+    data: List[Dict],
+    embed_data: bool = True,
+    sql: Optional[str] = None
+) -> Dict:
+    """Generate chart configuration based on question and data.
+    
+    With embed_data=False the rows are not copied into the config; it refers
+    to the response's top-level columns instead. The SQL, when given, tells
+    whether the y axis can be summed when a long series is reduced.
+    """
     if not data:
         return {}
     
@@ -263,9 +1138,12 @@ def generate_chart_config(question: str, data: List[Dict]) -> Dict:
     
     chart_config = {
         "type": "table",  # default
-        "data": data,
         "title": question
     }
+    if embed_data:
+        chart_config["data"] = data
+    else:
+        chart_config["data_source"] = "columns"
     
     # Detect chart types based on keywords and data structure
     if any(word in question_lower for word in ['trend', 'over time', 'monthly', 'yearly']):
@@ -280,8 +1158,91 @@ def generate_chart_config(question: str, data: List[Dict]) -> Dict:
         chart_config["x_axis"] = columns[0]
         chart_config["y_axis"] = columns[1]
     
+    # Keep the chart within its point budget; the full rows stay in the response
+    from chart_reduction import is_additive, reduce_chart_data
+    y_axis = chart_config.get("y_axis")
+    aggregates = output_aggregates(sql) if sql else None
+    aggregate = None
+    if y_axis and aggregates is not None and len(aggregates) == len(columns):
+        # Select items line up with result columns unless the list has a *
+        aggregate = aggregates[columns.index(y_axis)]
+    reduced = reduce_chart_data(
+        data,
+        chart_config["type"],
+        chart_config.get("x_axis"),
+        y_axis,
+        CHART_MAX_POINTS,
+        CHART_MAX_CATEGORIES,
+        additive=bool(y_axis) and is_additive(y_axis, aggregate)
+    )
+    if reduced is not None:
+        rows, method = reduced
+        chart_config.pop("data_source", None)
+        chart_config["data"] = rows
+        chart_config["reduction"] = {
+            "method": method,
+            "original_points": len(data),
+            "points": len(rows)
+        }
+    
     return chart_config
 
+def to_columnar(data: List[Dict]) -> Tuple[List[str], List[List[Any]]]:
+    """Transpose row dicts into column names plus one value array per column"""
+    if not data:
+        return [], []
+    columns = list(data[0].keys())
+    values = [list(column) for column in zip(*(row.values() for row in data))]
+    return columns, values
+
+def encode_arrow_ipc(columns: List[str], values: List[List[Any]], metadata: Dict[str, Any]) -> bytes:
+    """Serialize columns to an Arrow IPC stream; metadata travels in the schema"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise Exception("Arrow format requires pyarrow. Install with: pip install pyarrow")
+    
+    table = pa.table(dict(zip(columns, values))) if columns else pa.table({})
+    envelope = json.dumps(metadata, default=json_default).encode("utf-8")
+    table = table.replace_schema_metadata({b"chat": envelope})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def format_result(payload: Dict[str, Any], data: List[Dict], result_format: str) -> Any:
+    """Attach rows to a response payload in the requested wire format.
+    
+    Returns the payload dict, or a raw Response for Arrow.
+    """
+    if result_format == "rows":
+        payload["data"] = data
+        return payload
+    
+    columns, values = to_columnar(data)
+    if result_format == "arrow":
+        body = encode_arrow_ipc(columns, values, payload)
+        return Response(content=body, media_type="application/vnd.apache.arrow.stream")
+    
+    payload["columns"] = columns
+    payload["values"] = values
+    return payload
+
+def model_shape(model: Type[BaseModel], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """A payload with exactly the fields of a response model, in model order"""
+    return {field: payload.get(field) for field in model.model_fields}
+
+def json_response(content: Any) -> Response:
+    """Encode a response body directly, bypassing the response model.
+    
+    Endpoints keep their response_model for the documented schema, but rows
+    skip pydantic validation and jsonable_encoder; Decimal and datetime
+    values are encoded by serialization.dumps.
+    """
+    with stage("response_encode"):
+        body = dumps(content)
+    return Response(content=body, media_type="application/json")
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -290,10 +1251,127 @@ async def root():
         "version": "1.0.0",
         "status": "running",
         "timestamp": datetime.now().isoformat(),
-        "groq_configured": groq_client is not None,
+        "groq_configured": groq_configured(),
         "database_configured": DATABASE_URL is not None
     }
 
+def resolve_intent_names(intent: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Bind an intent's vendor/category names to stored names, or None if one
+    is unknown or ambiguous"""
+    candidates = {}
+    for slot, (sql, params) in intent["lookups"].items():
+        rows, _ = execute_cached_query(sql, params, prepared=True)
+        candidates[slot] = [row["name"] for row in rows]
+    resolved = resolve_intent(intent, candidates)
+    if resolved is None:
+        logger.info(f"Intent {intent['name']} left to the LLM: no single match for {intent['slots']}")
+    return resolved
+
+async def answer_intent(question: str, intent: Dict[str, Any], result_format: str) -> Union[Dict[str, Any], Response]:
+    """Answer a recognized question shape from its prepared statement, without the LLM"""
+    sql, params = intent["sql"], intent["params"]
+    logger.info(f"Matched intent {intent['name']} with slots {intent['slots']}")
+    key = f"{sql_fingerprint(sql)}:{json.dumps(params, sort_keys=True, default=str)}"
+    started = time.perf_counter()
+    try:
+        data, _ = await query_flights.do(
+            key,
+            lambda: run_in_db_executor(execute_cached_query, sql, params, prepared=True)
+        )
+    except Exception as e:
+        journal_execution(question, sql, params, started, error=str(e))
+        raise
+    journal_execution(question, sql, params, started, data)
+    with stage("chart_config"):
+        chart_config = generate_chart_config(question, data, embed_data=result_format == "rows", sql=sql)
+    
+    payload = {
+        "question": question,
+        "sql": sql,
+        "chart_config": chart_config,
+        "explanation": f"Answered from the {intent['name']} query template. Found {len(data)} result(s).",
+        "intent": {"name": intent["name"], "slots": intent["slots"]}
+    }
+    return format_result(payload, data, result_format)
+
+async def answer_question(
+    question: str,
+    result_format: str = "rows",
+    engine: str = "auto"
+) -> Union[Dict[str, Any], Response]:
+    """Generate, check and run the SQL for one question.
+    
+    Returns the response payload, or a Response for the binary formats.
+    """
+    logger.info(f"Processing question: {question}")
+    
+    if INTENT_FAST_PATH:
+        intent = match_intent(question, MAX_RESULT_ROWS)
+        if intent is not None and intent["lookups"]:
+            intent = await run_in_db_executor(resolve_intent_names, intent)
+        if intent is not None:
+            return await answer_intent(question, intent, result_format)
+    
+    # Generate SQL query
+    sql, from_cache = await get_sql_for_question(question)
+    logger.info(f"Generated SQL: {sql}")
+    
+    # Reject unsafe SQL and fix identifier spelling before touching the database
+    try:
+        sql = check_generated_sql(sql)
+    except SQLValidationError as e:
+        logger.warning(f"Rejected generated SQL: {e}")
+        return {"question": question, "sql": sql, "error": f"Invalid SQL generated: {e}"}
+    
+    # Execute the first page of the query off the event loop
+    query_sql, from_rollup = await route_query(sql)
+    try:
+        data, next_position = await fetch_first_page(question, query_sql, engine)
+    except QueryBudgetError as e:
+        if not groq_configured():
+            raise
+        # Give the model one chance to write a cheaper query
+        logger.warning(f"Query over budget, asking for a cheaper rewrite: {e}")
+        feedback = f"That query was rejected: {e} Rewrite it as a cheaper query that answers the same question. Return ONLY the SQL."
+        sql = check_generated_sql(await generate_sql_with_groq(question, previous_sql=sql, feedback=feedback))
+        from_cache = False
+        query_sql, from_rollup = await route_query(sql)
+        data, next_position = await fetch_first_page(question, query_sql, engine)
+    
+    # Only cache SQL that actually ran
+    if not from_cache:
+        question_cache.put(question, sql, sql_cache_namespace())
+        if EXAMPLES_AUTO_LEARN and data:
+            example_store.add(question, sql)
+    logger.info(f"Query returned {len(data)} rows")
+    
+    # Generate chart configuration (rows are only embedded in the default format)
+    with stage("chart_config"):
+        chart_config = generate_chart_config(question, data, embed_data=result_format == "rows", sql=query_sql)
+    
+    # Generate explanation
+    explanation = f"Generated SQL query based on your question about {question.lower()}. Found {len(data)} result(s)."
+    if from_rollup:
+        explanation += " Answered from the monthly invoice rollup."
+    
+    # Larger results continue through the page endpoint
+    result_id = None
+    next_cursor = None
+    if next_position is not None:
+        result_id = register_paged_result(query_sql)
+        next_cursor = encode_page_cursor(next_position)
+        explanation += " More results are available."
+    
+    payload = {
+        "question": question,
+        "sql": query_sql,
+        "chart_config": chart_config,
+        "explanation": explanation,
+        "result_id": result_id,
+        "next_cursor": next_cursor
+    }
+    return format_result(payload, data, result_format)
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_data(request: ChatRequest) -> ChatResponse:
     """Process natural language questions and return SQL + data"""
@@ -302,29 +1380,10 @@ async def chat_with_data(request: ChatRequest) -> ChatResponse:
         if not question:
             raise HTTPException(status_code=400, detail="Question cannot be empty")
         
-        logger.info(f"Processing question: {question}")
-        
-        # Generate SQL query
-        sql = generate_sql_with_groq(question)
-        logger.info(f"Generated SQL: {sql}")
-        
-        # Execute SQL query
-        data = execute_sql_query(sql)
-        logger.info(f"Query returned {len(data)} rows")
-        
-        # Generate chart configuration
-        chart_config = generate_chart_config(question, data)
-        
-        # Generate explanation
-        explanation = f"Generated SQL query based on your question about {question.lower()}. Found {len(data)} result(s)."
-        
-        return ChatResponse(
-            question=question,
-            sql=sql,
-            data=data,
-            chart_config=chart_config,
-            explanation=explanation
-        )
+        result = await answer_question(question, request.format, request.engine)
+        if isinstance(result, Response):
+            return result
+        return json_response(model_shape(ChatResponse, result))
         
     except Exception as e:
         logger.error(f"Chat processing error: {traceback.format_exc()}")
@@ -333,14 +1392,285 @@ async def chat_with_data(request: ChatRequest) -> ChatResponse:
             error=str(e)
         )
 
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(request: ChatBatchRequest) -> ChatBatchResponse:
+    """Answer several questions at once.
+    
+    Duplicate questions (after normalize_question, which keeps operators,
+    signs and %) are answered once. Questions run concurrently; LLM calls
+    are bounded by LLM_MAX_CONCURRENCY and queries by the connection pool. Results come back in request order,
+    each with its own error if it failed.
+    """
+    questions = [question.strip() for question in request.questions]
+    unique: Dict[str, str] = {}
+    for question in questions:
+        if question:
+            unique.setdefault(normalize_question(question), question)
+    if len(unique) > CHAT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {CHAT_BATCH_MAX_QUESTIONS} distinct questions per batch"
+        )
+    
+    async def answer(question: str) -> Dict[str, Any]:
+        try:
+            return model_shape(ChatResponse, await answer_question(question, request.format, request.engine))
+        except Exception as e:
+            logger.error(f"Batch question failed: {question}: {e}")
+            return model_shape(ChatResponse, {"question": question, "error": str(e)})
+    
+    answers = await asyncio.gather(*(answer(question) for question in unique.values()))
+    by_key = dict(zip(unique.keys(), answers))
+    
+    results = []
+    for question in questions:
+        if not question:
+            results.append(model_shape(ChatResponse, {"question": question, "error": "Question cannot be empty"}))
+        else:
+            answer = by_key[normalize_question(question)]
+            results.append(answer if answer["question"] == question else {**answer, "question": question})
+    return json_response({"results": results})
+
+def encode_stream_event(event: Dict[str, Any], sse: bool) -> bytes:
+    """Frame an event as one NDJSON line or one Server-Sent Event"""
+    payload = dumps(event)
+    if sse:
+        return b"event: " + event["type"].encode("utf-8") + b"\ndata: " + payload + b"\n\n"
+    return payload + b"\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request) -> StreamingResponse:
+    """Stream query results in batches as NDJSON (or SSE when requested)"""
+    sse = "text/event-stream" in http_request.headers.get("accept", "")
+    question = request.question.strip()
+    
+    async def events() -> AsyncIterator[bytes]:
+        row_count = 0
+        try:
+            if not question:
+                raise Exception("Question cannot be empty")
+            
+            logger.info(f"Streaming question: {question}")
+            sql, from_cache = await get_sql_for_question(question)
+            sql = check_generated_sql(sql)
+            query_sql, _ = await route_query(sql)
+            yield encode_stream_event({"type": "meta", "question": question, "sql": query_sql}, sse)
+            
+            batches = stream_sql_query(query_sql, STREAM_BATCH_SIZE)
+            async for rows in iterate_in_db_executor(batches):
+                row_count += len(rows)
+                yield encode_stream_event({"type": "rows", "rows": rows}, sse)
+            
+            if not from_cache:
+                question_cache.put(question, sql, sql_cache_namespace())
+            logger.info(f"Streamed {row_count} rows")
+            yield encode_stream_event({"type": "end", "row_count": row_count}, sse)
+        except Exception as e:
+            logger.error(f"Chat stream error: {traceback.format_exc()}")
+            yield encode_stream_event({"type": "error", "error": str(e), "row_count": row_count}, sse)
+    
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+@app.get("/chat/{result_id}/page", response_model=ChatPageResponse)
+async def chat_result_page(
+    result_id: str,
+    cursor: str,
+    page_size: int = MAX_RESULT_ROWS,
+    format: Literal["rows", "columnar", "arrow"] = "rows",
+    engine: Literal["auto", "postgres"] = "auto"
+) -> ChatPageResponse:
+    """Fetch the next page of an earlier /chat result without regenerating SQL"""
+    registered = lookup_paged_result(result_id)
+    if registered is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    
+    sql, keyset = registered
+    position = decode_page_cursor(cursor)
+    page_size = max(1, min(page_size, MAX_RESULT_ROWS))
+    try:
+        data, next_position = await fetch_page(sql, keyset, position, page_size, engine)
+    except PagedResultExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except Exception as e:
+        logger.error(f"Result page error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    payload = {
+        "result_id": result_id,
+        "next_cursor": encode_page_cursor(next_position) if next_position is not None else None
+    }
+    result = format_result(payload, data, format)
+    if isinstance(result, Response):
+        return result
+    return json_response(model_shape(ChatPageResponse, result))
+
 @app.get("/schema")
-async def get_schema():
-    """Get database schema information"""
+async def get_schema(question: Optional[str] = None):
+    """Get database schema information (pruned to ?question= when given)"""
     return {
-        "schema": DatabaseSchema.get_schema_info(),
-        "tables": ["vendors", "customers", "invoices", "line_items", "payments", "documents", "analytics"]
+        "schema": DatabaseSchema.get_schema_info(question),
+        "tables": list(schema_catalog.tables),
+        "catalog": schema_catalog.to_dict()
     }
 
+def require_admin(authorization: Optional[str] = Header(None)) -> None:
+    """Allow the request only with the configured admin bearer token"""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_API_KEY not set)")
+    if not authorization or not hmac.compare_digest(authorization, f"Bearer {ADMIN_API_KEY}"):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.get("/examples")
+async def list_examples():
+    """Verified question -> SQL examples used for prompt construction"""
+    examples = example_store.all()
+    return {"count": len(examples), "examples": examples}
+
+@app.post("/examples", dependencies=[Depends(require_admin)])
+async def add_example(example: ExampleRequest):
+    """Add a verified question -> SQL example"""
+    question = example.question.strip()
+    sql = example.sql.strip()
+    if not question or not sql:
+        raise HTTPException(status_code=400, detail="Question and SQL are required")
+    added = example_store.add(question, sql)
+    return {"added": added, "count": len(example_store)}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the server-side caches"""
+    return {
+        "question_sql": question_cache.stats(),
+        "results": result_cache.stats(),
+        "paged_rows": paged_rows.stats(),
+        "coalescing": {
+            "sql_generation": sql_flights.stats(),
+            "queries": query_flights.stats()
+        },
+        "rollups": {
+            "enabled": ROLLUPS_ENABLED,
+            "last_refresh": _rollup_last_refresh
+        },
+        "snapshot": await run_in_db_executor(analytics_snapshot.stats) if analytics_snapshot else None,
+        "shared": shared_store.stats() if shared_store else None
+    }
+
+def _pool_samples(*keys: str, labelled: bool = True) -> Dict[Tuple[str, ...], float]:
+    """Samples from the connection pool's stats (none before the pool exists)"""
+    if _db_pool is None:
+        return {}
+    stats = _db_pool.stats()
+    return {((key,) if labelled else ()): stats[key] for key in keys}
+
+def _cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        "question_sql": question_cache.stats(),
+        "results": result_cache.stats(),
+        "paged_rows": paged_rows.stats()
+    }
+
+registry.callback(
+    "ai_server_db_pool_connections", "Pooled database connections by state", ["state"],
+    lambda: _pool_samples("idle", "in_use")
+)
+registry.callback(
+    "ai_server_db_pool_max_connections", "Connection pool size limit", [],
+    lambda: _pool_samples("max", labelled=False)
+)
+registry.callback(
+    "ai_server_db_pool_waiting", "Requests waiting for a database connection", [],
+    lambda: _pool_samples("waiting", labelled=False)
+)
+registry.callback(
+    "ai_server_db_pool_events_total", "Connection pool lifetime events", ["event"],
+    lambda: _pool_samples("created", "checkouts", "timeouts", "recycled", "discarded"),
+    kind="counter"
+)
+registry.callback(
+    "ai_server_cache_entries", "Entries held by each cache", ["cache"],
+    lambda: {(name,): stats["size"] for name, stats in _cache_stats().items()}
+)
+registry.callback(
+    "ai_server_cache_bytes", "Approximate bytes held by the result cache", ["cache"],
+    lambda: {(name,): stats["bytes"] for name, stats in _cache_stats().items() if "bytes" in stats}
+)
+registry.callback(
+    "ai_server_cache_events_total", "Cache lookups and evictions", ["cache", "event"],
+    lambda: {
+        (name, event): stats[event]
+        for name, stats in _cache_stats().items()
+        for event in ("hits", "misses", "disk_hits", "shared_hits", "stale", "evictions", "too_large")
+        if event in stats
+    },
+    kind="counter"
+)
+registry.callback(
+    "ai_server_coalesced_total", "Calls and calls that joined an identical in-flight call", ["flight", "event"],
+    lambda: {
+        (name, key): flights.stats()[key]
+        for name, flights in (("sql_generation", sql_flights), ("queries", query_flights))
+        for key in ("calls", "coalesced")
+    },
+    kind="counter"
+)
+registry.callback(
+    "ai_server_paged_results", "Results registered for the page endpoint", [],
+    lambda: {(): len(_paged_results)}
+)
+
+registry.callback(
+    "ai_server_slow_queries_total", "Chat queries journaled as slow, and plans captured for them", ["event"],
+    lambda: {(event,): slow_query_journal.stats()[event] for event in ("recorded", "plans")},
+    kind="counter"
+)
+
+registry.callback(
+    "ai_server_startup_seconds", "Startup time by phase: module import, warm-up, import start until ready", ["phase"],
+    lambda: {(phase,): seconds for phase, seconds in _startup_timings.items() if seconds is not None}
+)
+registry.callback(
+    "ai_server_ready", "Whether the startup warm-up has finished", [],
+    lambda: {(): int(_ready)}
+)
+
+@app.get("/metrics")
+async def metrics():
+    """Stage latency histograms, request counters and pool/cache gauges in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/cache/invalidate", dependencies=[Depends(require_admin)])
+async def invalidate_caches():
+    """Signal that the data changed (e.g. after ingest.py): re-probe cached
+    results and refresh the rollups and snapshot now instead of on their timers"""
+    invalidate_data_versions()
+    _rollup_refresh_wanted.set()
+    _snapshot_refresh_wanted.set()
+    return {"invalidated": True}
+
+@app.get("/debug/slow", dependencies=[Depends(require_admin)])
+async def slow_queries(
+    limit: int = 50,
+    order: Literal["duration", "recent"] = "duration",
+    plans: bool = True
+):
+    """Recent slow chat queries, slowest first (or newest first with order=recent),
+    with captured plans unless plans=false"""
+    limit = max(1, min(limit, slow_query_journal.max_entries))
+    return {
+        **slow_query_journal.stats(),
+        "explain_ms": SLOW_QUERY_EXPLAIN_MS,
+        "entries": slow_query_journal.entries(limit, order, plans)
+    }
+
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: 503 until the startup warm-up has finished"""
+    body = {"ready": _ready, "startup_seconds": _startup_timings}
+    if not _ready:
+        return JSONResponse(body, status_code=503)
+    return body
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
@@ -349,23 +1679,116 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "checks": {
-            "groq_api": groq_client is not None,
+            "groq_api": groq_configured(),
             "database": False
         }
     }
     
     # Test database connection
     try:
-        conn = get_db_connection()
-        conn.close()
+        await run_in_db_executor(ping_database)
         health_status["checks"]["database"] = True
     except Exception as e:
         health_status["checks"]["database"] = False
         health_status["errors"] = {"database": str(e)}
     
+    if _db_pool is not None:
+        health_status["pool"] = _db_pool.stats()
+    
     return health_status
 
+def warm_imports() -> None:
+    """Import the modules left out of the import path (groq, numpy)"""
+    get_groq_client()
+    import chart_reduction  # noqa: F401
+
+async def warm_up() -> None:
+    """Do the work the first requests would otherwise wait for, then mark the
+    server ready: lazy imports, pooled connections, the schema catalog and
+    the background refresh loops"""
+    global _ready
+    
+    started = time.perf_counter()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, warm_imports)
+        if DATABASE_URL:
+            await warm_database()
+    except Exception:
+        logger.error(f"Startup warm-up failed: {traceback.format_exc()}")
+    
+    now = time.perf_counter()
+    _startup_timings["warmup"] = round(now - started, 3)
+    _startup_timings["ready"] = round(now - _IMPORT_STARTED, 3)
+    _ready = True
+    logger.info(
+        f"✅ Ready {_startup_timings['ready']}s after import started "
+        f"(import {_startup_timings['import']}s, warm-up {_startup_timings['warmup']}s)"
+    )
+
+async def warm_database() -> None:
+    """Open the minimum number of pooled connections, load the schema catalog
+    and start the refresh loops"""
+    global _schema_refresh_task, _rollup_refresh_task, _snapshot_refresh_task, analytics_snapshot, schema_catalog
+    
+    try:
+        await run_in_db_executor(lambda: get_db_pool().prefill())
+    except Exception as e:
+        logger.warning(f"Database pool prefill failed: {e}")
+    
+    # Start from the catalog another worker, serve.py or the previous run
+    # introspected, only checking its signature; introspect when there is none
+    saved_catalog = load_saved_schema_catalog()
+    if saved_catalog is not None:
+        schema_catalog = saved_catalog
+    try:
+        await run_in_db_executor(refresh_schema_catalog, saved_catalog is None)
+    except Exception as e:
+        logger.warning(f"Schema introspection failed, using built-in schema: {e}")
+    if SCHEMA_REFRESH_INTERVAL > 0:
+        _schema_refresh_task = asyncio.create_task(schema_refresh_loop())
+    if ROLLUPS_ENABLED:
+        _rollup_refresh_task = asyncio.create_task(rollup_refresh_loop())
+    if SNAPSHOT_ENABLED:
+        try:
+            from snapshot import ColumnarSnapshot
+            analytics_snapshot = ColumnarSnapshot(SNAPSHOT_PATH)
+            _snapshot_refresh_task = asyncio.create_task(snapshot_refresh_loop())
+        except ImportError:
+            logger.warning("SNAPSHOT_ENABLED requires duckdb. Install with: pip install duckdb")
+
+@app.on_event("startup")
+async def startup_event():
+    """Start the warm-up in the background so the server accepts connections
+    (and answers /health) right away; /ready turns 200 once it is done"""
+    global _warmup_task
+    
+    _warmup_task = asyncio.create_task(warm_up())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release background resources"""
+    if _schema_refresh_task is not None:
+        _schema_refresh_task.cancel()
+    if _rollup_refresh_task is not None:
+        _rollup_refresh_task.cancel()
+    if _snapshot_refresh_task is not None:
+        _snapshot_refresh_task.cancel()
+    for task in list(_plan_capture_tasks):
+        task.cancel()
+    db_executor.shutdown(wait=False, cancel_futures=True)
+    if _db_pool is not None:
+        _db_pool.closeall()
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+    if _groq_client is not None:
+        await _groq_client.close()
+
+_startup_timings["import"] = round(time.perf_counter() - _IMPORT_STARTED, 3)
+
 if __name__ == "__main__":
+    import uvicorn
+    
+    # Development server (one process, auto-reload); production runs serve.py
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
     
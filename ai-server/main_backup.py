@@ -3,6 +3,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import os
+import json
+import hashlib
 import logging
 from dotenv import load_dotenv
 from typing import Optional, Dict, Any
@@ -15,14 +17,14 @@ load_dotenv()
 logging.basicConfig(level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')))
 logger = logging.getLogger(__name__)
 
-# Import Vanna and Groq
-try:
-    import vanna as vn
-    from groq import Groq
-    import pandas as pd
-except ImportError as e:
-    logger.error(f"Failed to import required packages: {e}")
-    raise
+# Vanna and Groq are imported by init_services() at startup, not at import
+# time (install them with: pip install -r requirements-vanna.txt)
+
+# Records what has been trained, so restarts skip the per-item train() round-trips
+VANNA_TRAINING_SNAPSHOT = os.getenv(
+    "VANNA_TRAINING_SNAPSHOT",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "vanna_training.json")
+)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -61,6 +63,13 @@ def init_services():
     """Initialize Vanna and Groq services"""
     global groq_client, vanna_instance
     
+    try:
+        import vanna as vn
+        from groq import Groq
+    except ImportError as e:
+        logger.error(f"Failed to import required packages: {e}")
+        raise
+    
     try:
         # Initialize Groq client
         groq_api_key = os.getenv('GROQ_API_KEY')
@@ -99,50 +108,86 @@ def init_services():
         logger.error(f"Failed to initialize services: {e}")
         raise
 
+# Documentation about the database schema
+SCHEMA_DOCS = [
+    "The database contains invoice and vendor data for analytics.",
+    "Main tables: vendors, invoices, line_items, payments, customers",
+    "Vendors table contains vendor information with id, name, email, category",
+    "Invoices table contains invoice data with amounts, dates, status", 
+    "Line_items table contains individual items within invoices",
+    "Payments table tracks payments made against invoices",
+    "Invoice status can be: PENDING, PAID, OVERDUE, CANCELLED, DRAFT"
+]
+
+# Sample SQL queries for common questions
+TRAINING_QUERIES = [
+    {
+        "question": "What is the total spend this year?",
+        "sql": "SELECT SUM(total_amount) FROM invoices WHERE EXTRACT(YEAR FROM issue_date) = EXTRACT(YEAR FROM CURRENT_DATE) AND status = 'PAID'"
+    },
+    {
+        "question": "Who are the top 5 vendors by spend?", 
+        "sql": "SELECT v.name, SUM(i.total_amount) as total_spend FROM vendors v JOIN invoices i ON v.id = i.vendor_id WHERE i.status = 'PAID' GROUP BY v.id, v.name ORDER BY total_spend DESC LIMIT 5"
+    },
+    {
+        "question": "How many invoices were processed this month?",
+        "sql": "SELECT COUNT(*) FROM invoices WHERE EXTRACT(MONTH FROM issue_date) = EXTRACT(MONTH FROM CURRENT_DATE) AND EXTRACT(YEAR FROM issue_date) = EXTRACT(YEAR FROM CURRENT_DATE)"
+    },
+    {
+        "question": "What are the overdue invoices?",
+        "sql": "SELECT invoice_number, vendor_id, total_amount, due_date FROM invoices WHERE status = 'PENDING' AND due_date < CURRENT_DATE"
+    }
+]
+
+def training_fingerprint() -> str:
+    """Hash of the training data, stored in the snapshot once it is trained"""
+    payload = json.dumps({"docs": SCHEMA_DOCS, "queries": TRAINING_QUERIES}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 def train_vanna():
-    """Train Vanna with database schema and sample queries"""
+    """Train Vanna with database schema and sample queries.
+    
+    Training persists in the Vanna model, so it is skipped when the snapshot
+    shows this training data was already sent. Otherwise only the items the
+    model doesn't have yet are trained.
+    """
     try:
         if not vanna_instance:
             raise ValueError("Vanna instance not initialized")
         
-        # Add documentation about the database schema
-        schema_docs = [
-            "The database contains invoice and vendor data for analytics.",
-            "Main tables: vendors, invoices, line_items, payments, customers",
-            "Vendors table contains vendor information with id, name, email, category",
-            "Invoices table contains invoice data with amounts, dates, status", 
-            "Line_items table contains individual items within invoices",
-            "Payments table tracks payments made against invoices",
-            "Invoice status can be: PENDING, PAID, OVERDUE, CANCELLED, DRAFT"
-        ]
+        fingerprint = training_fingerprint()
+        try:
+            with open(VANNA_TRAINING_SNAPSHOT, encoding="utf-8") as f:
+                if json.load(f).get("fingerprint") == fingerprint:
+                    logger.info("Vanna training data unchanged since the last run, skipping training")
+                    return
+        except (OSError, ValueError):
+            pass
         
-        for doc in schema_docs:
-            vanna_instance.train(documentation=doc)
+        # One round-trip to list what the model already knows
+        known = set()
+        try:
+            existing = vanna_instance.get_training_data()
+            if existing is not None and not existing.empty:
+                for column in ("content", "question"):
+                    if column in existing:
+                        known.update(existing[column].dropna())
+        except Exception as e:
+            logger.warning(f"Could not list existing Vanna training data, training everything: {e}")
         
-        # Add sample SQL queries for common questions
-        training_data = [
-            {
-                "question": "What is the total spend this year?",
-                "sql": "SELECT SUM(total_amount) FROM invoices WHERE EXTRACT(YEAR FROM issue_date) = EXTRACT(YEAR FROM CURRENT_DATE) AND status = 'PAID'"
-            },
-            {
-                "question": "Who are the top 5 vendors by spend?", 
-                "sql": "SELECT v.name, SUM(i.total_amount) as total_spend FROM vendors v JOIN invoices i ON v.id = i.vendor_id WHERE i.status = 'PAID' GROUP BY v.id, v.name ORDER BY total_spend DESC LIMIT 5"
-            },
-            {
-                "question": "How many invoices were processed this month?",
-                "sql": "SELECT COUNT(*) FROM invoices WHERE EXTRACT(MONTH FROM issue_date) = EXTRACT(MONTH FROM CURRENT_DATE) AND EXTRACT(YEAR FROM issue_date) = EXTRACT(YEAR FROM CURRENT_DATE)"
-            },
-            {
-                "question": "What are the overdue invoices?",
-                "sql": "SELECT invoice_number, vendor_id, total_amount, due_date FROM invoices WHERE status = 'PENDING' AND due_date < CURRENT_DATE"
-            }
-        ]
+        trained = 0
+        for doc in SCHEMA_DOCS:
+            if doc not in known:
+                vanna_instance.train(documentation=doc)
+                trained += 1
+        for item in TRAINING_QUERIES:
+            if item["question"] not in known:
+                vanna_instance.train(question=item["question"], sql=item["sql"])
+                trained += 1
         
-        for item in training_data:
-            vanna_instance.train(question=item["question"], sql=item["sql"])
-            
-        logger.info("Vanna training completed successfully")
+        with open(VANNA_TRAINING_SNAPSHOT, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint}, f)
+        logger.info(f"Vanna training completed successfully ({trained} new items)")
         
     except Exception as e:
         logger.error(f"Failed to train Vanna: {e}")
@@ -0,0 +1,438 @@
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from schema_catalog import FALLBACK_TABLES
+from sql_utils import strip_trailing_semicolon, tokenize_sql
+
+logger = logging.getLogger(__name__)
+
+# Invoice totals per (vendor, category, status, month). Each bucket keeps the
+# latest source "updatedAt" it has seen, which doubles as the watermark for
+# incremental refreshes, and "refreshedAt" so result-cache version probes
+# notice every recomputed bucket. Mirrors the InvoiceRollup Prisma model.
+ROLLUP_TABLE = "invoice_rollups"
+
+# (vendor, month) pairs touched by writes to invoices, appended by statement
+# triggers and consumed by the next refresh. Unlike the updatedAt watermark
+# this sees deletes, edits that move an invoice out of a bucket, and writes
+# that don't bump updatedAt. The leading underscore keeps it out of the
+# schema catalog. Mirrors the InvoiceRollupChange Prisma model; Prisma
+# doesn't manage triggers, so db push leaves them in place.
+CHANGES_TABLE = "_invoice_rollup_changes"
+
+# Advisory lock key that keeps server processes from refreshing concurrently
+REFRESH_LOCK_KEY = 0x726F6C6C
+
+CREATE_SQL = """
+    CREATE TABLE IF NOT EXISTS invoice_rollups (
+        "id" BIGSERIAL NOT NULL,
+        "vendorId" TEXT NOT NULL,
+        "category" TEXT,
+        "status" "InvoiceStatus" NOT NULL,
+        "month" TIMESTAMP(3) NOT NULL,
+        "invoiceCount" INTEGER NOT NULL,
+        "subtotal" DECIMAL(18,2) NOT NULL,
+        "taxAmount" DECIMAL(18,2) NOT NULL,
+        "totalAmount" DECIMAL(18,2) NOT NULL,
+        "updatedAt" TIMESTAMP(3) NOT NULL,
+        "refreshedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "invoice_rollups_pkey" PRIMARY KEY ("id")
+    );
+    CREATE INDEX IF NOT EXISTS "invoice_rollups_vendorId_month_idx" ON invoice_rollups ("vendorId", "month");
+    CREATE INDEX IF NOT EXISTS "invoice_rollups_updatedAt_idx" ON invoice_rollups ("updatedAt");
+    CREATE TABLE IF NOT EXISTS "_invoice_rollup_changes" (
+        "id" BIGSERIAL NOT NULL,
+        "vendorId" TEXT NOT NULL,
+        "month" TIMESTAMP(3) NOT NULL,
+        "loggedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT "_invoice_rollup_changes_pkey" PRIMARY KEY ("id")
+    );
+    ALTER TABLE "_invoice_rollup_changes" ADD COLUMN IF NOT EXISTS "id" BIGSERIAL PRIMARY KEY;
+"""
+
+# Statement-level, so a bulk upsert or COPY records each bucket once
+TRACKING_SQL = """
+    CREATE OR REPLACE FUNCTION "_invoice_rollup_track"() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            INSERT INTO "_invoice_rollup_changes" ("vendorId", "month")
+            SELECT DISTINCT "vendorId", DATE_TRUNC('month', "issueDate") FROM old_rows;
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            INSERT INTO "_invoice_rollup_changes" ("vendorId", "month")
+            SELECT DISTINCT "vendorId", DATE_TRUNC('month', "issueDate") FROM new_rows;
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+    DROP TRIGGER IF EXISTS "invoices_rollup_insert" ON invoices;
+    DROP TRIGGER IF EXISTS "invoices_rollup_update" ON invoices;
+    DROP TRIGGER IF EXISTS "invoices_rollup_delete" ON invoices;
+    CREATE TRIGGER "invoices_rollup_insert" AFTER INSERT ON invoices
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION "_invoice_rollup_track"();
+    CREATE TRIGGER "invoices_rollup_update" AFTER UPDATE ON invoices
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION "_invoice_rollup_track"();
+    CREATE TRIGGER "invoices_rollup_delete" AFTER DELETE ON invoices
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION "_invoice_rollup_track"();
+"""
+
+_AGGREGATE_SELECT = """
+    SELECT i."vendorId", i.category, i.status, DATE_TRUNC('month', i."issueDate"),
+           COUNT(*), SUM(i.subtotal), SUM(i."taxAmount"), SUM(i."totalAmount"), MAX(i."updatedAt")
+    FROM invoices i
+"""
+_INSERT = """
+    INSERT INTO invoice_rollups
+        ("vendorId", category, status, "month", "invoiceCount", subtotal, "taxAmount", "totalAmount", "updatedAt")
+"""
+
+REBUILD_SQL = f"""
+    DELETE FROM invoice_rollups;
+    DELETE FROM "_invoice_rollup_changes";
+    {_INSERT} {_AGGREGATE_SELECT} GROUP BY 1, 2, 3, 4
+"""
+
+# (vendor, month) pairs touched since the watermark or logged by the triggers
+# are recomputed from scratch. Under REPEATABLE READ the DELETE only consumes
+# the log rows this snapshot saw; later writes stay for the next refresh.
+CHANGED_SQL = """
+    CREATE TEMP TABLE _rollup_changed ON COMMIT DROP AS
+    SELECT "vendorId", DATE_TRUNC('month', "issueDate") AS "month"
+    FROM invoices
+    WHERE "updatedAt" >= %(since)s - %(overlap)s * INTERVAL '1 second'
+    UNION
+    SELECT "vendorId", "month" FROM "_invoice_rollup_changes"
+"""
+REFRESH_SQL = f"""
+    DELETE FROM "_invoice_rollup_changes";
+    DELETE FROM invoice_rollups r USING _rollup_changed c
+    WHERE r."vendorId" = c."vendorId" AND r."month" = c."month";
+    {_INSERT} {_AGGREGATE_SELECT}
+    JOIN _rollup_changed c ON i."vendorId" = c."vendorId" AND DATE_TRUNC('month', i."issueDate") = c."month"
+    GROUP BY 1, 2, 3, 4
+"""
+
+# Safety net for changes the triggers can't see (TRUNCATE, or triggers that
+# couldn't be installed): the rollup must match invoices on count, every
+# summed measure and the newest updatedAt, or it is rebuilt
+CONSISTENT_SQL = """
+    SELECT (s.n, s.subtotal, s.tax, s.total) = (r.n, r.subtotal, r.tax, r.total)
+           AND s.updated IS NOT DISTINCT FROM r.updated AS consistent
+    FROM (
+        SELECT COUNT(*) AS n, COALESCE(SUM(subtotal), 0) AS subtotal, COALESCE(SUM("taxAmount"), 0) AS tax,
+               COALESCE(SUM("totalAmount"), 0) AS total, MAX("updatedAt") AS updated
+        FROM invoices
+    ) s, (
+        SELECT COALESCE(SUM("invoiceCount"), 0) AS n, COALESCE(SUM(subtotal), 0) AS subtotal,
+               COALESCE(SUM("taxAmount"), 0) AS tax, COALESCE(SUM("totalAmount"), 0) AS total,
+               MAX("updatedAt") AS updated
+        FROM invoice_rollups
+    ) r
+"""
+
+
+def ensure_rollup_table(conn) -> None:
+    """Create the rollup and change-log tables and the invoices triggers"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (REFRESH_LOCK_KEY,))
+        cursor.execute(CREATE_SQL)
+    conn.commit()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (REFRESH_LOCK_KEY,))
+            cursor.execute(TRACKING_SQL)
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        logger.warning(
+            f"Could not install the invoice change triggers ({e}); rollups rely on the updatedAt "
+            "watermark and consistency check, which miss edits that keep invoice totals unchanged"
+        )
+
+
+def refresh_rollups(conn, overlap_seconds: float = 60.0) -> Dict[str, Any]:
+    """Bring the rollup table up to date with invoices.
+
+    Buckets for (vendor, month) pairs with invoices changed since the last
+    watermark (minus ``overlap_seconds``, for writes that commit late) or
+    logged by the change triggers are recomputed; the table is rebuilt when
+    it is empty or inconsistent.
+    Runs in one REPEATABLE READ transaction so every step sees the same data.
+    Returns mode "skipped" when another process is already refreshing.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (REFRESH_LOCK_KEY,))
+        if not cursor.fetchone()["locked"]:
+            conn.rollback()
+            return {"mode": "skipped", "buckets": 0, "watermark": None}
+        cursor.execute('SELECT MAX("updatedAt") AS watermark FROM invoice_rollups')
+        watermark = cursor.fetchone()["watermark"]
+
+        mode = "rebuild"
+        buckets = 0
+        if watermark is not None:
+            cursor.execute(CHANGED_SQL, {"since": watermark, "overlap": overlap_seconds})
+            cursor.execute(REFRESH_SQL)
+            buckets = cursor.rowcount
+            cursor.execute(CONSISTENT_SQL)
+            if cursor.fetchone()["consistent"]:
+                mode = "incremental"
+
+        if mode == "rebuild":
+            cursor.execute(REBUILD_SQL)
+            buckets = cursor.rowcount
+    conn.commit()
+    return {"mode": mode, "buckets": buckets, "watermark": watermark.isoformat() if watermark else None}
+
+
+_INVOICE_COLUMNS = {name for name, _ in FALLBACK_TABLES["invoices"]}
+_MEASURES = {"totalAmount", "subtotal", "taxAmount"}
+_DIMENSIONS = {"vendorId", "category", "status"}
+_PERIOD_UNITS = {"month", "quarter", "year"}
+_REJECT_WORDS = {"with", "union", "intersect", "except", "over", "distinct", "lateral", "window", "left", "right", "full", "cross", "natural", "using"}
+_CLAUSE_END = {"where", "group", "order", "limit", "offset", "having", "join", "inner", "on", ")"}
+_BOUNDARY = {"and", "or", ")", "group", "order", "limit", "offset", "having", ""}
+_MONTH_LITERAL_RE = re.compile(r"^'\d{4}-\d{2}-01(?: 00:00(?::00)?)?'$")
+_WHOLE_MONTHS_RE = re.compile(r"^'\d+ (?:months?|years?)'$", re.IGNORECASE)
+
+
+def rewrite_for_rollup(sql: str) -> Optional[str]:
+    """Rewrite an aggregate over invoices to read invoice_rollups instead.
+
+    Only handles queries the rollup answers exactly: ``invoices`` alone or
+    inner-joined to ``vendors``, invoice columns limited to vendorId,
+    category and status, measures only inside SUM/AVG, COUNT(*), and
+    issueDate only truncated to month/quarter/year or compared (>=, <)
+    against month-aligned bounds. Rewritten COUNT/AVG select items keep
+    their output column name. Returns None for anything else.
+    """
+    tokens = [list(token) for token in tokenize_sql(strip_trailing_semicolon(sql))]
+    significant = [i for i, (kind, _) in enumerate(tokens) if kind not in ("space", "comment")]
+
+    def text_at(position: int) -> str:
+        if 0 <= position < len(significant):
+            kind, text = tokens[significant[position]]
+            return text.lower() if kind == "word" else text
+        return ""
+
+    def kind_at(position: int) -> str:
+        return tokens[significant[position]][0] if 0 <= position < len(significant) else ""
+
+    def name_at(position: int) -> str:
+        kind, text = tokens[significant[position]]
+        return text[1:-1] if kind == "ident" else text.lower()
+
+    def replace(start: int, end: int, text: str) -> None:
+        """Replace significant tokens start..end (inclusive) with text"""
+        for index in range(significant[start], significant[end] + 1):
+            tokens[index][1] = ""
+        tokens[significant[start]][1] = text
+
+    words = [text_at(p) for p in range(len(significant)) if tokens[significant[p]][0] == "word"]
+    if words.count("select") != 1 or _REJECT_WORDS & set(words):
+        return None
+
+    # Parenthesis depth of each token, and the bounds of the select list
+    depths: List[int] = []
+    depth = 0
+    for position in range(len(significant)):
+        depth -= text_at(position) == ")"
+        depths.append(depth)
+        depth += text_at(position) == "("
+    select_position = next(p for p in range(len(significant)) if text_at(p) == "select")
+    from_position = next(
+        (p for p in range(select_position, len(significant)) if text_at(p) == "from" and depths[p] == depths[select_position]),
+        len(significant),
+    )
+    # Aliases appended after replacement: {token position: " AS name"}
+    suffixes: Dict[int, str] = {}
+
+    def keep_output_name(start: int, end: int, name: str) -> bool:
+        """Alias a rewritten aggregate with its original column name when it is
+        a whole, unaliased select item. False if the name can't be kept."""
+        if not select_position < start < from_position or depths[start] != depths[select_position]:
+            return True
+        if text_at(start - 1) not in ("select", ","):
+            return True
+        # Postgres names x::type after x
+        cursor = end
+        while text_at(cursor + 1) == ":" and text_at(cursor + 2) == ":":
+            if kind_at(cursor + 3) not in ("word", "ident") or text_at(cursor + 4) in ("(", "["):
+                return False
+            cursor += 3
+        if text_at(cursor + 1) in (",", "from", ""):
+            suffixes[cursor] = f" AS {name}"
+        return True
+
+    # FROM invoices [AS] alias [JOIN vendors [AS] alias ON ...]
+    aliases: Dict[str, str] = {}
+    table_positions: List[Tuple[int, str]] = []
+    for position in range(len(significant)):
+        if text_at(position) not in ("from", "join") or text_at(position - 3) == "extract":
+            continue
+        cursor = position + 1
+        if text_at(cursor) == "public" and text_at(cursor + 1) == ".":
+            cursor += 2
+        if kind_at(cursor) not in ("word", "ident"):
+            return None
+        table = name_at(cursor)
+        if table not in ("invoices", "vendors"):
+            return None
+        alias_position = cursor + 1
+        if text_at(alias_position) == "as":
+            alias_position += 1
+        alias = table
+        if kind_at(alias_position) in ("word", "ident") and text_at(alias_position) not in _CLAUSE_END:
+            alias = name_at(alias_position)
+            alias_position += 1
+        if text_at(alias_position) not in _CLAUSE_END | {""}:
+            return None
+        if table in aliases.values():
+            return None
+        aliases[alias] = table
+        table_positions.append((position, table))
+    if sorted(aliases.values()) not in (["invoices"], ["invoices", "vendors"]):
+        return None
+    invoice_alias = next(alias for alias, table in aliases.items() if table == "invoices")
+    single_table = len(aliases) == 1
+
+    aggregated = "group" in words
+    position = 0
+    while position < len(significant):
+        kind, text = tokens[significant[position]]
+        lowered = text_at(position)
+
+        if lowered == "count" and text_at(position + 1) == "(":
+            if text_at(position + 2) in ("*", "1") and text_at(position + 3) == ")":
+                end = position + 3
+            elif (
+                text_at(position + 2) == invoice_alias and text_at(position + 3) == "."
+                and name_at(position + 4) == "id" and text_at(position + 5) == ")"
+            ):
+                end = position + 5
+            else:
+                return None
+            if not keep_output_name(position, end, "count"):
+                return None
+            # COUNT is 0, not NULL, when no rollup rows match
+            replace(position, end, f'COALESCE(SUM({invoice_alias}."invoiceCount"), 0)')
+            aggregated = True
+            position = end + 1
+            continue
+
+        if text == "*":
+            return None
+        if kind not in ("word", "ident") or text_at(position + 1) in (".", "("):
+            position += 1
+            continue
+        if position > 0 and text_at(position - 1) == "as":
+            position += 1
+            continue
+
+        # Column reference: qualified by the invoices alias, or bare on a single table
+        if text_at(position - 1) == ".":
+            if text_at(position - 2) != invoice_alias:
+                position += 1
+                continue
+            start = position - 2
+        elif kind == "ident" or name_at(position) in _INVOICE_COLUMNS:
+            if not single_table and name_at(position) in _INVOICE_COLUMNS | {"id", "name"}:
+                return None
+            if name_at(position) not in _INVOICE_COLUMNS:
+                position += 1
+                continue
+            start = position
+        else:
+            position += 1
+            continue
+
+        column = name_at(position)
+        if column in _DIMENSIONS:
+            pass
+        elif column in _MEASURES:
+            function = text_at(start - 2)
+            if text_at(start - 1) != "(" or text_at(position + 1) != ")" or function not in ("sum", "avg"):
+                return None
+            reference = "".join(tokens[significant[p]][1] for p in range(start, position + 1))
+            if function == "avg":
+                if not keep_output_name(start - 2, position + 1, "avg"):
+                    return None
+                replace(start - 2, position + 1, f'(SUM({reference}) / NULLIF(SUM({invoice_alias}."invoiceCount"), 0))')
+            aggregated = True
+        elif column == "issueDate":
+            if not _period_reference(text_at, start, position):
+                return None
+            prefix = f"{invoice_alias}." if start != position else ""
+            replace(start, position, f'{prefix}"month"')
+        else:
+            return None
+        position += 1
+
+    if not aggregated:
+        return None
+
+    for position, suffix in suffixes.items():
+        tokens[significant[position]][1] += suffix
+
+    # Point the invoices reference at the rollup, keeping the alias
+    for position, table in table_positions:
+        if table != "invoices":
+            continue
+        cursor = position + 1
+        if text_at(cursor) == "public":
+            cursor += 2
+        replacement = ROLLUP_TABLE if invoice_alias != "invoices" else f"{ROLLUP_TABLE} AS invoices"
+        replace(cursor, cursor, replacement)
+
+    return "".join(text for _, text in tokens)
+
+
+def _period_reference(text_at, start: int, end: int) -> bool:
+    """Whether an issueDate reference is only used at month granularity"""
+    # DATE_TRUNC('month' | 'quarter' | 'year', issueDate)
+    if (
+        text_at(start - 4) == "date_trunc" and text_at(start - 3) == "("
+        and text_at(start - 2).strip("'").lower() in _PERIOD_UNITS and text_at(start - 1) == ","
+        and text_at(end + 1) == ")"
+    ):
+        return True
+    # EXTRACT(YEAR | MONTH | QUARTER FROM issueDate)
+    if (
+        text_at(start - 4) == "extract" and text_at(start - 3) == "("
+        and text_at(start - 2) in _PERIOD_UNITS and text_at(start - 1) == "from"
+        and text_at(end + 1) == ")"
+    ):
+        return True
+    # issueDate >= bound / issueDate < bound, with a month-aligned bound
+    if text_at(end + 1) == ">" and text_at(end + 2) == "=":
+        bound = end + 3
+    elif text_at(end + 1) == "<" and text_at(end + 2) not in ("=", ">"):
+        bound = end + 2
+    else:
+        return False
+    if _MONTH_LITERAL_RE.match(text_at(bound)):
+        return text_at(bound + 1) in _BOUNDARY
+    if text_at(bound) == "date_trunc" and text_at(bound + 1) == "(" and text_at(bound + 2).strip("'").lower() in _PERIOD_UNITS:
+        # Skip to the closing parenthesis of DATE_TRUNC(...)
+        depth, cursor = 0, bound + 1
+        while True:
+            token = text_at(cursor)
+            if token == "":
+                return False
+            depth += token == "("
+            depth -= token == ")"
+            cursor += 1
+            if depth == 0:
+                break
+        # Optionally shifted by a whole number of months or years
+        if text_at(cursor) in ("+", "-") and text_at(cursor + 1) == "interval" and _WHOLE_MONTHS_RE.match(text_at(cursor + 2)):
+            cursor += 3
+        return text_at(cursor) in _BOUNDARY
+    return False
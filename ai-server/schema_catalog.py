@@ -0,0 +1,321 @@
+import re
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from cache import fingerprint, normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Tables the server maintains for itself, kept out of prompts and validation
+# along with any table whose name starts with an underscore
+INTERNAL_TABLES = ("invoice_rollups",)
+_INTERNAL_TABLES_SQL = ", ".join(f"'{table}'" for table in INTERNAL_TABLES)
+
+# Cheap probe that changes whenever a public table or column changes
+SIGNATURE_SQL = f"""
+    SELECT md5(string_agg(
+        table_name || '.' || column_name || ':' || udt_name || ':' || is_nullable,
+        ',' ORDER BY table_name, ordinal_position
+    )) AS signature
+    FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name NOT LIKE '\\_%'
+      AND table_name NOT IN ({_INTERNAL_TABLES_SQL})
+"""
+
+COLUMNS_SQL = f"""
+    SELECT c.table_name, c.column_name, c.data_type, c.udt_name, c.is_nullable
+    FROM information_schema.columns c
+    JOIN information_schema.tables t
+      ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE c.table_schema = 'public'
+      AND t.table_type = 'BASE TABLE'
+      AND c.table_name NOT LIKE '\\_%'
+      AND c.table_name NOT IN ({_INTERNAL_TABLES_SQL})
+    ORDER BY c.table_name, c.ordinal_position
+"""
+
+FOREIGN_KEYS_SQL = """
+    SELECT kcu.table_name, kcu.column_name,
+           ccu.table_name AS foreign_table, ccu.column_name AS foreign_column
+    FROM information_schema.table_constraints tc
+    JOIN information_schema.key_column_usage kcu
+      ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema
+    JOIN information_schema.constraint_column_usage ccu
+      ON tc.constraint_name = ccu.constraint_name AND tc.table_schema = ccu.table_schema
+    WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_schema = 'public'
+"""
+
+ENUMS_SQL = """
+    SELECT t.typname AS enum_name, e.enumlabel AS label
+    FROM pg_type t
+    JOIN pg_enum e ON e.enumtypid = t.oid
+    JOIN pg_namespace n ON n.oid = t.typnamespace
+    WHERE n.nspname = 'public'
+    ORDER BY t.typname, e.enumsortorder
+"""
+
+# Words that point at a table even when its name isn't in the question
+TABLE_SYNONYMS = {
+    "vendors": {"vendor", "supplier", "suppliers", "seller", "sellers"},
+    "customers": {"customer", "client", "clients", "buyer", "buyers"},
+    "invoices": {
+        "invoice", "bill", "bills", "spend", "spending", "spent", "amount", "total",
+        "overdue", "due", "paid", "unpaid", "pending", "status", "tax", "revenue",
+        "trend", "monthly", "yearly", "cost", "costs", "outflow",
+    },
+    "line_items": {"item", "items", "line", "lines", "product", "products", "quantity", "unit", "price"},
+    "payments": {"payment", "pay", "method", "transfer", "card", "paypal", "cash", "check", "paid"},
+    "documents": {"document", "file", "files", "upload", "uploads", "uploaded", "pdf", "receipt", "receipts", "contract", "contracts"},
+    "analytics": {"metric", "metrics", "kpi", "kpis"},
+    "users": {"user", "role", "roles", "department", "departments", "admin", "admins", "login", "accountant", "accountants"},
+}
+
+# Tables used when nothing in the question matches
+DEFAULT_TABLES = ("invoices", "vendors")
+
+# Hints for the LLM that introspection can't provide
+COLUMN_NOTES = {
+    ("invoices", "issueDate"): "when the invoice was issued",
+    ("invoices", "dueDate"): "when payment is due",
+    ("invoices", "paidDate"): "when the invoice was paid, null if unpaid",
+    ("invoices", "totalAmount"): "total invoice amount",
+    ("vendors", "category"): "vendor category like 'Technology', 'Marketing'",
+    ("documents", "invoiceId"): "optional link to invoices.id",
+}
+
+# Used until the database has been introspected, mirrors backend/prisma/schema.prisma
+FALLBACK_TABLES = {
+    "vendors": [
+        ("id", "text"), ("name", "text"), ("email", "text"), ("phone", "text"), ("address", "text"),
+        ("city", "text"), ("country", "text"), ("category", "text"), ("taxId", "text"),
+        ("createdAt", "timestamp"), ("updatedAt", "timestamp"),
+    ],
+    "customers": [
+        ("id", "text"), ("name", "text"), ("email", "text"), ("phone", "text"), ("address", "text"),
+        ("city", "text"), ("country", "text"), ("createdAt", "timestamp"), ("updatedAt", "timestamp"),
+    ],
+    "invoices": [
+        ("id", "text"), ("invoiceNumber", "text"), ("vendorId", "text"), ("customerId", "text"),
+        ("issueDate", "timestamp"), ("dueDate", "timestamp"), ("paidDate", "timestamp"),
+        ("subtotal", "numeric"), ("taxAmount", "numeric"), ("totalAmount", "numeric"),
+        ("currency", "text"), ("status", "InvoiceStatus"), ("description", "text"),
+        ("category", "text"), ("paymentTerms", "text"), ("createdAt", "timestamp"), ("updatedAt", "timestamp"),
+    ],
+    "line_items": [
+        ("id", "text"), ("invoiceId", "text"), ("description", "text"), ("quantity", "numeric"),
+        ("unitPrice", "numeric"), ("totalPrice", "numeric"), ("category", "text"),
+        ("createdAt", "timestamp"), ("updatedAt", "timestamp"),
+    ],
+    "payments": [
+        ("id", "text"), ("invoiceId", "text"), ("amount", "numeric"), ("currency", "text"),
+        ("method", "PaymentMethod"), ("reference", "text"), ("paidDate", "timestamp"), ("notes", "text"),
+        ("createdAt", "timestamp"), ("updatedAt", "timestamp"),
+    ],
+    "documents": [
+        ("id", "text"), ("invoiceId", "text"), ("fileName", "text"), ("filePath", "text"),
+        ("fileSize", "integer"), ("mimeType", "text"), ("type", "DocumentType"), ("uploadedAt", "timestamp"),
+    ],
+    "analytics": [
+        ("id", "text"), ("metric", "text"), ("value", "numeric"), ("category", "text"),
+        ("period", "timestamp"), ("metadata", "jsonb"), ("createdAt", "timestamp"),
+    ],
+    "users": [
+        ("id", "text"), ("name", "text"), ("email", "text"), ("passwordHash", "text"),
+        ("role", "UserRole"), ("department", "text"), ("isActive", "boolean"),
+        ("lastLoginAt", "timestamp"), ("createdAt", "timestamp"), ("updatedAt", "timestamp"),
+    ],
+}
+FALLBACK_FOREIGN_KEYS = [
+    ("invoices", "vendorId", "vendors", "id"),
+    ("invoices", "customerId", "customers", "id"),
+    ("line_items", "invoiceId", "invoices", "id"),
+    ("payments", "invoiceId", "invoices", "id"),
+]
+FALLBACK_ENUMS = {
+    "InvoiceStatus": ["PENDING", "PAID", "OVERDUE", "CANCELLED", "DRAFT"],
+    "PaymentMethod": ["BANK_TRANSFER", "CREDIT_CARD", "PAYPAL", "CASH", "CHECK", "OTHER"],
+    "DocumentType": ["INVOICE", "RECEIPT", "CONTRACT", "PO", "OTHER"],
+    "UserRole": ["ADMIN", "MANAGER", "ACCOUNTANT", "VIEWER"],
+}
+
+# Never describe these to the LLM
+HIDDEN_COLUMNS = {("users", "passwordHash")}
+
+_CAMEL_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def split_identifier(name: str) -> List[str]:
+    """'totalAmount' / 'line_items' -> ['total', 'amount'] / ['line', 'items']"""
+    return [part.lower() for part in _CAMEL_RE.sub("_", name).split("_") if part]
+
+
+class SchemaCatalog:
+    """Tables, columns, foreign keys and enum values of the public schema"""
+
+    def __init__(
+        self,
+        tables: Dict[str, List[Tuple[str, str]]],
+        foreign_keys: Iterable[Tuple[str, str, str, str]],
+        enums: Dict[str, List[str]],
+        signature: Optional[str] = None,
+        source: str = "fallback",
+    ):
+        self.tables = {
+            table: [(name, kind) for name, kind in columns if (table, name) not in HIDDEN_COLUMNS]
+            for table, columns in tables.items()
+        }
+        self.foreign_keys = [fk for fk in foreign_keys if fk[0] in self.tables and fk[2] in self.tables]
+        self.enums = enums
+        self.source = source
+        self.signature = signature or fingerprint(repr(sorted(self.tables.items())), repr(self.foreign_keys))
+        self._keywords = {table: self._table_keywords(table) for table in self.tables}
+        self._neighbours: Dict[str, Set[str]] = {table: set() for table in self.tables}
+        for table, _, foreign_table, _ in self.foreign_keys:
+            self._neighbours[table].add(foreign_table)
+            self._neighbours[foreign_table].add(table)
+
+    @classmethod
+    def fallback(cls) -> "SchemaCatalog":
+        return cls(FALLBACK_TABLES, FALLBACK_FOREIGN_KEYS, FALLBACK_ENUMS)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SchemaCatalog":
+        """Rebuild a catalog from to_dict() output"""
+        tables = {
+            table: [(column["name"], column["type"]) for column in columns]
+            for table, columns in data["tables"].items()
+        }
+        foreign_keys = [
+            (fk["table"], fk["column"], *fk["references"].split(".", 1))
+            for fk in data["foreign_keys"]
+        ]
+        return cls(tables, foreign_keys, data["enums"], signature=data["signature"], source=data["source"])
+
+    @classmethod
+    def from_connection(cls, conn) -> "SchemaCatalog":
+        """Introspect the public schema through an open psycopg2 connection"""
+        with conn.cursor() as cursor:
+            cursor.execute(SIGNATURE_SQL)
+            signature = cursor.fetchone()["signature"]
+            cursor.execute(COLUMNS_SQL)
+            tables: Dict[str, List[Tuple[str, str]]] = {}
+            for row in cursor.fetchall():
+                kind = row["udt_name"] if row["data_type"] == "USER-DEFINED" else row["data_type"]
+                tables.setdefault(row["table_name"], []).append((row["column_name"], kind))
+            cursor.execute(FOREIGN_KEYS_SQL)
+            foreign_keys = [
+                (row["table_name"], row["column_name"], row["foreign_table"], row["foreign_column"])
+                for row in cursor.fetchall()
+            ]
+            cursor.execute(ENUMS_SQL)
+            enums: Dict[str, List[str]] = {}
+            for row in cursor.fetchall():
+                enums.setdefault(row["enum_name"], []).append(row["label"])
+        return cls(tables, foreign_keys, enums, signature=signature, source="database")
+
+    def _table_keywords(self, table: str) -> Set[str]:
+        words = set(split_identifier(table)) | {table, table.rstrip("s")}
+        words |= TABLE_SYNONYMS.get(table, set())
+        return words
+
+    def _key_columns(self, table: str) -> Set[str]:
+        keys = {"id"}
+        for fk_table, column, foreign_table, foreign_column in self.foreign_keys:
+            if fk_table == table:
+                keys.add(column)
+            if foreign_table == table:
+                keys.add(foreign_column)
+        return keys
+
+    def _join_path(self, start: str, goal: str) -> List[str]:
+        """Shortest chain of tables linking two tables through foreign keys"""
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            table = queue.popleft()
+            if table == goal:
+                path = []
+                while table is not None:
+                    path.append(table)
+                    table = previous[table]
+                return path
+            for neighbour in self._neighbours[table]:
+                if neighbour not in previous:
+                    previous[neighbour] = table
+                    queue.append(neighbour)
+        return []
+
+    def relevant_tables(self, question: str) -> Tuple[List[str], List[str]]:
+        """(tables the question mentions, extra tables needed only to join them)"""
+        words = set(normalize_question(question).split())
+        words |= {word.rstrip("s") for word in words}
+        matched = [table for table in self.tables if self._keywords[table] & words]
+        if not matched:
+            for table in self.tables:
+                columns = {part for name, _ in self.tables[table] for part in split_identifier(name)}
+                if columns & words - {"id", "at", "date"}:
+                    matched.append(table)
+        if not matched:
+            matched = [table for table in DEFAULT_TABLES if table in self.tables]
+
+        bridges: List[str] = []
+        for other in matched[1:]:
+            for table in self._join_path(matched[0], other):
+                if table not in matched and table not in bridges:
+                    bridges.append(table)
+        return matched, bridges
+
+    def describe(self, question: Optional[str] = None) -> str:
+        """Schema text for the prompt, pruned to the question when one is given"""
+        if question is None:
+            tables, bridges = list(self.tables), []
+        else:
+            tables, bridges = self.relevant_tables(question)
+
+        lines = [
+            "Database Schema for FlowbitAI Analytics (PostgreSQL with Prisma - use camelCase column names):",
+            "CRITICAL: Always use double quotes around camelCase column names in SQL queries!",
+        ]
+        used_enums = set()
+        for table in tables + bridges:
+            columns = self.tables[table]
+            if table in bridges:
+                keys = self._key_columns(table)
+                columns = [(name, kind) for name, kind in columns if name in keys]
+            lines.append(f"\n{table} table:")
+            for name, kind in columns:
+                note = COLUMN_NOTES.get((table, name))
+                lines.append(f'- "{name}": {kind}' + (f" ({note})" if note else ""))
+                if kind in self.enums:
+                    used_enums.add(kind)
+
+        links = [
+            fk for fk in self.foreign_keys
+            if fk[0] in tables + bridges and fk[2] in tables + bridges
+        ]
+        if links:
+            lines.append("\nJoins:")
+            lines.extend(f'- {table}."{column}" = {foreign}."{foreign_column}"' for table, column, foreign, foreign_column in links)
+        if used_enums:
+            lines.append("\nEnum values:")
+            lines.extend(f"- {enum}: {', '.join(self.enums[enum])}" for enum in sorted(used_enums))
+        return "\n".join(lines)
+
+    def column_names(self) -> Dict[str, List[str]]:
+        return {table: [name for name, _ in columns] for table, columns in self.tables.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "signature": self.signature,
+            "source": self.source,
+            "tables": {
+                table: [{"name": name, "type": kind} for name, kind in columns]
+                for table, columns in self.tables.items()
+            },
+            "foreign_keys": [
+                {"table": table, "column": column, "references": f"{foreign}.{foreign_column}"}
+                for table, column, foreign, foreign_column in self.foreign_keys
+            ],
+            "enums": self.enums,
+        }
@@ -0,0 +1,34 @@
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logger.warning("orjson not available, encoding responses with json. Install with: pip install orjson")
+
+
+def json_default(value: Any) -> Any:
+    """JSON fallback for the values psycopg2 returns that JSON has no type for.
+
+    Decimals become numbers and dates ISO 8601 strings, in every response.
+    orjson encodes datetimes itself and only calls this for Decimal and
+    unknown types.
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON for a response body, with orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(value, default=json_default)
+    return json.dumps(value, default=json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,85 @@
+"""Production entry point: uvicorn worker processes, no reload.
+
+Worker count defaults to the CPUs available to the container
+(WEB_CONCURRENCY overrides it). With more than one worker the workers share
+their caches through a SQLite file (SHARED_CACHE_PATH), and the schema
+catalog is introspected once here before they start. On SIGTERM each worker
+stops accepting connections and finishes in-flight requests for up to
+GRACEFUL_SHUTDOWN_TIMEOUT seconds before shutting down.
+
+Usage: python serve.py [--workers N] [--host HOST] [--port PORT]
+"""
+import os
+import math
+import argparse
+import logging
+import tempfile
+
+import uvicorn
+from dotenv import load_dotenv
+
+logger = logging.getLogger("serve")
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: its affinity mask, capped by a cgroup CPU quota"""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    # cgroup v2, then v1
+    for quota_path, period_path in (
+        ("/sys/fs/cgroup/cpu.max", None),
+        ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us"),
+    ):
+        try:
+            with open(quota_path) as file:
+                fields = file.read().split()
+            if period_path:
+                with open(period_path) as file:
+                    fields.append(file.read().strip())
+            quota, period = fields[0], fields[1]
+        except (OSError, IndexError):
+            continue
+        if quota not in ("max", "-1"):
+            count = min(count, math.ceil(int(quota) / int(period)))
+        break
+    return max(1, count)
+
+
+def main() -> None:
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Run the AI server in production mode")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "0")),
+                        help="worker processes (default: available CPUs)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    args = parser.parse_args()
+    workers = args.workers or available_cpus()
+
+    if workers > 1:
+        # Workers read these at import, so they must be set before main is loaded
+        os.environ.setdefault("SHARED_CACHE_PATH", os.path.join(tempfile.gettempdir(), "ai-server-shared.db"))
+        if os.getenv("SNAPSHOT_ENABLED", "false").lower() == "true" and os.getenv("SNAPSHOT_PATH", ":memory:") != ":memory:":
+            logger.warning("A DuckDB snapshot file can't be opened by several workers; using in-memory snapshots")
+            os.environ["SNAPSHOT_PATH"] = ":memory:"
+
+    import main as app_module
+    app_module.preload_shared_state()
+
+    logger.info(f"Starting FlowbitAI Vanna Analytics Server on {args.host}:{args.port} with {workers} worker(s)")
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        reload=False,
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30")),
+        log_level=os.getenv("LOG_LEVEL", "info").lower()
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SlowQueryJournal:
+    """Bounded ring buffer of chat query executions slower than a threshold.
+
+    Each entry keeps the question, the SQL that ran (with its parameters),
+    duration, row count and approximate result size; a query plan can be
+    attached afterwards. The oldest entries are dropped past ``max_entries``.
+    When ``path`` is set, entries live in a SQLite file instead, so they
+    survive restarts and worker processes share one journal.
+    """
+
+    def __init__(self, threshold_ms: float = 500.0, max_entries: int = 200, path: Optional[str] = None):
+        self.threshold_ms = threshold_ms
+        self.max_entries = max_entries
+        self.path = path
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._stats = {"recorded": 0, "plans": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS slow_queries ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, entry TEXT NOT NULL)"
+            )
+
+    def record(
+        self,
+        question: str,
+        sql: str,
+        duration_ms: float,
+        rows: int = 0,
+        size_bytes: int = 0,
+        params: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> Optional[int]:
+        """Journal an execution if it crossed the threshold, returning its entry id"""
+        if duration_ms < self.threshold_ms:
+            return None
+        entry = {
+            "recorded_at": time.time(),
+            "question": question,
+            "sql": sql,
+            "params": params,
+            "duration_ms": round(duration_ms, 1),
+            "rows": rows,
+            "bytes": size_bytes,
+            "error": error,
+            "plan": None,
+        }
+        logger.warning(f"Slow query ({duration_ms:.0f} ms, {rows} rows) for {question!r}: {sql}")
+        with self._lock:
+            self._stats["recorded"] += 1
+            if self._db is not None:
+                entry_id = self._db.execute(
+                    "INSERT INTO slow_queries (entry) VALUES (?)", (json.dumps(entry, default=str),)
+                ).lastrowid
+                self._db.execute("DELETE FROM slow_queries WHERE id <= ?", (entry_id - self.max_entries,))
+                return entry_id
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry_id
+
+    def attach_plan(self, entry_id: int, plan: Any) -> None:
+        """Store the captured plan on an entry that is still in the journal"""
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute("SELECT entry FROM slow_queries WHERE id = ?", (entry_id,)).fetchone()
+                if row is None:
+                    return
+                entry = json.loads(row[0])
+                entry["plan"] = plan
+                self._db.execute(
+                    "UPDATE slow_queries SET entry = ? WHERE id = ?", (json.dumps(entry, default=str), entry_id)
+                )
+            elif entry_id in self._entries:
+                self._entries[entry_id]["plan"] = plan
+            else:
+                return
+            self._stats["plans"] += 1
+
+    def _all(self) -> List[Dict[str, Any]]:
+        """Every entry, oldest first"""
+        with self._lock:
+            if self._db is None:
+                return [{"id": entry_id, **entry} for entry_id, entry in self._entries.items()]
+            rows = self._db.execute(
+                "SELECT id, entry FROM slow_queries ORDER BY id DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()
+        return [{"id": entry_id, **json.loads(entry)} for entry_id, entry in reversed(rows)]
+
+    def entries(self, limit: int = 50, order: str = "duration", plans: bool = True) -> List[Dict[str, Any]]:
+        """Journaled entries, slowest first (order="duration") or newest first ("recent")"""
+        entries = self._all()
+        if order == "duration":
+            entries.sort(key=lambda entry: entry["duration_ms"], reverse=True)
+        else:
+            entries.reverse()
+        entries = entries[:limit]
+        if not plans:
+            entries = [
+                {**{key: value for key, value in entry.items() if key != "plan"}, "has_plan": entry["plan"] is not None}
+                for entry in entries
+            ]
+        return entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM slow_queries")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._db is not None:
+                size = self._db.execute("SELECT COUNT(*) FROM slow_queries").fetchone()[0]
+            else:
+                size = len(self._entries)
+            return {
+                "size": size,
+                "max_entries": self.max_entries,
+                "threshold_ms": self.threshold_ms,
+                **self._stats,
+            }
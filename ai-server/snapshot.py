@@ -0,0 +1,213 @@
+import re
+import time
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import duckdb
+
+logger = logging.getLogger(__name__)
+
+# Tables copied into the snapshot; analytical queries touching only these
+# can run there instead of on the primary
+SNAPSHOT_TABLES = ("invoices", "vendors", "customers", "line_items", "payments")
+
+_PARAM_RE = re.compile(r"%\((\w+)\)s|%%")
+_CALL_NAME_RE = re.compile(r"^(\w+)\(")
+
+
+def duckdb_type(pg_type: str) -> str:
+    """DuckDB column type for a Postgres type name (enums become VARCHAR)"""
+    pg_type = pg_type.lower()
+    if pg_type.startswith("timestamp"):
+        return "TIMESTAMPTZ" if "with time zone" in pg_type else "TIMESTAMP"
+    if pg_type in ("numeric", "decimal"):
+        # Every Prisma Decimal in this schema has scale 2
+        return "DECIMAL(18,2)"
+    return {
+        "integer": "INTEGER",
+        "smallint": "SMALLINT",
+        "bigint": "BIGINT",
+        "boolean": "BOOLEAN",
+        "date": "DATE",
+        "double precision": "DOUBLE",
+        "real": "FLOAT",
+    }.get(pg_type, "VARCHAR")
+
+
+def _column_name(name: str) -> str:
+    """Postgres' name for an unaliased output column: count_star() -> count, sum(x) -> sum"""
+    match = _CALL_NAME_RE.match(name)
+    if not match:
+        return name
+    return "count" if match.group(1) == "count_star" else match.group(1)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class ColumnarSnapshot:
+    """In-process DuckDB copy of the analytical tables.
+
+    ``refresh`` pulls rows changed since each table's ``updatedAt`` watermark
+    from Postgres with COPY and upserts them; deleted rows are reconciled
+    when Postgres reports deletes on the table. Queries run on their own
+    DuckDB cursor and see the last committed refresh. ``generation`` only
+    advances when a refresh actually changed something.
+    """
+
+    def __init__(self, path: str = ":memory:", tables: Tuple[str, ...] = SNAPSHOT_TABLES):
+        self.path = path
+        self.tables = tables
+        self.generation = 0
+        self.refreshed_at: Optional[float] = None
+        self._db = duckdb.connect(path)
+        self._refresh_lock = threading.Lock()
+        self._columns: Dict[str, List[Tuple[str, str]]] = {}
+        self._deletes: Dict[str, Optional[int]] = {}
+        self._stats = {"queries": 0, "errors": 0, "refreshes": 0, "rows_loaded": 0, "rows_deleted": 0}
+
+    def execute(self, sql: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Run a query written for psycopg2 (``%(name)s`` parameters) on the snapshot"""
+        if params:
+            sql = _PARAM_RE.sub(lambda match: f"${match.group(1)}" if match.group(1) else "%", sql)
+        try:
+            with self._db.cursor() as db:
+                result = db.execute(sql, params or None)
+                names = [_column_name(column[0]) for column in result.description]
+                rows = [dict(zip(names, row)) for row in result.fetchall()]
+        except duckdb.Error:
+            self._stats["errors"] += 1
+            raise
+        self._stats["queries"] += 1
+        return rows
+
+    def refresh(self, pg_conn, tables: Dict[str, List[Tuple[str, str]]], overlap_seconds: float = 60.0) -> Dict[str, Any]:
+        """Bring every snapshot table up to date with Postgres.
+
+        ``tables`` maps table names to (column, Postgres type) pairs, as in
+        SchemaCatalog.tables; a table whose columns changed is reloaded.
+        """
+        with self._refresh_lock:
+            started = time.monotonic()
+            loaded = deleted = 0
+            for table in self.tables:
+                if table in tables:
+                    table_loaded, table_deleted = self._refresh_table(pg_conn, table, tables[table], overlap_seconds)
+                    loaded += table_loaded
+                    deleted += table_deleted
+
+            if loaded or deleted:
+                self.generation += 1
+            self.refreshed_at = time.time()
+            self._stats["refreshes"] += 1
+            self._stats["rows_loaded"] += loaded
+            self._stats["rows_deleted"] += deleted
+            return {
+                "rows_loaded": loaded,
+                "rows_deleted": deleted,
+                "seconds": round(time.monotonic() - started, 3),
+            }
+
+    def _refresh_table(
+        self, pg_conn, table: str, columns: List[Tuple[str, str]], overlap_seconds: float
+    ) -> Tuple[int, int]:
+        names = [name for name, _ in columns]
+        if self._columns.get(table) != columns and self._existing_columns(table) != names:
+            with self._db.cursor() as db:
+                db.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+                db.execute(
+                    f"CREATE TABLE {_quote(table)} ("
+                    + ", ".join(f"{_quote(name)} {duckdb_type(kind)}" for name, kind in columns)
+                    + ")"
+                )
+            self._deletes.pop(table, None)
+        self._columns[table] = columns
+
+        watermark = None
+        if "updatedAt" in names:
+            with self._db.cursor() as db:
+                watermark = db.execute(f'SELECT MAX("updatedAt") FROM {_quote(table)}').fetchone()[0]
+
+        with pg_conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT n_tup_del FROM pg_stat_user_tables WHERE schemaname = 'public' AND relname = %s",
+                (table,),
+            )
+            row = cursor.fetchone()
+            deletes = row["n_tup_del"] if row else None
+
+            select = f"SELECT {', '.join(_quote(name) for name in names)} FROM {_quote(table)}"
+            if watermark is not None:
+                select += cursor.mogrify(
+                    ' WHERE "updatedAt" >= %s - %s * INTERVAL \'1 second\'', (watermark, overlap_seconds)
+                ).decode()
+        loaded = self._load(pg_conn, table, columns, select, replace=watermark is not None)
+
+        # Rows deleted in Postgres never show up as changed; drop them by id
+        deleted = 0
+        if watermark is not None and "id" in names and deletes != self._deletes.get(table):
+            deleted = self._reconcile_ids(pg_conn, table)
+        self._deletes[table] = deletes
+        return loaded, deleted
+
+    def _existing_columns(self, table: str) -> List[str]:
+        with self._db.cursor() as db:
+            rows = db.execute(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = ? ORDER BY ordinal_position",
+                [table],
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _copy_to_file(self, pg_conn, select: str, file) -> bool:
+        """COPY a query's rows into a CSV file; returns False when there were none"""
+        with pg_conn.cursor() as cursor:
+            cursor.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv)", file)
+        file.flush()
+        return file.tell() > 0
+
+    def _read_csv(self, path: str, columns: List[Tuple[str, str]]) -> str:
+        spec = ", ".join(f"'{name}': '{duckdb_type(kind)}'" for name, kind in columns)
+        return f"read_csv('{path}', header = false, quote = '\"', escape = '\"', columns = {{{spec}}})"
+
+    def _load(self, pg_conn, table: str, columns: List[Tuple[str, str]], select: str, replace: bool) -> int:
+        """Stream rows through a temporary CSV file (constant memory) and upsert them by id"""
+        with tempfile.NamedTemporaryFile(suffix=".csv") as file:
+            if not self._copy_to_file(pg_conn, select, file):
+                return 0
+            with self._db.cursor() as db:
+                db.execute("BEGIN")
+                db.execute(f"CREATE TEMP TABLE _incoming AS SELECT * FROM {self._read_csv(file.name, columns)}")
+                if replace:
+                    db.execute(f"DELETE FROM {_quote(table)} WHERE id IN (SELECT id FROM _incoming)")
+                db.execute(f"INSERT INTO {_quote(table)} SELECT * FROM _incoming")
+                count = db.execute("SELECT COUNT(*) FROM _incoming").fetchone()[0]
+                db.execute("DROP TABLE _incoming")
+                db.execute("COMMIT")
+        return count
+
+    def _reconcile_ids(self, pg_conn, table: str) -> int:
+        with tempfile.NamedTemporaryFile(suffix=".csv") as file:
+            self._copy_to_file(pg_conn, f"SELECT id FROM {_quote(table)}", file)
+            with self._db.cursor() as db:
+                ids = self._read_csv(file.name, [("id", "text")]) if file.tell() else "(SELECT NULL::VARCHAR AS id WHERE false)"
+                before = db.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+                db.execute(f"DELETE FROM {_quote(table)} WHERE id NOT IN (SELECT id FROM {ids})")
+                after = db.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+        return before - after
+
+    def stats(self) -> Dict[str, Any]:
+        with self._db.cursor() as db:
+            rows = {
+                table: db.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+                for table in self._columns
+            }
+        return {
+            "path": self.path,
+            "generation": self.generation,
+            "refreshed_at": self.refreshed_at,
+            "rows": rows,
+            **self._stats,
+        }
@@ -0,0 +1,536 @@
+import re
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Literals and quoted identifiers must survive untouched; words, numbers and
+# single punctuation characters are everything else
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<string>'(?:[^']|'')*')
+    | (?P<ident>"(?:[^"]|"")*")
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<space>\s+)
+    | (?P<number>\d+(?:\.\d*)?)
+    | (?P<word>\w+)
+    | (?P<punct>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_WORD_RE = re.compile(r'"((?:[^"]|"")+)"|\b(\w+)\b')
+_VOLATILE_RE = re.compile(r"\b(?:random|gen_random_uuid|clock_timestamp|timeofday|nextval)\s*\(", re.IGNORECASE)
+_CURRENT_TIME_RE = re.compile(r"\bnow\s*\(|\b(?:current_timestamp|current_time|localtimestamp|localtime)\b", re.IGNORECASE)
+_CURRENT_DATE_RE = re.compile(r"\bcurrent_date\b", re.IGNORECASE)
+# What paged_sql wraps around a query
+_PAGED_RE = re.compile(
+    r"SELECT \* FROM \((?P<inner>.*)\) AS _page(?P<after> WHERE _page\.id > %\(after\)s)?"
+    r"(?: ORDER BY _page\.id)? LIMIT \d+(?: OFFSET \d+)?",
+    re.DOTALL,
+)
+
+
+def tokenize_sql(sql: str) -> List[tuple]:
+    """Split SQL into (kind, text) tokens, keeping literals intact"""
+    return [(match.lastgroup, match.group()) for match in _TOKEN_RE.finditer(sql)]
+
+
+def canonicalize_sql(sql: str) -> str:
+    """Normalize SQL so formatting-only differences compare equal.
+
+    Comments are dropped, whitespace is collapsed, a trailing semicolon is
+    removed and unquoted text is lower-cased (Postgres folds it anyway).
+    String literals and quoted identifiers are left untouched.
+    """
+    parts = []
+    for kind, text in tokenize_sql(sql):
+        if kind == "comment" or kind == "space":
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+        elif kind in ("string", "ident"):
+            parts.append(text)
+        else:
+            parts.append(text.lower())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def sql_fingerprint(sql: str) -> str:
+    """Stable hash of the canonical form of a query"""
+    return hashlib.sha256(canonicalize_sql(sql).encode("utf-8")).hexdigest()[:24]
+
+
+def strip_literals(sql: str) -> str:
+    """Blank out string literals and comments so regexes only see SQL text"""
+    return "".join(
+        "''" if kind == "string" else " " if kind == "comment" else text
+        for kind, text in tokenize_sql(sql)
+    )
+
+
+def referenced_tables(sql: str, known_tables: Iterable[str]) -> Set[str]:
+    """Known tables mentioned anywhere in the query.
+
+    Deliberately over-inclusive: any identifier matching a table name counts,
+    so callers that invalidate on table changes never miss a dependency.
+    """
+    known = {table.lower(): table for table in known_tables}
+    tables = set()
+    for quoted, bare in _WORD_RE.findall(strip_literals(sql)):
+        name = quoted if quoted else bare.lower()
+        if name.lower() in known and (bare or quoted == known[name.lower()]):
+            tables.add(known[name.lower()])
+    return tables
+
+
+def is_volatile(sql: str) -> bool:
+    """True when the query calls functions whose result changes per call"""
+    return bool(_VOLATILE_RE.search(strip_literals(sql)))
+
+
+def time_dependency(sql: str) -> str:
+    """'time', 'date' or '' depending on which clock the query reads"""
+    text = strip_literals(sql)
+    if _CURRENT_TIME_RE.search(text):
+        return "time"
+    if _CURRENT_DATE_RE.search(text):
+        return "date"
+    return ""
+
+
+def strip_trailing_semicolon(sql: str) -> str:
+    return sql.strip().rstrip(";").strip()
+
+
+def top_level_tokens(sql: str) -> List[tuple]:
+    """Significant tokens outside any parentheses, keywords lower-cased"""
+    depth = 0
+    tokens = []
+    for kind, text in tokenize_sql(sql):
+        if kind in ("space", "comment"):
+            continue
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0:
+            tokens.append((kind, text.lower() if kind == "word" else text))
+    return tokens
+
+
+def top_level_keywords(sql: str) -> Set[str]:
+    return {text for kind, text in top_level_tokens(sql) if kind == "word"}
+
+
+def _identifier_name(kind: str, text: str) -> str:
+    return text[1:-1].replace('""', '"') if kind == "ident" else text.lower()
+
+
+def output_columns(sql: str) -> Optional[List[Optional[str]]]:
+    """Output names of the top-level select list.
+
+    ``*`` items are returned as ``"*"`` and unaliased expressions as None.
+    Returns None when the statement is not a plain SELECT.
+    """
+    tokens = top_level_tokens(sql)
+    if not tokens or tokens[0] != ("word", "select"):
+        return None
+    items: List[List[tuple]] = [[]]
+    for kind, text in tokens[1:]:
+        if kind == "word" and text == "from":
+            break
+        if text == ",":
+            items.append([])
+        else:
+            items[-1].append((kind, text))
+
+    names: List[Optional[str]] = []
+    for item in items:
+        if not item:
+            names.append(None)
+        elif item[-1][1] == "*":
+            names.append("*")
+        elif item[-1][0] in ("word", "ident") and (
+            len(item) == 1
+            or item[-2][1] == "."
+            or (item[-2] == ("word", "as"))
+        ):
+            names.append(_identifier_name(*item[-1]))
+        else:
+            names.append(None)
+    return names
+
+
+# Aggregates output_aggregates reports, and the functions it looks through
+# because they pass an aggregate's value on, e.g. COALESCE(SUM(x), 0)
+AGGREGATE_FUNCTIONS = {
+    "avg", "count", "max", "min", "sum", "median", "mode", "percentile_cont", "percentile_disc",
+    "stddev", "stddev_pop", "stddev_samp", "variance", "var_pop", "var_samp",
+}
+_PASS_THROUGH_FUNCTIONS = {"coalesce", "round"}
+
+
+def _outer_aggregate(item: List[tuple]) -> Optional[str]:
+    if len(item) < 3 or item[0][0] != "word" or item[1] != ("punct", "("):
+        return None
+    depth = 0
+    for end in range(1, len(item)):
+        depth += {"(": 1, ")": -1}.get(item[end][1], 0)
+        if depth == 0:
+            break
+    else:
+        return None
+    name, arguments, rest = item[0][1], item[2:end], item[end + 1:]
+    if rest[:1] == [("word", "over")]:
+        return f"{name} over"
+    # Only casts and an alias may follow the call
+    while len(rest) > 2 and rest[0] == rest[1] == ("punct", ":"):
+        rest = rest[3:]
+    if rest[:1] == [("word", "as")]:
+        rest = rest[1:]
+    if len(rest) > 1 or (rest and rest[0][0] not in ("word", "ident")):
+        return None
+    if name in _PASS_THROUGH_FUNCTIONS:
+        first, depth = [], 0
+        for token in arguments:
+            depth += {"(": 1, ")": -1}.get(token[1], 0)
+            if depth == 0 and token[1] == ",":
+                break
+            first.append(token)
+        return _outer_aggregate(first)
+    if name not in AGGREGATE_FUNCTIONS:
+        return None
+    return f"{name} distinct" if arguments[:1] == [("word", "distinct")] else name
+
+
+def output_aggregates(sql: str) -> Optional[List[Optional[str]]]:
+    """Aggregate behind each item of the top-level select list.
+
+    Looks through casts and COALESCE/ROUND, so ``COALESCE(SUM(x), 0)::int``
+    gives "sum"; ``COUNT(DISTINCT x)`` gives "count distinct" and a window
+    call such as ``SUM(x) OVER (...)`` gives "sum over". Items that aren't
+    one aggregate call give None. Returns None when the statement is not a
+    plain SELECT.
+    """
+    tokens = [
+        (kind, text.lower() if kind == "word" else text)
+        for kind, text in tokenize_sql(sql)
+        if kind not in ("space", "comment")
+    ]
+    if not tokens or tokens[0] != ("word", "select"):
+        return None
+    items: List[List[tuple]] = [[]]
+    depth = 0
+    for kind, text in tokens[1:]:
+        depth += {"(": 1, ")": -1}.get(text, 0)
+        if depth == 0 and kind == "word" and text == "from":
+            break
+        if depth == 0 and text == ",":
+            items.append([])
+        else:
+            items[-1].append((kind, text))
+    return [_outer_aggregate(item) for item in items]
+
+
+def from_is_single_table(sql: str) -> bool:
+    """True when the top-level FROM clause names exactly one table"""
+    seen_from = False
+    for kind, text in top_level_tokens(sql):
+        if not seen_from:
+            seen_from = kind == "word" and text == "from"
+            continue
+        if kind == "word" and text in ("where", "group", "order", "limit", "offset", "having", "window", "fetch", "for"):
+            break
+        if text == "," or (kind == "word" and text in ("join", "lateral")):
+            return False
+    return seen_from
+
+
+def is_keyset_pageable(sql: str) -> bool:
+    """Whether the query can be paged with ``WHERE id > :last ORDER BY id``.
+
+    That needs a plain single-level SELECT whose output has exactly one ``id``
+    column and which doesn't impose its own ordering, grouping or limits.
+    """
+    keywords = top_level_keywords(sql)
+    if keywords & {"order", "group", "distinct", "union", "intersect", "except", "limit", "offset", "fetch", "having"}:
+        return False
+    columns = output_columns(sql)
+    if columns is None:
+        return False
+    if columns == ["*"]:
+        return from_is_single_table(sql)
+    return "*" not in columns and columns.count("id") == 1
+
+
+def paged_sql(sql: str, limit: int, offset: int = 0, keyset: bool = False, after_key: bool = False) -> str:
+    """Wrap a query so it returns one page of at most ``limit`` rows.
+
+    Keyset pages filter on the ``%(after)s`` parameter when ``after_key`` is
+    set; otherwise pages are addressed by row offset.
+    """
+    inner = strip_trailing_semicolon(sql)
+    if keyset:
+        if after_key:
+            # The page query is parameterized, so literal % signs must be escaped
+            inner = inner.replace("%", "%%")
+        where = " WHERE _page.id > %(after)s" if after_key else ""
+        return f"SELECT * FROM ({inner}) AS _page{where} ORDER BY _page.id LIMIT {int(limit)}"
+    page = f"SELECT * FROM ({inner}) AS _page LIMIT {int(limit)}"
+    return page + (f" OFFSET {int(offset)}" if offset else "")
+
+
+def unpaged_sql(sql: str) -> Optional[str]:
+    """The query a paged_sql page wraps, or None if sql isn't a page"""
+    match = _PAGED_RE.fullmatch(sql)
+    if match is None:
+        return None
+    inner = match.group("inner")
+    return inner.replace("%%", "%") if match.group("after") else inner
+
+
+class SQLValidationError(Exception):
+    """Generated SQL was rejected before reaching the database"""
+
+
+# Statements and clauses that modify data, schema or session state
+FORBIDDEN_KEYWORDS = {
+    "insert", "update", "delete", "merge", "truncate", "drop", "alter", "create",
+    "grant", "revoke", "copy", "vacuum", "analyze", "cluster", "reindex", "lock",
+    "call", "do", "execute", "prepare", "listen", "notify", "into", "comment", "refresh",
+}
+# Functions with side effects or access outside the database
+FORBIDDEN_FUNCTIONS = {
+    "pg_sleep", "pg_terminate_backend", "pg_cancel_backend", "pg_read_file",
+    "pg_read_binary_file", "pg_ls_dir", "pg_reload_conf", "lo_import", "lo_export",
+    "dblink", "dblink_exec", "set_config", "pg_advisory_lock", "pg_notify",
+}
+# Words that can follow a table name but are not an alias
+_NOT_ALIAS = {
+    "where", "join", "inner", "left", "right", "full", "outer", "cross", "natural", "on",
+    "using", "group", "order", "limit", "offset", "having", "window", "union", "intersect",
+    "except", "fetch", "for", "lateral", "tablesample",
+}
+
+
+def _snake_case(name: str) -> str:
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", name).lower()
+
+
+def validate_sql(
+    sql: str,
+    tables: Dict[str, Iterable[str]],
+    hidden_columns: Iterable[Tuple[str, str]] = (),
+) -> Tuple[str, List[str]]:
+    """Check generated SQL locally and repair identifier spelling.
+
+    ``tables`` maps each table to its column names and ``hidden_columns``
+    lists (table, column) pairs queries may not read. Raises
+    SQLValidationError for anything other than a single read-only
+    SELECT/WITH statement, for a table that isn't in ``tables``, for a
+    column that doesn't exist on the tables it can come from, and for
+    hidden columns, including through ``*`` or a whole-row reference such
+    as ``row_to_json(u)``. snake_case, unquoted or
+    mis-cased references to camelCase columns are rewritten to the quoted
+    column name. Returns (sql, list of repairs made).
+    """
+    columns_by_table = {table: set(columns) for table, columns in tables.items()}
+    all_columns = set().union(*columns_by_table.values()) if columns_by_table else set()
+    hidden_by_table: Dict[str, Set[str]] = {}
+    for table, column in hidden_columns:
+        hidden_by_table.setdefault(table, set()).add(column)
+    # Spellings the model uses for camelCase columns: totalamount, total_amount
+    column_repairs = {}
+    for column in all_columns:
+        if column != column.lower():
+            column_repairs[column.lower()] = column
+            column_repairs[_snake_case(column)] = column
+    table_repairs = {table.replace("_", ""): table for table in columns_by_table if "_" in table}
+    lowercase_names = {name for name in all_columns | set(columns_by_table) if name == name.lower()}
+
+    tokens = tokenize_sql(strip_trailing_semicolon(sql))
+    significant = [i for i, (kind, _) in enumerate(tokens) if kind not in ("space", "comment")]
+    if not significant:
+        raise SQLValidationError("Empty SQL query")
+    if any(tokens[i] == ("punct", ";") for i in significant):
+        raise SQLValidationError("Only a single SQL statement is allowed")
+    first_kind, first_text = tokens[significant[0]]
+    if first_kind != "word" or first_text.lower() not in ("select", "with"):
+        raise SQLValidationError("Only SELECT queries are allowed")
+    words = {tokens[i][1].lower() for i in significant if tokens[i][0] == "word"}
+    forbidden = sorted(words & FORBIDDEN_KEYWORDS)
+    if forbidden:
+        raise SQLValidationError(f"Query uses a forbidden keyword: {forbidden[0].upper()}")
+    forbidden = sorted(words & FORBIDDEN_FUNCTIONS)
+    if forbidden:
+        raise SQLValidationError(f"Query calls a forbidden function: {forbidden[0]}")
+
+    def token_at(position: int) -> Tuple[str, str]:
+        if 0 <= position < len(significant):
+            return tokens[significant[position]]
+        return ("", "")
+
+    def word_at(position: int) -> str:
+        kind, text = token_at(position)
+        return text.lower() if kind == "word" else text
+
+    # FROM/JOIN that introduce tables: not the FROM of EXTRACT(... FROM ...),
+    # SUBSTRING(... FROM ...) or IS DISTINCT FROM
+    table_clauses: List[int] = []
+    subquery_stack: List[bool] = []
+    for position in range(len(significant)):
+        text = word_at(position)
+        if text == "(":
+            subquery_stack.append(word_at(position + 1) in ("select", "with"))
+        elif text == ")":
+            if subquery_stack:
+                subquery_stack.pop()
+        elif text in ("from", "join") and (not subquery_stack or subquery_stack[-1]) and word_at(position - 1) != "distinct":
+            table_clauses.append(position)
+
+    # WITH name [(columns)] AS [NOT] [MATERIALIZED] (
+    cte_names: Set[str] = set()
+    if "with" in words:
+        for position in range(len(significant)):
+            kind, text = token_at(position)
+            if kind not in ("word", "ident"):
+                continue
+            cursor = position + 1
+            if token_at(cursor) == ("punct", "("):
+                while token_at(cursor) not in (("punct", ")"), ("", "")):
+                    cursor += 1
+                cursor += 1
+            if word_at(cursor) != "as":
+                continue
+            cursor += 1
+            while word_at(cursor) in ("not", "materialized"):
+                cursor += 1
+            if token_at(cursor) == ("punct", "(") and word_at(cursor + 1) in ("select", "with"):
+                cte_names.add(_identifier_name(kind, text))
+
+    # Table aliases (FROM/JOIN table [AS] alias[, table [AS] alias ...]).
+    # Unqualified columns can only be checked when every source is a table.
+    table_aliases: Dict[str, str] = {}
+    name_positions: Set[int] = set()
+    sources_known = bool(columns_by_table)
+    for position in table_clauses:
+        cursor = position + 1
+        while True:
+            if word_at(cursor) == "lateral" or token_at(cursor) == ("punct", "("):
+                sources_known = False
+                break
+            if token_at(cursor + 1) == ("punct", "."):
+                if word_at(cursor) != "public" and columns_by_table:
+                    raise SQLValidationError(f"Only tables in the public schema can be queried, not {word_at(cursor)}")
+                cursor += 2
+            table_kind, table_text = token_at(cursor)
+            if table_kind not in ("word", "ident"):
+                break
+            if token_at(cursor + 1) == ("punct", "("):
+                # Set-returning function such as generate_series(...)
+                sources_known = False
+                break
+            table = _identifier_name(table_kind, table_text)
+            table = table_repairs.get(table.replace("_", ""), table)
+            name_positions.add(cursor)
+            if table in cte_names:
+                sources_known = False
+            elif table not in columns_by_table:
+                if columns_by_table:
+                    raise SQLValidationError(f"Table {table} does not exist")
+                break
+            else:
+                table_aliases[table] = table
+            alias_position = cursor + 1
+            if word_at(alias_position) == "as":
+                alias_position += 1
+            alias_kind, alias_text = token_at(alias_position)
+            if alias_kind in ("word", "ident") and alias_text.lower() not in _NOT_ALIAS:
+                if table in columns_by_table:
+                    table_aliases[_identifier_name(alias_kind, alias_text)] = table
+                name_positions.add(alias_position)
+                alias_position += 1
+            if token_at(alias_position) != ("punct", ","):
+                break
+            cursor = alias_position + 1
+
+    from_tables = set(table_aliases.values())
+    from_columns = set().union(*(columns_by_table[table] for table in from_tables)) if from_tables else set()
+    # Hidden columns of the FROM tables under every spelling that could reach them
+    from_hidden = {
+        spelling
+        for table in from_tables
+        for column in hidden_by_table.get(table, ())
+        for spelling in (column, column.lower(), _snake_case(column))
+    }
+
+    # Output aliases (AS name)
+    defined_names = set(table_aliases) | cte_names
+    output_aliases = set()
+    for position in range(len(significant)):
+        if word_at(position) == "as" and token_at(position + 1)[0] in ("word", "ident"):
+            output_aliases.add(_identifier_name(*token_at(position + 1)))
+    defined_names |= output_aliases
+    output_aliases -= all_columns
+
+    # SELECT * / alias.* would return hidden columns
+    for position in range(len(significant)):
+        if token_at(position) != ("punct", "*"):
+            continue
+        if token_at(position - 1) == ("punct", "."):
+            starred = {table_aliases.get(_identifier_name(*token_at(position - 2)))}
+        elif word_at(position - 1) in ("select", ",", "distinct", "all"):
+            starred = from_tables
+        else:
+            continue
+        for table in sorted(table for table in starred if table in hidden_by_table):
+            raise SQLValidationError(f"SELECT * is not allowed on {table}; list the columns instead")
+
+    repairs: List[str] = []
+    for position, index in enumerate(significant):
+        kind, text = tokens[index]
+        if kind not in ("word", "ident"):
+            continue
+        name = text[1:-1] if kind == "ident" else text
+        qualified = token_at(position - 1) == ("punct", ".")
+        qualifier = token_at(position - 2) if qualified else ("", "")
+        is_call = token_at(position + 1) == ("punct", "(")
+        is_qualifier = token_at(position + 1) == ("punct", ".")
+        replacement = None
+
+        # Unquoted names are folded to lower case by Postgres
+        resolved = name if kind == "ident" else name.lower()
+        if is_call or resolved in lowercase_names or (kind == "ident" and name in all_columns):
+            pass
+        elif resolved.replace("_", "") in table_repairs and not qualified:
+            replacement = table_repairs[resolved.replace("_", "")]
+        elif is_qualifier:
+            pass
+        elif resolved.lower() in column_repairs and (qualified or resolved not in output_aliases):
+            replacement = f'"{column_repairs[resolved.lower()]}"'
+
+        if replacement is not None and replacement != text:
+            tokens[index] = (kind, replacement)
+            repairs.append(f"{text} -> {replacement}")
+            resolved = replacement.strip('"')
+
+        if qualified and qualifier[0] in ("word", "ident") and resolved != "*":
+            table = table_aliases.get(_identifier_name(*qualifier))
+            if table is not None and resolved not in columns_by_table[table]:
+                raise SQLValidationError(f'Column "{resolved}" does not exist on table {table}')
+            continue
+
+        # Unqualified column reference: resolve it against the FROM tables
+        if is_call or is_qualifier or position in name_positions:
+            continue
+        if word_at(position - 1) == "as" or token_at(position - 1) == ("punct", ":"):
+            continue
+        # A bare table name or alias is the whole row, e.g. row_to_json(u)
+        row_table = table_aliases.get(_identifier_name(kind, text))
+        if row_table in hidden_by_table and resolved not in from_columns:
+            raise SQLValidationError(f"Whole-row references to {row_table} are not allowed; list the columns instead")
+        if resolved in defined_names:
+            continue
+        if resolved in from_hidden and resolved not in from_columns:
+            raise SQLValidationError(f'Column "{name}" is not available')
+        if kind == "ident" and sources_known and from_tables and resolved not in from_columns:
+            raise SQLValidationError(f'Column "{resolved}" does not exist on {", ".join(sorted(from_tables))}')
+
+    return "".join(text for _, text in tokens), repairs
@@ -0,0 +1,30 @@
+import pytest
+
+from cache import QuestionCache, normalize_question
+
+
+@pytest.mark.parametrize("first, second", [
+    ("What is our total spend?", "what is our   total spend"),
+    ("invoices over 1,000.00", "Invoices over 1000"),
+    ("top five vendors", "Top 5 vendors!"),
+])
+def test_normalize_question_folds_equivalent_questions(first, second):
+    assert normalize_question(first) == normalize_question(second)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("invoices with total > 1000", "invoices with total < 1000"),
+    ("invoices with total >= 1000", "invoices with total > 1000"),
+    ("vendors with growth of -5%", "vendors with growth of 5%"),
+    ("vendors with growth of 5%", "vendors with growth of 5"),
+    ("invoices where amount = 0", "invoices where amount != 0"),
+])
+def test_normalize_question_keeps_operators_signs_and_percent(first, second):
+    assert normalize_question(first) != normalize_question(second)
+
+
+def test_question_cache_separates_operator_questions():
+    cache = QuestionCache()
+    cache.put("invoices with total > 1000", 'SELECT * FROM invoices WHERE "totalAmount" > 1000', "v1")
+    assert cache.get("invoices with total < 1000", "v1") is None
+    assert cache.get("Invoices with total > 1,000", "v1") == 'SELECT * FROM invoices WHERE "totalAmount" > 1000'
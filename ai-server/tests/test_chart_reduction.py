@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from chart_reduction import is_additive, reduce_chart_data
+
+START = datetime(2024, 1, 1)
+
+
+def daily_series(column, days=730):
+    return [{"day": START + timedelta(days=n), column: 10 + n % 7} for n in range(days)]
+
+
+@pytest.mark.parametrize("column, aggregate, additive", [
+    ("total", "sum", True),
+    ("n", "count", True),
+    ("total", "avg", False),
+    ("vendors", "count distinct", False),
+    ("running", "sum over", False),
+    ("invoice_count", None, True),
+    ("totalAmount", None, True),
+    ("avg_total", None, False),
+    ("price", None, False),
+])
+def test_is_additive(column, aggregate, additive):
+    assert is_additive(column, aggregate) is additive
+
+
+def test_additive_series_is_summed_into_calendar_buckets():
+    data = daily_series("total")
+    rows, method = reduce_chart_data(data, "line", "day", "total", 100, 20, additive=True)
+    assert method == "time_bucket:month"
+    assert sum(row["total"] for row in rows) == sum(row["total"] for row in data)
+
+
+def test_average_series_keeps_its_values():
+    data = daily_series("avg_amount")
+    rows, method = reduce_chart_data(data, "line", "day", "avg_amount", 100, 20, additive=False)
+    assert method == "lttb"
+    assert len(rows) == 100
+    assert {row["avg_amount"] for row in rows} <= {row["avg_amount"] for row in data}
@@ -0,0 +1,37 @@
+import asyncio
+import json
+import os
+
+# Keep main from connecting to a database at import
+os.environ.setdefault("DATABASE_URL", "")
+
+import main
+
+
+def test_chat_batch_answers_only_equivalent_questions_once(monkeypatch):
+    asked = []
+
+    async def fake_answer(question, format=None, engine="auto"):
+        asked.append(question)
+        return {"question": question, "sql": f"-- {question}", "data": []}
+
+    monkeypatch.setattr(main, "answer_question", fake_answer)
+    questions = [
+        "invoices with total > 1000",
+        "invoices with total < 1000",
+        "Invoices with total > 1,000?",
+        "vendors with growth of -5%",
+        "vendors with growth of 5%",
+    ]
+    response = asyncio.run(main.chat_batch(main.ChatBatchRequest(questions=questions)))
+    results = json.loads(response.body)["results"]
+
+    assert sorted(asked) == sorted(set(questions) - {"Invoices with total > 1,000?"})
+    assert [result["question"] for result in results] == questions
+    assert [result["sql"] for result in results] == [
+        "-- invoices with total > 1000",
+        "-- invoices with total < 1000",
+        "-- invoices with total > 1000",
+        "-- vendors with growth of -5%",
+        "-- vendors with growth of 5%",
+    ]
@@ -0,0 +1,84 @@
+import re
+from datetime import date
+
+import pytest
+
+from intents import match_intent, name_pattern, resolve_intent, resolve_name
+
+TODAY = date(2024, 5, 15)
+
+
+def match(question):
+    return match_intent(question, max_rows=1000, today=TODAY)
+
+
+@pytest.mark.parametrize("question, name, params", [
+    ("How much did we spend?", "total_spend", {"status": "PAID"}),
+    ("Total spend this year", "total_spend", {"status": "PAID", "start": date(2024, 1, 1), "end": date(2025, 1, 1)}),
+    ("Show me the top 5 vendors by spend", "top_vendors", {"status": "PAID", "limit": 5}),
+    ("top 10 invoices", "top_invoices", {"limit": 10}),
+    ("3 largest invoices last month", "top_invoices", {"limit": 3, "start": date(2024, 4, 1), "end": date(2024, 5, 1)}),
+    ("List invoices", "list_invoices", {"limit": 100}),
+    ("overdue invoices", "list_invoices", {"limit": 100}),
+    ("How many invoices are there?", "invoice_count", {}),
+    ("How many pending invoices were there in 2023", "invoice_count", {"status": "PENDING", "start": date(2023, 1, 1), "end": date(2024, 1, 1)}),
+    ("monthly spend trend", "monthly_trend", {}),
+    ("spend by category", "spend_by_category", {"status": "PAID"}),
+    ("invoices by status", "invoices_by_status", {}),
+])
+def test_match_intent(question, name, params):
+    intent = match(question)
+    assert intent is not None
+    assert (intent["name"], intent["params"], intent["lookups"]) == (name, params, {})
+
+
+@pytest.mark.parametrize("question", [
+    "Which vendors have the most overdue invoices and why?",
+    "average invoice amount",
+    "top vendors by spend in the IT category for vendor acme",
+    "invoices with a total above 1000",
+])
+def test_unmatched_questions_go_to_the_llm(question):
+    assert match(question) is None
+
+
+def test_top_invoices_order_by_amount_and_lists_by_date():
+    assert 'ORDER BY i."totalAmount" DESC' in match("top 10 invoices")["sql"]
+    assert 'ORDER BY i."issueDate" DESC' in match("list invoices")["sql"]
+
+
+def test_names_are_looked_up_then_matched_exactly():
+    intent = match("Total spend for vendor Acme Corp. this year")
+    sql, params = intent["lookups"]["vendor"]
+    assert "~*" in sql and params == {"pattern": r"\macme[^[:alnum:]]+corp\M"}
+    assert "v.name = %(vendor)s" in intent["sql"]
+
+    resolved = resolve_intent(intent, {"vendor": ["Acme Corp."]})
+    assert resolved["params"]["vendor"] == "Acme Corp."
+    assert resolved["slots"]["vendor"] == "Acme Corp."
+    assert resolve_intent(intent, {"vendor": []}) is None
+
+
+@pytest.mark.parametrize("name, stored, matches", [
+    ("it", "IT", True),
+    ("it", "IT Services", True),
+    ("it", "Utilities", False),
+    ("it", "Facilities", False),
+    ("acme corp", "Acme Corp.", True),
+    ("acme corp", "Acme, Corp", True),
+    ("acme corp", "Acme Corporation", False),
+])
+def test_name_pattern_matches_whole_words(name, stored, matches):
+    # Python's \b stands in for Postgres' \m / \M word boundaries
+    pattern = name_pattern(name).replace(r"\m", r"\b").replace(r"\M", r"\b").replace("[:alnum:]", "a-zA-Z0-9")
+    assert bool(re.search(pattern, stored, re.IGNORECASE)) is matches
+
+
+@pytest.mark.parametrize("typed, candidates, expected", [
+    ("it", ["IT Services"], "IT Services"),
+    ("it", ["IT", "IT Services"], "IT"),
+    ("it", ["IT Services", "IT Hardware"], None),
+    ("acme", [], None),
+])
+def test_resolve_name(typed, candidates, expected):
+    assert resolve_name(typed, candidates) == expected
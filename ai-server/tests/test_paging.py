@@ -0,0 +1,46 @@
+import os
+import random
+
+import pytest
+
+# Keep main from connecting to a database at import
+os.environ.setdefault("DATABASE_URL", "")
+
+import main
+from cache import ResultCache
+
+SQL = 'SELECT "vendorId", SUM("totalAmount") AS total FROM invoices GROUP BY 1'
+ROWS = [{"vendorId": f"v{n}", "total": n % 7} for n in range(95)]
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Queries run; each run returns the rows in a different order, as an
+    unordered subquery may"""
+    executed = []
+
+    def execute(sql, params=None, prepared=False, engine="auto"):
+        executed.append(sql)
+        rows = list(ROWS)
+        random.Random(len(executed)).shuffle(rows)
+        return rows, False
+
+    monkeypatch.setattr(main, "execute_cached_query", execute)
+    monkeypatch.setattr(main, "paged_rows", ResultCache())
+    return executed
+
+
+def test_offset_pages_do_not_overlap(runs):
+    data, position = main.fetch_result_page(SQL, False, {}, 20)
+    seen = [row["vendorId"] for row in data]
+    while position is not None:
+        data, position = main.fetch_result_page(SQL, False, position, 20)
+        seen.extend(row["vendorId"] for row in data)
+    assert len(seen) == len(set(seen)) == len(ROWS)
+    assert len(runs) == 1
+
+
+def test_offset_page_after_eviction_expires(runs):
+    with pytest.raises(main.PagedResultExpired):
+        main.fetch_result_page(SQL, False, {"offset": 20}, 20)
+    assert runs == []
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+# Keep main from connecting to a database at import
+os.environ.setdefault("DATABASE_URL", "")
+
+import main
+from sql_utils import paged_sql
+
+
+class PlanCursor:
+    """Cursor that records statements and answers EXPLAIN with a fixed plan"""
+
+    def __init__(self, cost, rows):
+        self.plan = {"Total Cost": cost, "Plan Rows": rows}
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchone(self):
+        return {"QUERY PLAN": [{"Plan": self.plan}]}
+
+
+SQL = "SELECT * FROM invoices WHERE notes LIKE '%late%'"
+
+
+@pytest.mark.parametrize("page_sql, params", [
+    (paged_sql(SQL, 1001), None),
+    (paged_sql(SQL, 1001, offset=1000), None),
+    (paged_sql(SQL, 1001, keyset=True, after_key=True), {"after": "i1"}),
+])
+def test_guard_query_explains_the_query_behind_a_page(page_sql, params):
+    cursor = PlanCursor(cost=10, rows=10)
+    main.guard_query(cursor, page_sql, params)
+    assert cursor.executed[-1] == ("EXPLAIN (FORMAT JSON) " + SQL, None)
+
+
+def test_guard_query_budgets_rows_of_the_whole_query(monkeypatch):
+    monkeypatch.setattr(main, "QUERY_MAX_ROWS_ESTIMATE", 1000)
+    with pytest.raises(main.QueryBudgetError, match="too many rows"):
+        main.guard_query(PlanCursor(cost=10, rows=50000), paged_sql(SQL, 1001))
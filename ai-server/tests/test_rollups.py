@@ -0,0 +1,134 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from rollups import rewrite_for_rollup
+from sql_utils import tokenize_sql
+
+
+def output_names(sql):
+    """Result column names as Postgres derives them for the top-level select list"""
+    tokens = [text for kind, text in tokenize_sql(sql) if kind not in ("space", "comment")]
+    items, item, depth = [], [], 0
+    for text in tokens[1:]:
+        if depth == 0 and text.lower() == "from":
+            break
+        depth += (text == "(") - (text == ")")
+        if depth == 0 and text == ",":
+            items.append(item)
+            item = []
+        else:
+            item.append(text)
+    items.append(item)
+
+    names = []
+    for item in items:
+        if len(item) > 2 and item[-2].lower() == "as":
+            names.append(item[-1].strip('"'))
+        elif len(item) > 1 and item[1] == "(":
+            names.append(item[0].lower())
+        elif len(item) == 1 or (len(item) == 3 and item[1] == "."):
+            names.append(item[-1].strip('"'))
+        else:
+            names.append("?column?")
+    return names
+
+
+@pytest.mark.parametrize("sql, expected", [
+    (
+        "SELECT COUNT(*) FROM invoices",
+        'SELECT COALESCE(SUM(invoices."invoiceCount"), 0) AS count FROM invoice_rollups AS invoices',
+    ),
+    (
+        'SELECT status, COUNT(*) AS n, AVG("totalAmount") FROM invoices GROUP BY status',
+        'SELECT status, COALESCE(SUM(invoices."invoiceCount"), 0) AS n, '
+        '(SUM("totalAmount") / NULLIF(SUM(invoices."invoiceCount"), 0)) AS avg FROM invoice_rollups AS invoices GROUP BY status',
+    ),
+    (
+        'SELECT i."vendorId", count(i.id)::int FROM invoices i GROUP BY 1 ORDER BY COUNT(*) DESC',
+        'SELECT i."vendorId", COALESCE(SUM(i."invoiceCount"), 0)::int AS count FROM invoice_rollups i GROUP BY 1 '
+        'ORDER BY COALESCE(SUM(i."invoiceCount"), 0) DESC',
+    ),
+    (
+        'SELECT ROUND(AVG("totalAmount"), 2) FROM invoices',
+        'SELECT ROUND((SUM("totalAmount") / NULLIF(SUM(invoices."invoiceCount"), 0)), 2) FROM invoice_rollups AS invoices',
+    ),
+    (
+        "SELECT DATE_TRUNC('month', \"issueDate\") AS month, SUM(\"totalAmount\") FROM invoices "
+        "WHERE \"issueDate\" >= '2024-01-01' GROUP BY 1",
+        "SELECT DATE_TRUNC('month', \"month\") AS month, SUM(\"totalAmount\") FROM invoice_rollups AS invoices "
+        "WHERE \"month\" >= '2024-01-01' GROUP BY 1",
+    ),
+])
+def test_rewrite(sql, expected):
+    rewritten = rewrite_for_rollup(sql)
+    assert rewritten == expected
+    assert output_names(rewritten) == output_names(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    'SELECT * FROM invoices',
+    'SELECT "invoiceNumber", "totalAmount" FROM invoices',
+    'SELECT "totalAmount" FROM invoices',
+    'SELECT MAX("totalAmount") FROM invoices',
+    'SELECT COUNT(DISTINCT "vendorId") FROM invoices',
+    'SELECT status, COUNT(*) FROM invoices WHERE "issueDate" >= \'2024-01-15\' GROUP BY status',
+    'SELECT DATE_TRUNC(\'day\', "issueDate"), COUNT(*) FROM invoices GROUP BY 1',
+    'SELECT c.name, COUNT(*) FROM invoices i JOIN customers c ON c.id = i."customerId" GROUP BY 1',
+    'SELECT v.name, COUNT(*) FROM invoices i LEFT JOIN vendors v ON v.id = i."vendorId" GROUP BY 1',
+    'SELECT COUNT(*) FROM invoices WHERE "totalAmount" > 100',
+    'SELECT COUNT(*)::numeric(10, 2) FROM invoices',
+    'SELECT status, COUNT(*) FROM invoices GROUP BY status UNION SELECT \'x\', 1',
+])
+def test_rewrite_declines(sql):
+    assert rewrite_for_rollup(sql) is None
+
+
+@pytest.fixture(scope="module")
+def rollup_db():
+    duckdb = pytest.importorskip("duckdb")
+    db = duckdb.connect()
+    db.execute('CREATE TABLE vendors (id TEXT, name TEXT)')
+    db.execute(
+        'CREATE TABLE invoices (id TEXT, "vendorId" TEXT, category TEXT, status TEXT, "issueDate" TIMESTAMP, '
+        'subtotal DECIMAL(15,2), "taxAmount" DECIMAL(15,2), "totalAmount" DECIMAL(15,2), "updatedAt" TIMESTAMP)'
+    )
+    db.executemany("INSERT INTO vendors VALUES (?, ?)", [(f"v{n}", f"Vendor {n}") for n in range(3)])
+    invoices = []
+    for n in range(60):
+        subtotal = Decimal(100 + n * 7) + Decimal(n % 100) / 100
+        tax = (subtotal / 5).quantize(Decimal("0.01"))
+        invoices.append((
+            f"i{n}", f"v{n % 3}", ("IT", "Travel", None)[n % 3 - 1], ("PAID", "PENDING")[n % 2],
+            datetime(2024, 1 + n % 6, 1 + n % 27, n % 24), subtotal, tax, subtotal + tax, datetime(2024, 7, 1),
+        ))
+    db.executemany("INSERT INTO invoices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", invoices)
+    db.execute(
+        'CREATE TABLE invoice_rollups AS SELECT "vendorId", category, status, DATE_TRUNC(\'month\', "issueDate") AS "month", '
+        'COUNT(*) AS "invoiceCount", SUM(subtotal) AS subtotal, SUM("taxAmount") AS "taxAmount", '
+        'SUM("totalAmount") AS "totalAmount" FROM invoices GROUP BY 1, 2, 3, 4'
+    )
+    return db
+
+
+def _rows(db, sql):
+    rows = db.execute(sql).fetchall()
+    rows = [tuple(round(float(value), 6) if isinstance(value, (Decimal, float)) else value for value in row) for row in rows]
+    return sorted(rows, key=repr)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT COUNT(*) FROM invoices",
+    "SELECT COUNT(*), SUM(\"totalAmount\") FROM invoices WHERE status = 'DRAFT'",
+    'SELECT status, COUNT(*), AVG("totalAmount"), SUM("taxAmount") FROM invoices GROUP BY status',
+    'SELECT category, COUNT(*) AS n, AVG(subtotal) FROM invoices GROUP BY category',
+    'SELECT v.name, COUNT(i.id), SUM(i."totalAmount") FROM invoices i JOIN vendors v ON v.id = i."vendorId" GROUP BY v.name',
+    "SELECT DATE_TRUNC('quarter', \"issueDate\"), SUM(\"totalAmount\") FROM invoices "
+    "WHERE \"issueDate\" >= '2024-02-01' AND \"issueDate\" < '2024-05-01' GROUP BY 1",
+])
+def test_rewrite_returns_same_results(rollup_db, sql):
+    rewritten = rewrite_for_rollup(sql)
+    assert rewritten is not None
+    assert output_names(rewritten) == output_names(sql)
+    assert _rows(rollup_db, rewritten) == _rows(rollup_db, sql)
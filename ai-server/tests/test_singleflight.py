@@ -0,0 +1,56 @@
+import asyncio
+import os
+
+# Keep main from connecting to a database at import
+os.environ.setdefault("DATABASE_URL", "")
+
+import main
+from cache import QuestionCache
+from singleflight import SingleFlight
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def run():
+        return await asyncio.gather(*(flights.do("key", work) for _ in range(3)))
+
+    assert asyncio.run(run()) == [1, 1, 1]
+    assert flights.stats() == {"calls": 3, "coalesced": 2, "in_flight": 0}
+
+
+def generated_sql(monkeypatch, questions):
+    """SQL returned to each of the questions asked concurrently, and the LLM calls made"""
+    asked = []
+
+    async def fake_groq(question, previous_sql=None, feedback=None):
+        asked.append(question)
+        await asyncio.sleep(0.01)
+        return f"-- {question}"
+
+    monkeypatch.setattr(main, "generate_sql_with_groq", fake_groq)
+    monkeypatch.setattr(main, "question_cache", QuestionCache())
+    monkeypatch.setattr(main, "sql_flights", SingleFlight())
+
+    async def run():
+        return await asyncio.gather(*(main.get_sql_for_question(question) for question in questions))
+
+    return [sql for sql, _ in asyncio.run(run())], asked
+
+
+def test_sql_flights_keep_operator_questions_apart(monkeypatch):
+    sql, asked = generated_sql(monkeypatch, ["invoices with total > 1000", "invoices with total < 1000"])
+    assert sql == ["-- invoices with total > 1000", "-- invoices with total < 1000"]
+    assert len(asked) == 2
+
+
+def test_sql_flights_share_equivalent_questions(monkeypatch):
+    sql, asked = generated_sql(monkeypatch, ["invoices with total > 1000", "Invoices with total > 1,000?"])
+    assert sql == ["-- invoices with total > 1000"] * 2
+    assert asked == ["invoices with total > 1000"]
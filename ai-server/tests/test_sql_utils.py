@@ -0,0 +1,151 @@
+import pytest
+
+from schema_catalog import FALLBACK_TABLES, HIDDEN_COLUMNS
+from sql_utils import (
+    SQLValidationError,
+    canonicalize_sql,
+    is_keyset_pageable,
+    output_aggregates,
+    paged_sql,
+    tokenize_sql,
+    unpaged_sql,
+    validate_sql,
+)
+
+TABLES = {
+    table: [name for name, _ in columns if (table, name) not in HIDDEN_COLUMNS]
+    for table, columns in FALLBACK_TABLES.items()
+}
+
+
+def validate(sql):
+    return validate_sql(sql, TABLES, HIDDEN_COLUMNS)[0]
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT 1", [("word", "SELECT"), ("space", " "), ("number", "1")]),
+    ("SELECT 'it''s; -- not a comment'", [("word", "SELECT"), ("space", " "), ("string", "'it''s; -- not a comment'")]),
+    ('SELECT "total""Amount"', [("word", "SELECT"), ("space", " "), ("ident", '"total""Amount"')]),
+    ("a -- note\nb", [("word", "a"), ("space", " "), ("comment", "-- note"), ("space", "\n"), ("word", "b")]),
+    ("x/* c */::int", [("word", "x"), ("comment", "/* c */"), ("punct", ":"), ("punct", ":"), ("word", "int")]),
+])
+def test_tokenize_sql(sql, expected):
+    assert tokenize_sql(sql) == expected
+
+
+def test_canonicalize_keeps_literals():
+    assert canonicalize_sql("select  \"totalAmount\"\nFROM Invoices WHERE status = 'PAID' ;") == (
+        "select \"totalAmount\" from invoices where status = 'PAID'"
+    )
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ('SELECT "totalAmount" FROM invoices', 'SELECT "totalAmount" FROM invoices'),
+    ("SELECT total_amount FROM invoices", 'SELECT "totalAmount" FROM invoices'),
+    ("SELECT i.totalamount FROM invoices i", 'SELECT i."totalAmount" FROM invoices i'),
+    ("SELECT COUNT(*) FROM lineitems", "SELECT COUNT(*) FROM line_items"),
+    (
+        'SELECT v.name, SUM(i.total_amount) AS "Total" FROM invoices i, vendors v '
+        'WHERE v.id = i.vendor_id GROUP BY 1 ORDER BY "Total"',
+        'SELECT v.name, SUM(i."totalAmount") AS "Total" FROM invoices i, vendors v '
+        'WHERE v.id = i."vendorId" GROUP BY 1 ORDER BY "Total"',
+    ),
+    (
+        'SELECT EXTRACT(YEAR FROM "issueDate") AS y, SUM("totalAmount") FROM invoices GROUP BY 1',
+        'SELECT EXTRACT(YEAR FROM "issueDate") AS y, SUM("totalAmount") FROM invoices GROUP BY 1',
+    ),
+    (
+        'WITH t AS (SELECT "vendorId", SUM("totalAmount") AS "total" FROM invoices GROUP BY 1) '
+        'SELECT "vendorId", "total" FROM t',
+        'WITH t AS (SELECT "vendorId", SUM("totalAmount") AS "total" FROM invoices GROUP BY 1) '
+        'SELECT "vendorId", "total" FROM t',
+    ),
+    ("SELECT status FROM invoices WHERE status = 'PAID'::\"InvoiceStatus\"", "SELECT status FROM invoices WHERE status = 'PAID'::\"InvoiceStatus\""),
+    ('SELECT "Total" FROM (SELECT SUM("totalAmount") AS "Total" FROM invoices) s', 'SELECT "Total" FROM (SELECT SUM("totalAmount") AS "Total" FROM invoices) s'),
+    ("SELECT email, COUNT(*) FROM users GROUP BY email", "SELECT email, COUNT(*) FROM users GROUP BY email"),
+    ("SELECT row_to_json(v) FROM vendors v", "SELECT row_to_json(v) FROM vendors v"),
+    ("SELECT u.email FROM users u WHERE u.id = 1", "SELECT u.email FROM users u WHERE u.id = 1"),
+])
+def test_validate_sql_accepts_and_repairs(sql, expected):
+    assert validate(sql) == expected
+
+
+@pytest.mark.parametrize("sql, message", [
+    ("", "Empty SQL query"),
+    ("DELETE FROM invoices", "Only SELECT"),
+    ("SELECT 1; SELECT 2", "single SQL statement"),
+    ("SELECT pg_sleep(10)", "forbidden function"),
+    ("WITH x AS (DELETE FROM invoices RETURNING *) SELECT * FROM x", "forbidden keyword"),
+    ("SELECT i.amount FROM invoices i", 'Column "amount" does not exist on table invoices'),
+    ('SELECT "totalAmount" FROM vendors', 'Column "totalAmount" does not exist on vendors'),
+    ('SELECT "passwordHash" FROM users', 'Column "passwordHash" is not available'),
+    ("SELECT email, password_hash FROM users", 'Column "password_hash" is not available'),
+    ('SELECT u."passwordHash" FROM users u', 'Column "passwordHash" does not exist on table users'),
+    ("SELECT * FROM users", "SELECT * is not allowed on users"),
+    ("SELECT u.* FROM users u", "SELECT * is not allowed on users"),
+    ("SELECT row_to_json(u) FROM users u", "Whole-row references to users"),
+    ("SELECT u FROM users u", "Whole-row references to users"),
+    ("SELECT to_jsonb(users) FROM users", "Whole-row references to users"),
+    ('SELECT json_agg(x) FROM "users" AS x', "Whole-row references to users"),
+    ("SELECT to_json(u.*) FROM users u", "SELECT * is not allowed on users"),
+    ("SELECT * FROM invoice_rollups", "Table invoice_rollups does not exist"),
+    ("SELECT table_name FROM information_schema.tables", "public schema"),
+])
+def test_validate_sql_rejects(sql, message):
+    with pytest.raises(SQLValidationError, match=message.replace("*", r"\*")):
+        validate(sql)
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ('SELECT DATE_TRUNC(\'month\', "issueDate") AS m, SUM("totalAmount") FROM invoices GROUP BY 1', [None, "sum"]),
+    ('SELECT status, COALESCE(SUM(i."invoiceCount"), 0)::int AS count FROM invoice_rollups i', [None, "sum"]),
+    ('SELECT ROUND(AVG("totalAmount"), 2) AS avg FROM invoices', ["avg"]),
+    ('SELECT COUNT(DISTINCT "vendorId"), SUM("totalAmount") OVER (ORDER BY id) FROM invoices', ["count distinct", "sum over"]),
+    ('SELECT SUM("totalAmount") / COUNT(*) FROM invoices', [None]),
+    ("WITH t AS (SELECT 1) SELECT * FROM t", None),
+])
+def test_output_aggregates(sql, expected):
+    assert output_aggregates(sql) == expected
+
+
+@pytest.mark.parametrize("sql, pageable", [
+    ("SELECT * FROM invoices", True),
+    ('SELECT id, "totalAmount" FROM invoices WHERE status = \'PAID\'', True),
+    ('SELECT "totalAmount" FROM invoices', False),
+    ("SELECT * FROM invoices ORDER BY id", False),
+    ("SELECT * FROM invoices i JOIN vendors v ON v.id = i.\"vendorId\"", False),
+    ("SELECT status, COUNT(*) FROM invoices GROUP BY status", False),
+])
+def test_is_keyset_pageable(sql, pageable):
+    assert is_keyset_pageable(sql) is pageable
+
+
+@pytest.mark.parametrize("kwargs, expected", [
+    ({"limit": 100}, "SELECT * FROM (SELECT * FROM invoices) AS _page LIMIT 100"),
+    ({"limit": 100, "offset": 200}, "SELECT * FROM (SELECT * FROM invoices) AS _page LIMIT 100 OFFSET 200"),
+    ({"limit": 50, "keyset": True}, "SELECT * FROM (SELECT * FROM invoices) AS _page ORDER BY _page.id LIMIT 50"),
+    (
+        {"limit": 50, "keyset": True, "after_key": True},
+        "SELECT * FROM (SELECT * FROM invoices) AS _page WHERE _page.id > %(after)s ORDER BY _page.id LIMIT 50",
+    ),
+])
+def test_paged_sql(kwargs, expected):
+    assert paged_sql("SELECT * FROM invoices;", **kwargs) == expected
+
+
+def test_paged_sql_escapes_percent_for_parameterized_pages():
+    sql = "SELECT * FROM vendors WHERE name LIKE 'A%'"
+    assert "LIKE 'A%%'" in paged_sql(sql, 10, keyset=True, after_key=True)
+    assert "LIKE 'A%'" in paged_sql(sql, 10)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"limit": 100},
+    {"limit": 100, "offset": 200},
+    {"limit": 50, "keyset": True},
+    {"limit": 50, "keyset": True, "after_key": True},
+])
+def test_unpaged_sql_recovers_the_paged_query(kwargs):
+    sql = "SELECT name FROM vendors WHERE name LIKE 'A%' ORDER BY name"
+    assert unpaged_sql(paged_sql(sql, **kwargs)) == sql
+    assert unpaged_sql(sql) is None